@@ -0,0 +1,178 @@
+import json
+from datetime import datetime
+
+# Parsing only: no database access, so parser worker processes can import this without log_processor's setup.
+
+KNOWN_KEYS = {
+    'timestamp',
+    'service',
+    'log_level',
+    'message',
+    'correlation_id',
+    'filename',
+    'func_name',
+    'lineno',
+    'request_id',
+    'user_id',
+    'custom_fields',
+    'event',
+    'level',
+    'function_kwargs',
+}
+
+def normalize_timestamp(timestamp):
+    # Docker's RFC 3339 timestamps drop trailing zeros from the fraction; pad it to 9 digits so they sort as text.
+    if not timestamp.endswith('Z'):
+        return timestamp
+    seconds, _, fraction = timestamp[:-1].partition('.')
+    return f"{seconds}.{fraction:0<9}Z"
+
+def split_timestamp(log):
+    # `docker compose logs --timestamps` puts the container's own write time before the payload.
+    timestamp, _, rest = log.partition(' ')
+    if len(timestamp) >= 20 and timestamp[:4].isdigit() and timestamp[10:11] == 'T':
+        return normalize_timestamp(timestamp), rest
+    return None, log
+
+def parse_log(log, source, service=None, received_at=None):
+    """Return ('structured_logs', log_data) or ('unstructured_logs', log) for one log line.
+
+    Rows are stamped with the event's own `timestamp`, else `received_at` (the time the source
+    recorded the line), else the time of parsing.
+    """
+    fallback_timestamp = received_at or datetime.utcnow().isoformat()
+    try:
+        # Extract the service name and JSON part of the log
+        if service is not None:
+            pass
+        elif ' | ' in log:
+            service, log = log.split(' | ', 1)
+        else:
+            service = source
+
+        log_data = json.loads(log)
+        if 'event' in log_data and 'level' in log_data:
+            if not isinstance(log_data.get('timestamp'), str):
+                log_data['timestamp'] = fallback_timestamp
+            log_data['service'] = service.strip()
+            log_data['log_level'] = log_data['level']
+            log_data['message'] = log_data['event']
+            log_data['custom_fields'] = log_data.get('custom_fields', {})
+            if 'function_kwargs' in log_data:
+                log_data['custom_fields']['function_kwargs'] = log_data['function_kwargs']
+
+            # Include all additional keys in custom_fields
+            for key, value in log_data.items():
+                if key not in KNOWN_KEYS:
+                    log_data['custom_fields'][key] = value
+            return 'structured_logs', log_data
+    except json.JSONDecodeError:
+        pass
+    return 'unstructured_logs', {'timestamp': fallback_timestamp, 'source': source, 'log': log}
+
+def structured_log_row(log):
+    return (
+        log.get('timestamp', ''),
+        log.get('service', ''),
+        log.get('log_level', ''),
+        log.get('message', ''),
+        log.get('correlation_id', ''),
+        log.get('filename', ''),
+        log.get('func_name', ''),
+        log.get('lineno', None),
+        log.get('request_id', ''),
+        log.get('user_id', ''),
+        json.dumps(log.get('custom_fields', {}))
+    )
+
+def unstructured_log_row(log):
+    return (
+        log['timestamp'],
+        log['source'],
+        log['log']
+    )
+
+LOG_ROWS = {
+    'structured_logs': structured_log_row,
+    'unstructured_logs': unstructured_log_row,
+}
+
+def parse_lines(lines, source, timestamps=False):
+    """Parse a chunk of raw `service | payload` lines into (table, row, position) triples, in order.
+
+    Runs in parser worker processes; rows are returned ready for BatchWriter.add_row. With
+    `timestamps`, payloads start with the container's timestamp and position is
+    (service, timestamp) for resuming; otherwise it is None. A line that fails to parse comes
+    back as (None, error message, position).
+    """
+    parsed = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        position = None
+        try:
+            log = line.decode('utf-8')
+            service = None
+            received_at = None
+            if ' | ' in log:
+                service, log = log.split(' | ', 1)
+                service = service.strip()
+                if timestamps:
+                    received_at, log = split_timestamp(log)
+                    if received_at is not None:
+                        position = (service, received_at)
+            table, log = parse_log(log, source, service or source, received_at)
+            parsed.append((table, LOG_ROWS[table](log), position))
+        except Exception as e:
+            parsed.append((None, f"Error processing log: {e}", position))
+    return parsed
+
+def parse_container_lines(lines, source, timestamps=False):
+    """parse_lines for the output of `docker logs <container>`, whose lines have no `service | ` prefix.
+
+    Every line belongs to `source`, the container. With `timestamps`, lines start with docker's
+    timestamp and position is (source, timestamp).
+    """
+    parsed = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        position = None
+        try:
+            log = line.decode('utf-8')
+            received_at = None
+            if timestamps:
+                received_at, log = split_timestamp(log)
+                if received_at is not None:
+                    position = (source, received_at)
+            table, log = parse_log(log, source, source, received_at)
+            parsed.append((table, LOG_ROWS[table](log), position))
+        except Exception as e:
+            parsed.append((None, f"Error processing log: {e}", position))
+    return parsed
+
+def parse_json_file_lines(lines, source, timestamps=False):
+    """parse_lines for logs written by docker's json-file driver: one {"log", "stream", "time"} object per line.
+
+    The container's output has no `service | ` prefix, so every line belongs to `source`. With
+    `timestamps`, rows without a timestamp of their own get the `time` docker recorded. Position is
+    always None.
+    """
+    parsed = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+            log = entry['log'].strip()
+            if not log:
+                continue
+            received_at = normalize_timestamp(entry['time']) if timestamps else None
+            table, log = parse_log(log, source, source, received_at)
+            parsed.append((table, LOG_ROWS[table](log), None))
+        except Exception as e:
+            parsed.append((None, f"Error processing log: {e}", None))
+    return parsed
@@ -1,14 +1,51 @@
+import argparse
+import asyncio
+import contextlib
+import gzip
 import json
 import os
+import queue
+import re
 import sqlite3
+import struct
 import subprocess
-from datetime import datetime
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from log_parsing import parse_container_lines, parse_json_file_lines, parse_lines, parse_log, structured_log_row, unstructured_log_row
 
 # Connect to SQLite database
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs.db")
-conn = sqlite3.connect(DB_PATH)
+DB_PATH = os.getenv('LOG_PROCESSOR_DB') or os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs.db")
+# Seconds a write waits for another connection (PartitionMaintenance, an --import run) to release the write
+# lock before failing with "database is locked"; BatchWriter then retries the batch.
+BUSY_TIMEOUT = float(os.getenv('LOG_PROCESSOR_BUSY_TIMEOUT', '30'))
+conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT)
 cursor = conn.cursor()
 
+# Lets PartitionMaintenance hand the pages of dropped partitions back to the filesystem. It only takes
+# effect on a new database; an existing one keeps its setting until a full VACUUM.
+cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+
+# WAL lets readers query while the writer commits; with synchronous=NORMAL a WAL commit does not fsync
+# (a power loss can drop the last transactions, never corrupt the DB). Use FULL for an fsync per commit.
+JOURNAL_MODE = os.getenv('LOG_PROCESSOR_JOURNAL_MODE', 'WAL')
+SYNCHRONOUS = os.getenv('LOG_PROCESSOR_SYNCHRONOUS', 'NORMAL')
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+def configure_connection(journal_mode=JOURNAL_MODE, synchronous=SYNCHRONOUS):
+    synchronous = synchronous.upper()
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f"Unknown synchronous mode {synchronous!r}, expected one of {SYNCHRONOUS_MODES}")
+    cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+    cursor.execute(f'PRAGMA synchronous={synchronous}')
+
+configure_connection()
+
 STRUCTURED_LOG_COLUMNS = [
     ("timestamp", "TEXT"),
     ("service", "TEXT"),
@@ -23,162 +60,1804 @@ STRUCTURED_LOG_COLUMNS = [
     ("custom_fields", "TEXT"),
 ]
 
-# Create tables if they don't exist
+UNSTRUCTURED_LOG_COLUMNS = [
+    ("timestamp", "TEXT"),
+    ("source", "TEXT"),
+    ("log", "TEXT"),
+]
+
+# Columns of each log table, in the order of the rows built by log_parsing.LOG_ROWS (after the id).
+LOG_COLUMNS = {
+    'structured_logs': STRUCTURED_LOG_COLUMNS,
+    'unstructured_logs': UNSTRUCTURED_LOG_COLUMNS,
+}
+
+# Low-cardinality structured columns, stored as <column>_id referencing lookup_<column>. The keys of
+# custom_fields are stored the same way, as ids from lookup_custom_field_key. The structured_logs view
+# shows names again.
+DICTIONARY_COLUMNS = ('service', 'log_level', 'filename', 'func_name')
+
+def stored_columns(table):
+    if table != 'structured_logs':
+        return LOG_COLUMNS[table]
+    return [
+        (f'{column}_id', 'INTEGER') if column in DICTIONARY_COLUMNS else (column, col_type)
+        for column, col_type in STRUCTURED_LOG_COLUMNS
+    ]
+
+for lookup in DICTIONARY_COLUMNS + ('custom_field_key',):
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS lookup_{lookup} (id INTEGER PRIMARY KEY, name TEXT UNIQUE)')
+
 cursor.execute('''
-CREATE TABLE IF NOT EXISTS structured_logs (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    timestamp TEXT,
-    service TEXT,
-    log_level TEXT,
-    message TEXT,
-    correlation_id TEXT,
-    filename TEXT,
-    func_name TEXT,
-    lineno INTEGER,
-    request_id TEXT,
-    user_id TEXT,
-    custom_fields TEXT
+CREATE TABLE IF NOT EXISTS timestamp (
+    id INTEGER PRIMARY KEY,
+    last_processed TIMESTAMP
 )
 ''')
 
+# High-water mark per docker compose service: the newest container timestamp stored, and how many lines
+# carried exactly that timestamp, so a resumed `logs --since` can skip precisely the lines already stored.
 cursor.execute('''
-CREATE TABLE IF NOT EXISTS unstructured_logs (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+CREATE TABLE IF NOT EXISTS source_checkpoints (
+    source TEXT PRIMARY KEY,
     timestamp TEXT,
-    source TEXT,
-    log TEXT
+    seen INTEGER
 )
 ''')
 
+# Read position in each segment file written by the logger's segment sink (LOGGER_SEGMENT_DIR)
 cursor.execute('''
-CREATE TABLE IF NOT EXISTS timestamp (
-    id INTEGER PRIMARY KEY,
-    last_processed TIMESTAMP
+CREATE TABLE IF NOT EXISTS segment_offsets (
+    segment TEXT PRIMARY KEY,
+    offset INTEGER
+)
+''')
+
+# Progress of each file loaded with --import: uncompressed bytes stored so far, and the file's size once
+# it has been read to the end.
+cursor.execute('''
+CREATE TABLE IF NOT EXISTS import_offsets (
+    path TEXT PRIMARY KEY,
+    offset INTEGER,
+    size INTEGER
+)
+''')
+
+# Rows are stored in one table per day (or hour) of their timestamp, e.g. structured_logs_20260110.
+# Each partition is listed here with the oldest and newest timestamp it holds, so queries only open the
+# partitions they need and retention can drop whole partitions.
+cursor.execute('''
+CREATE TABLE IF NOT EXISTS log_partitions (
+    name TEXT PRIMARY KEY,
+    log_table TEXT,
+    oldest TEXT,
+    newest TEXT,
+    compacted INTEGER DEFAULT 0,
+    encoded INTEGER DEFAULT 0,
+    indexed INTEGER DEFAULT 1
+)
+''')
+
+# `encoded` marks partitions in the dictionary-encoded layout; older ones are converted at startup.
+# `indexed` is 0 for partitions created by a bulk import until their indexes are built (index_partitions).
+cursor.execute('PRAGMA table_info(log_partitions)')
+existing_columns = {row[1] for row in cursor.fetchall()}
+for column, definition in (('encoded', 'INTEGER DEFAULT 0'), ('indexed', 'INTEGER DEFAULT 1')):
+    if column not in existing_columns:
+        cursor.execute(f'ALTER TABLE log_partitions ADD COLUMN {column} {definition}')
+
+# Last id used per log table; ids are unique across all partitions of a table.
+cursor.execute('''
+CREATE TABLE IF NOT EXISTS log_sequences (
+    log_table TEXT PRIMARY KEY,
+    seq INTEGER
+)
+''')
+
+# custom_fields keys seen in sampled rows, and those promoted to a column of their own by
+# PartitionMaintenance. A promoted key is a virtual generated column, cf_<key>, read from custom_fields,
+# with a (column, timestamp) index on every structured partition.
+cursor.execute('''
+CREATE TABLE IF NOT EXISTS custom_field_columns (
+    field TEXT PRIMARY KEY,
+    column_name TEXT,
+    seen INTEGER DEFAULT 0,
+    sampled INTEGER DEFAULT 0,
+    promoted_at TEXT
 )
 ''')
 
 conn.commit()
 
-def ensure_structured_log_columns():
-    cursor.execute('PRAGMA table_info(structured_logs)')
-    existing = {row[1] for row in cursor.fetchall()}
-    for name, col_type in STRUCTURED_LOG_COLUMNS:
-        if name not in existing:
-            cursor.execute(f'ALTER TABLE structured_logs ADD COLUMN {name} {col_type}')
-    conn.commit()
+# (index name suffix, columns) per log table, created on every partition. Every filter column is paired with
+# timestamp, and SQLite appends the rowid, so filtered queries come back in (timestamp, id) order straight
+# from the index (see query.py).
+LOG_INDEXES = {
+    'structured_logs': [
+        ("timestamp", "timestamp"),
+        ("correlation_id", "correlation_id, timestamp"),
+        ("request_id", "request_id, timestamp"),
+        ("user_id", "user_id, timestamp"),
+        ("service", "service_id, timestamp"),
+        ("log_level", "log_level_id, timestamp"),
+    ],
+    'unstructured_logs': [
+        ("timestamp", "timestamp"),
+        ("source", "source, timestamp"),
+    ],
+}
+
+# Full-text indexes over structured message and custom_fields (keys and values) and unstructured log text,
+# one per partition (<partition>_fts). They are contentless: they hold only the index and are joined back to
+# the partition on rowid. insert_log_rows() writes them in the same executemany batch as the rows themselves.
+# LOG_PROCESSOR_FTS_TOKENIZE=trigram matches arbitrary substrings (like LIKE '%...%') at roughly 3x the index size;
+# it applies to partitions created from then on.
+FTS_TOKENIZE = os.getenv('LOG_PROCESSOR_FTS_TOKENIZE', 'unicode61')
+
+FTS_COLUMNS = {
+    'structured_logs': ('message', 'custom_fields'),
+    'unstructured_logs': ('log',),
+}
+
+PARTITION = os.getenv('LOG_PROCESSOR_PARTITION', 'day')
+PARTITION_FORMATS = {'day': '%Y%m%d', 'hour': '%Y%m%d%H'}
+PARTITION_TIMESTAMP = re.compile(r'(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}))?')
+
+# Names of partition tables, as opposed to their full-text indexes and the views.
+PARTITION_TABLE = re.compile(r'(structured|unstructured)_logs_(\d+|legacy)$')
+
+def partition_key(timestamp, partition=PARTITION):
+    match = PARTITION_TIMESTAMP.match(timestamp or '')
+    if match is None:
+        # A row without a usable timestamp goes to the current partition.
+        return datetime.utcnow().strftime(PARTITION_FORMATS[partition])
+    year, month, day, hour = match.groups()
+    if partition == 'hour':
+        return year + month + day + (hour or '00')
+    return year + month + day
+
+# Only keys that can be used as-is in a column name and a JSON path are tracked for promotion.
+PROMOTABLE_FIELD = re.compile(r'[A-Za-z_][A-Za-z0-9_]{0,62}$')
+
+# SQL for one custom_fields value out of json_each, keeping its JSON type when re-encoded.
+JSON_EACH_VALUE = (
+    "CASE j.type WHEN 'true' THEN json('true') WHEN 'false' THEN json('false') "
+    "WHEN 'object' THEN json(j.value) WHEN 'array' THEN json(j.value) ELSE j.value END"
+)
+
+def json_object_or_null(expression):
+    return f"CASE WHEN json_valid({expression}) THEN CASE WHEN json_type({expression}) = 'object' THEN {expression} END END"
+
+class Interner:
+    """Ids of dictionary-encoded values, cached after the first lookup so most rows need none.
+
+    A new value is inserted in the caller's write transaction; call `rollback()` if that
+    transaction fails, so ids that were never committed are forgotten.
+    """
+
+    max_cached = 100000
+
+    def __init__(self):
+        self._ids = {}
+        self._pending = []
+
+    def id(self, connection, lookup, value):
+        if value is None:
+            return None
+        ids = self._ids.setdefault(lookup, {})
+        row_id = ids.get(value)
+        if row_id is None:
+            connection.execute(f'INSERT OR IGNORE INTO lookup_{lookup} (name) VALUES (?)', (value,))
+            (row_id,) = connection.execute(f'SELECT id FROM lookup_{lookup} WHERE name=?', (value,)).fetchone()
+            if len(ids) >= self.max_cached:
+                ids.clear()
+            ids[value] = row_id
+            self._pending.append((lookup, value))
+        return row_id
+
+    def custom_fields(self, connection, text):
+        try:
+            fields = json.loads(text)
+        except (TypeError, ValueError):
+            return text
+        if not isinstance(fields, dict):
+            return text
+        keys = self._ids.setdefault('custom_field_key', {})
+        encoded = {}
+        for key, value in fields.items():
+            key_id = keys.get(key)
+            if key_id is None:
+                key_id = self.id(connection, 'custom_field_key', key)
+            encoded[str(key_id)] = value
+        return json.dumps(encoded, separators=(',', ':'))
+
+    def encode(self, connection, row):
+        # A row from log_parsing.structured_log_row, in the stored_columns('structured_logs') layout.
+        (timestamp, service, log_level, message, correlation_id, filename, func_name, lineno, request_id, user_id,
+         custom_fields) = row
+        return (
+            timestamp,
+            self.id(connection, 'service', service),
+            self.id(connection, 'log_level', log_level),
+            message,
+            correlation_id,
+            self.id(connection, 'filename', filename),
+            self.id(connection, 'func_name', func_name),
+            lineno,
+            request_id,
+            user_id,
+            self.custom_fields(connection, custom_fields),
+        )
+
+    def commit(self):
+        self._pending = []
+
+    def rollback(self):
+        for lookup, value in self._pending:
+            self._ids.get(lookup, {}).pop(value, None)
+        self._pending = []
+
+interner = Interner()
 
-ensure_structured_log_columns()
+def custom_field_path(connection, field):
+    # JSON path of a key inside the stored (encoded) custom_fields.
+    connection.execute('INSERT OR IGNORE INTO lookup_custom_field_key (name) VALUES (?)', (field,))
+    (key_id,) = connection.execute('SELECT id FROM lookup_custom_field_key WHERE name=?', (field,)).fetchone()
+    return f'$."{key_id}"'
+
+def promoted_columns(connection):
+    return connection.execute(
+        'SELECT field, column_name FROM custom_field_columns WHERE column_name IS NOT NULL ORDER BY promoted_at, field'
+    ).fetchall()
+
+def ensure_structured_log_columns(connection, name, indexes=True):
+    # Adds the promoted custom_fields columns a structured partition is missing. Adding a virtual column
+    # only changes the schema; building its index reads the whole partition.
+    existing = {row[1] for row in connection.execute(f'PRAGMA table_xinfo({name})')}
+    for field, column in promoted_columns(connection):
+        if column not in existing:
+            path = custom_field_path(connection, field)
+            connection.execute(
+                f"ALTER TABLE {name} ADD COLUMN {column} GENERATED ALWAYS AS (json_extract(custom_fields, '{path}')) VIRTUAL"
+            )
+        if indexes:
+            connection.execute(f'CREATE INDEX IF NOT EXISTS idx_{name}_{column} ON {name} ({column}, timestamp)')
+
+def is_busy(error):
+    # SQLITE_BUSY / SQLITE_LOCKED: another connection held the lock for longer than the busy timeout.
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in str(error) or 'busy' in str(error))
+
+@contextlib.contextmanager
+def lock_deadline(connection, seconds):
+    # Interrupts the statement still running `seconds` from now; it fails with OperationalError('interrupted')
+    # and the enclosing write_transaction() rolls back, releasing the lock.
+    deadline = time.monotonic() + seconds
+    connection.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+    try:
+        yield connection
+    finally:
+        connection.set_progress_handler(None, 0)
+
+def is_interrupted(error):
+    return isinstance(error, sqlite3.OperationalError) and 'interrupted' in str(error)
+
+@contextlib.contextmanager
+def write_transaction(connection):
+    # IMMEDIATE takes the write lock up front, so ids read by insert_log_rows cannot be taken by another writer.
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        yield connection
+    except BaseException:
+        connection.rollback()
+        raise
+    connection.commit()
+
+def create_partition(connection, table, name, indexes=True):
+    # Table, indexes, full-text index and (unstructured only) the trigger that keeps it in step with row deletes.
+    # Without `indexes` the secondary indexes are left out; calling again with them builds what is missing.
+    columns = ', '.join(f'{column} {col_type}' for column, col_type in stored_columns(table))
+    connection.execute(f'CREATE TABLE IF NOT EXISTS {name} (id INTEGER PRIMARY KEY, {columns})')
+    if indexes:
+        for suffix, indexed in LOG_INDEXES[table]:
+            connection.execute(f'CREATE INDEX IF NOT EXISTS idx_{name}_{suffix} ON {name} ({indexed})')
+    if table == 'structured_logs':
+        ensure_structured_log_columns(connection, name, indexes)
+    fts = f'{name}_fts'
+    fts_columns = FTS_COLUMNS[table]
+    column_list = ', '.join(fts_columns)
+    created = connection.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (fts,)).fetchone() is None
+    connection.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({column_list}, content='', tokenize='{FTS_TOKENIZE}')"
+    )
+    # A contentless index forgets a row only when given the values it was indexed with. Structured partitions
+    # store custom_fields encoded, not as indexed, so they have no trigger: ids are never reused and searches
+    # join back to the partition, so what a deleted row leaves in the index never matches.
+    if table != 'structured_logs':
+        old_values = ', '.join(f'old.{column}' for column in fts_columns)
+        connection.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {name} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+        END
+        ''')
+    if created:
+        connection.execute(f'INSERT INTO {fts} (rowid, {column_list}) SELECT id, {column_list} FROM {name}')
+
+def decoded_custom_fields(expression):
+    # Stored custom_fields with the key ids swapped back for their names, as parsed.
+    return (
+        f"CASE WHEN {json_object_or_null(expression)} IS NULL THEN {expression} ELSE ("
+        f"SELECT json_group_object(k.name, {JSON_EACH_VALUE}) FROM json_each({expression}) AS j "
+        f"JOIN lookup_custom_field_key AS k ON k.id = CAST(j.key AS INTEGER)) END"
+    )
+
+def rebuild_log_view(connection, table):
+    # structured_logs / unstructured_logs are views over every partition, for ad hoc SQL; query.py reads
+    # the partitions directly. Rebuilt whenever a partition is added or dropped.
+    columns = ['id'] + [column for column, _ in LOG_COLUMNS[table]]
+    expressions = list(columns)
+    if table == 'structured_logs':
+        for position, column in enumerate(columns):
+            if column in DICTIONARY_COLUMNS:
+                expressions[position] = f'(SELECT name FROM lookup_{column} WHERE id = p.{column}_id) AS {column}'
+        expressions[columns.index('custom_fields')] = f"{decoded_custom_fields('p.custom_fields')} AS custom_fields"
+        promoted = [column for _, column in promoted_columns(connection)]
+        columns += promoted
+        expressions += promoted
+    names = [name for (name,) in connection.execute('SELECT name FROM log_partitions WHERE log_table=? ORDER BY name', (table,))]
+    selects = [f"SELECT {', '.join(expressions)} FROM {name} AS p" for name in names]
+    if not selects:
+        selects = [f"SELECT {', '.join(f'NULL AS {column}' for column in columns)} WHERE 0"]
+    # SQLite allows at most 500 terms in one compound SELECT, so longer lists are nested.
+    while len(selects) > 500:
+        selects = [
+            'SELECT * FROM (' + ' UNION ALL '.join(selects[start:start + 500]) + ')'
+            for start in range(0, len(selects), 500)
+        ]
+    connection.execute(f'DROP VIEW IF EXISTS {table}')
+    connection.execute(f"CREATE VIEW {table} AS {' UNION ALL '.join(selects)}")
+
+def ensure_partition(connection, table, key, indexes=True):
+    # Returns the partition's name and whether it is indexed; rows of one that is not yet get no full-text
+    # rows either, whichever writer adds them, as index_partitions() indexes all of them at once.
+    name = f'{table}_{key}'
+    row = connection.execute('SELECT indexed FROM log_partitions WHERE name=?', (name,)).fetchone()
+    if row is None:
+        create_partition(connection, table, name, indexes)
+        connection.execute(
+            'INSERT INTO log_partitions (name, log_table, encoded, indexed) VALUES (?, ?, 1, ?)', (name, table, int(indexes))
+        )
+        rebuild_log_view(connection, table)
+        return name, indexes
+    return name, bool(row[0])
+
+def index_partitions(connection):
+    # Builds the indexes and full-text index left out of partitions created without them, one partition per
+    # transaction. Building an index over a loaded table is a single sort, and one INSERT ... SELECT into the
+    # full-text index writes far fewer segments than a batch at a time.
+    for name, table in connection.execute('SELECT name, log_table FROM log_partitions WHERE indexed = 0').fetchall():
+        with write_transaction(connection):
+            create_partition(connection, table, name)
+            fts = f'{name}_fts'
+            fts_columns = FTS_COLUMNS[table]
+            expressions = [
+                decoded_custom_fields('p.custom_fields') if column == 'custom_fields' else f'p.{column}'
+                for column in fts_columns
+            ]
+            # Rows already in the index (written before full-text rows were deferred) are left as they are.
+            connection.execute(
+                f"INSERT INTO {fts} (rowid, {', '.join(fts_columns)}) SELECT p.id, {', '.join(expressions)} FROM {name} AS p "
+                f"WHERE p.id NOT IN (SELECT rowid FROM {fts})"
+            )
+            connection.execute('UPDATE log_partitions SET indexed = 1 WHERE name=?', (name,))
+
+def ensure_partitioned_tables():
+    # Databases from before partitioning hold every row in a structured_logs / unstructured_logs table. Each
+    # becomes a single partition, <table>_legacy, dropped by retention once its newest row has expired.
+    # Its indexes are rebuilt under the partition's names. A structured table still has the text layout, so
+    # its indexes and the view over it wait for ensure_encoded_partitions(), as they name the encoded columns.
+    with write_transaction(conn):
+        for table, columns in LOG_COLUMNS.items():
+            encoded = True
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone():
+                legacy = f'{table}_legacy'
+                existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+                for name, col_type in columns:
+                    if name not in existing:
+                        conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {col_type}')
+                (last_id,) = conn.execute(
+                    f'SELECT max((SELECT coalesce(max(seq), 0) FROM sqlite_sequence WHERE name=?), coalesce(max(id), 0)) FROM {table}',
+                    (table,),
+                ).fetchone()
+                conn.execute('INSERT OR REPLACE INTO log_sequences (log_table, seq) VALUES (?, ?)', (table, last_id))
+                conn.execute(f'DROP TRIGGER IF EXISTS {table}_fts_delete')
+                for suffix, _ in LOG_INDEXES[table]:
+                    conn.execute(f'DROP INDEX IF EXISTS idx_{table}_{suffix}')
+                if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (f'{table}_fts',)).fetchone():
+                    conn.execute(f'ALTER TABLE {table}_fts RENAME TO {legacy}_fts')
+                conn.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+                if conn.execute(f'SELECT 1 FROM {legacy} LIMIT 1').fetchone():
+                    encoded = table != 'structured_logs'
+                    create_partition(conn, table, legacy, encoded)
+                    conn.execute(
+                        f'INSERT INTO log_partitions (name, log_table, oldest, newest, indexed) '
+                        f'SELECT ?, ?, min(timestamp), max(timestamp), ? FROM {legacy}',
+                        (legacy, table, int(encoded)),
+                    )
+                else:
+                    conn.execute(f'DROP TABLE IF EXISTS {legacy}_fts')
+                    conn.execute(f'DROP TABLE {legacy}')
+            if encoded:
+                rebuild_log_view(conn, table)
+
+ensure_partitioned_tables()
+
+def encode_partition(connection, name):
+    # Rewrites a structured partition from the text layout into stored_columns(); row ids, and with them the
+    # full-text index, stay as they are.
+    for column in DICTIONARY_COLUMNS:
+        connection.execute(f'INSERT OR IGNORE INTO lookup_{column} (name) SELECT DISTINCT {column} FROM {name} WHERE {column} IS NOT NULL')
+    fields = json_object_or_null('p.custom_fields')
+    connection.execute(
+        f'INSERT OR IGNORE INTO lookup_custom_field_key (name) SELECT DISTINCT j.key FROM {name} AS p, json_each({fields}) AS j'
+    )
+    encoding = f'{name}_encoding'
+    connection.execute(f'DROP TABLE IF EXISTS {encoding}')
+    columns = ', '.join(f'{column} {col_type}' for column, col_type in stored_columns('structured_logs'))
+    connection.execute(f'CREATE TABLE {encoding} (id INTEGER PRIMARY KEY, {columns})')
+    expressions = []
+    for column, _ in STRUCTURED_LOG_COLUMNS:
+        if column in DICTIONARY_COLUMNS:
+            expressions.append(f'(SELECT id FROM lookup_{column} WHERE name = p.{column})')
+        elif column == 'custom_fields':
+            expressions.append(
+                f"CASE WHEN {fields} IS NULL THEN p.custom_fields ELSE ("
+                f"SELECT json_group_object(CAST(k.id AS TEXT), {JSON_EACH_VALUE}) FROM json_each(p.custom_fields) AS j "
+                f"JOIN lookup_custom_field_key AS k ON k.name = j.key) END"
+            )
+        else:
+            expressions.append(f'p.{column}')
+    stored = ', '.join(column for column, _ in stored_columns('structured_logs'))
+    connection.execute(f"INSERT INTO {encoding} (id, {stored}) SELECT p.id, {', '.join(expressions)} FROM {name} AS p")
+    connection.execute(f'DROP TABLE {name}')
+    connection.execute(f'ALTER TABLE {encoding} RENAME TO {name}')
+    create_partition(connection, 'structured_logs', name)
+    connection.execute('UPDATE log_partitions SET encoded = 1, indexed = 1 WHERE name=?', (name,))
+
+def ensure_encoded_partitions():
+    # One transaction for all of them: the view cannot exist while a partition it names is being replaced.
+    with write_transaction(conn):
+        names = conn.execute("SELECT name FROM log_partitions WHERE log_table='structured_logs' AND encoded = 0").fetchall()
+        if names:
+            conn.execute('DROP VIEW IF EXISTS structured_logs')
+            for (name,) in names:
+                encode_partition(conn, name)
+            rebuild_log_view(conn, 'structured_logs')
+        conn.execute("UPDATE log_partitions SET encoded = 1 WHERE log_table='unstructured_logs' AND encoded = 0")
+
+ensure_encoded_partitions()
+
+def ensure_partition_indexes():
+    # Indexes added to LOG_INDEXES after a partition was created are built for it here, one partition per
+    # transaction. Partitions still waiting for index_partitions() are left to it.
+    existing = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    for name, table in conn.execute('SELECT name, log_table FROM log_partitions WHERE indexed = 1').fetchall():
+        if any(f'idx_{name}_{suffix}' not in existing for suffix, _ in LOG_INDEXES[table]):
+            with write_transaction(conn):
+                create_partition(conn, table, name)
+
+ensure_partition_indexes()
 
 def get_last_processed_timestamp():
     cursor.execute('SELECT last_processed FROM timestamp WHERE id=1')
     row = cursor.fetchone()
     return row[0] if row else None
 
+UPDATE_LAST_PROCESSED_TIMESTAMP = 'INSERT OR REPLACE INTO timestamp (id, last_processed) VALUES (?, ?)'
+
 def update_last_processed_timestamp(timestamp):
-    cursor.execute('INSERT OR REPLACE INTO timestamp (id, last_processed) VALUES (?, ?)', (1, timestamp))
+    cursor.execute(UPDATE_LAST_PROCESSED_TIMESTAMP, (1, timestamp))
     conn.commit()
 
+def get_source_checkpoints():
+    cursor.execute('SELECT source, timestamp, seen FROM source_checkpoints')
+    return {source: (timestamp, seen) for source, timestamp, seen in cursor.fetchall()}
+
+UPDATE_SOURCE_CHECKPOINT = 'INSERT OR REPLACE INTO source_checkpoints (source, timestamp, seen) VALUES (?, ?, ?)'
+
+UPDATE_PARTITION_BOUNDS = '''
+UPDATE log_partitions SET oldest = min(coalesce(oldest, ?1), ?1), newest = max(coalesce(newest, ?2), ?2), compacted = 0
+WHERE name = ?3
+'''
+
+def log_insert(table, name):
+    columns = ['id'] + [column for column, _ in stored_columns(table)]
+    return f"INSERT INTO {name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+def insert_log_rows(connection, table, rows, partition=PARTITION, interner=interner, indexes=True):
+    # Rows go to the partition of their timestamp. Ids are assigned here so the full-text rows go in with
+    # one executemany as well; an insert trigger would index row by row, several times slower. The index
+    # gets custom_fields as parsed, the table its dictionary-encoded form.
+    # Must run inside write_transaction(); roll the interner back if that fails.
+    partitions = {}
+    for row in rows:
+        partitions.setdefault(partition_key(row[0], partition), []).append(row)
+    columns = [column for column, _ in LOG_COLUMNS[table]]
+    fts_columns = FTS_COLUMNS[table]
+    fts_positions = [columns.index(column) for column in fts_columns]
+    (last_id,) = connection.execute(
+        'SELECT coalesce(max(seq), 0) FROM log_sequences WHERE log_table=?', (table,)
+    ).fetchone()
+    for key, partition_rows in partitions.items():
+        name, indexed = ensure_partition(connection, table, key, indexes)
+        ids = range(last_id + 1, last_id + 1 + len(partition_rows))
+        last_id += len(partition_rows)
+        stored = [interner.encode(connection, row) for row in partition_rows] if table == 'structured_logs' else partition_rows
+        connection.executemany(log_insert(table, name), [(row_id,) + row for row_id, row in zip(ids, stored)])
+        if indexed:
+            connection.executemany(
+                f"INSERT INTO {name}_fts (rowid, {', '.join(fts_columns)}) VALUES (?{', ?' * len(fts_columns)})",
+                [(row_id,) + tuple(row[position] for position in fts_positions) for row_id, row in zip(ids, partition_rows)],
+            )
+        timestamps = [row[0] for row in partition_rows]
+        connection.execute(UPDATE_PARTITION_BOUNDS, (min(timestamps), max(timestamps), name))
+    connection.execute('INSERT OR REPLACE INTO log_sequences (log_table, seq) VALUES (?, ?)', (table, last_id))
+
+def store_log_row(table, row):
+    try:
+        with write_transaction(conn):
+            insert_log_rows(conn, table, [row])
+    except BaseException:
+        interner.rollback()
+        raise
+    interner.commit()
+
 def store_structured_log(log):
-    cursor.execute('''
-    INSERT INTO structured_logs (timestamp, service, log_level, message, correlation_id, filename, func_name, lineno, request_id, user_id, custom_fields)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        log.get('timestamp', ''),
-        log.get('service', ''),
-        log.get('log_level', ''),
-        log.get('message', ''),
-        log.get('correlation_id', ''),
-        log.get('filename', ''),
-        log.get('func_name', ''),
-        log.get('lineno', None),
-        log.get('request_id', ''),
-        log.get('user_id', ''),
-        json.dumps(log.get('custom_fields', {}))
-    ))
-    conn.commit()
+    store_log_row('structured_logs', structured_log_row(log))
 
 def store_unstructured_log(log):
-    cursor.execute('''
-    INSERT INTO unstructured_logs (timestamp, source, log)
-    VALUES (?, ?, ?)
-    ''', (
-        log['timestamp'],
-        log['source'],
-        log['log']
-    ))
+    store_log_row('unstructured_logs', unstructured_log_row(log))
+
+class BatchWriter:
+    """Buffer parsed rows and write them with executemany, one transaction per batch.
+
+    The caller writes a batch with `flush()` once `due()` reports `batch_size` rows or a
+    first row older than `flush_interval` seconds. Checkpoints registered with `checkpoint()`
+    are written in the same transaction as the rows they cover, so a crash never records
+    progress for rows that were not stored, nor stores rows without their progress.
+
+    With `indexes=False`, partitions the writer creates get no secondary indexes and no
+    full-text rows until index_partitions() builds them.
+
+    A batch that fails because another connection held the write lock past the busy timeout
+    is retried, up to `busy_retries` times, before the error is raised.
+    """
+
+    def __init__(self, connection=None, batch_size=1000, flush_interval=0.5, partition=PARTITION, indexes=True,
+                 busy_retries=5):
+        self.conn = connection or conn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.partition = partition
+        self.indexes = indexes
+        self.busy_retries = busy_retries
+        self.busy = 0
+        # Ids are cached per database, so a writer on another connection keeps its own cache.
+        self.interner = interner if self.conn is conn else Interner()
+        self._structured = []
+        self._unstructured = []
+        self._checkpoints = {}
+        self._first_added = None
+        self.rows = 0
+        self.batches = 0
+
+    def __len__(self):
+        return len(self._structured) + len(self._unstructured)
+
+    def add_structured(self, log):
+        self.add_row('structured_logs', structured_log_row(log))
+
+    def add_unstructured(self, log):
+        self.add_row('unstructured_logs', unstructured_log_row(log))
+
+    def add_row(self, table, row):
+        (self._structured if table == 'structured_logs' else self._unstructured).append(row)
+        self._added()
+
+    def _added(self):
+        if self._first_added is None:
+            self._first_added = time.monotonic()
+
+    def checkpoint(self, key, sql, params):
+        # Only the latest checkpoint per key is written.
+        self._checkpoints[key] = (sql, params)
+
+    def due(self):
+        if self._first_added is None:
+            return False
+        return len(self) >= self.batch_size or time.monotonic() - self._first_added >= self.flush_interval
+
+    def _write(self):
+        try:
+            with write_transaction(self.conn):
+                if self._structured:
+                    insert_log_rows(self.conn, 'structured_logs', self._structured, self.partition, self.interner, self.indexes)
+                if self._unstructured:
+                    insert_log_rows(self.conn, 'unstructured_logs', self._unstructured, self.partition, self.interner, self.indexes)
+                for sql, params in self._checkpoints.values():
+                    self.conn.execute(sql, params)
+        except BaseException:
+            self.interner.rollback()
+            raise
+        self.interner.commit()
+
+    def flush(self):
+        if not len(self) and not self._checkpoints:
+            return
+        attempt = 0
+        while True:
+            try:
+                self._write()
+                break
+            except sqlite3.OperationalError as e:
+                if not is_busy(e) or attempt >= self.busy_retries:
+                    raise
+                # The transaction was rolled back, so the whole batch is written again.
+                attempt += 1
+                self.busy += 1
+                print(f"Database busy, retrying batch ({attempt}/{self.busy_retries}): {e}", file=sys.stderr)
+                time.sleep(0.1)
+        self.rows += len(self)
+        self.batches += 1
+        self._structured = []
+        self._unstructured = []
+        self._checkpoints = {}
+        self._first_added = None
+
+def process_log(log, source, service=None, writer=None):
+    table, log_data = parse_log(log, source, service)
+    if writer is not None:
+        writer.add_row(table, structured_log_row(log_data) if table == 'structured_logs' else unstructured_log_row(log_data))
+    elif table == 'structured_logs':
+        store_structured_log(log_data)
+    else:
+        store_unstructured_log(log_data)
+
+class IngestPipeline:
+    """Reader thread -> parser processes -> this thread, the only SQLite writer.
+
+    The reader drains the stream in `read_size` reads and queues complete lines in chunks of
+    up to `chunk_lines`. Chunks are parsed by a pool of `workers` processes (inline when 0),
+    and results are consumed in submission order, so rows keep the stream's order. The chunk
+    queue and the number of chunks being parsed are both capped at `max_pending`. When
+    parsing or writing falls behind, the reader stops reading and the pipe fills up.
+
+    With `timestamps`, lines carry docker's per-line timestamps. The pipeline keeps a
+    high-water mark per service, starting from `checkpoints` ({service: (timestamp, seen)}),
+    and checkpoints it in the same transaction as the rows. Only the replay of a resumed
+    stream is dropped: lines below the mark it resumed from, and at the mark as many as were
+    stored. Once a newer line arrives every line is kept, even one older than the mark, as
+    lines written to stdout and stderr interleave out of order.
+
+    Chunks are parsed by `parse` (log_parsing.parse_lines unless a subclass sets another),
+    which must be a module-level function so the pool can pickle it.
+    """
+
+    parse = staticmethod(parse_lines)
+
+    def __init__(self, writer, workers=None, chunk_lines=1000, read_size=1 << 20, max_pending=None, stats_interval=None,
+                 timestamps=False, checkpoints=None):
+        self.writer = writer
+        # One core is left to the reader and the writer.
+        self.workers = max(0, (os.cpu_count() or 1) - 1) if workers is None else workers
+        self.chunk_lines = chunk_lines
+        self.read_size = read_size
+        self.max_pending = max_pending or max(2, self.workers * 2)
+        self.stats_interval = stats_interval
+        self._chunks = queue.Queue(maxsize=self.max_pending)
+        self.timestamps = timestamps
+        # service -> [timestamp, lines stored with that timestamp, lines still to skip at that timestamp while
+        # replaying up to it, or None once past it]
+        self._marks = {service: [timestamp, seen, seen] for service, (timestamp, seen) in (checkpoints or {}).items()}
+        self.duplicates_skipped = 0
+        self.read_bytes = 0
+        self.read_lines = 0
+        self.parsed_lines = 0
+        self.parse_errors = 0
+        self._read_error = None
+
+    def _split(self, partial, data, end):
+        # Splits partial + data into chunks of complete lines, each paired with the stream offset just past
+        # its last line. Returns (chunks, the trailing partial line, the new end offset).
+        self.read_bytes += len(data)
+        lines = (partial + data).split(b'\n')
+        partial = lines.pop()
+        self.read_lines += len(lines)
+        chunks = []
+        for start in range(0, len(lines), self.chunk_lines):
+            chunk = lines[start:start + self.chunk_lines]
+            end += sum(map(len, chunk)) + len(chunk)
+            chunks.append((chunk, end))
+        return chunks, partial, end
+
+    def _read(self, stream):
+        # The None sentinel always follows, so run() never waits on a reader that has died; an error
+        # from the stream goes to run() to be raised there, once the lines read before it are stored.
+        partial = b''
+        end = 0
+        try:
+            while True:
+                data = stream.read1(self.read_size)
+                if not data:
+                    break
+                chunks, partial, end = self._split(partial, data, end)
+                for item in chunks:
+                    self._chunks.put(item)
+            if partial:
+                self.read_lines += 1
+                self._chunks.put(([partial], end + len(partial)))
+        except BaseException as e:
+            self._read_error = e
+        finally:
+            self._chunks.put(None)
+
+    def _is_duplicate(self, service, timestamp):
+        # Timestamps are normalized to a fixed width, so text order is time order.
+        mark = self._marks.get(service)
+        if mark is None or timestamp > mark[0]:
+            self._marks[service] = [timestamp, 1, None]
+            return False
+        if mark[2] is not None:
+            if timestamp < mark[0]:
+                return True
+            if mark[2]:
+                mark[2] -= 1
+                return True
+        if timestamp == mark[0]:
+            mark[1] += 1
+        return False
+
+    def _consume(self, parsed, end):
+        writer = self.writer
+        advanced = set()
+        for table, row, position in parsed:
+            if position is not None:
+                if self._is_duplicate(*position):
+                    self.duplicates_skipped += 1
+                    continue
+                advanced.add(position[0])
+            if table is None:
+                self.parse_errors += 1
+                print(row)
+            else:
+                writer.add_row(table, row)
+        self.parsed_lines += len(parsed)
+        for service in advanced:
+            timestamp, seen, _ = self._marks[service]
+            writer.checkpoint(('source', service), UPDATE_SOURCE_CHECKPOINT, (service, timestamp, seen))
+        if writer.due():
+            writer.flush()
+
+    def stats(self):
+        return {
+            'read_bytes': self.read_bytes,
+            'read_lines': self.read_lines,
+            'parsed_lines': self.parsed_lines,
+            'parse_errors': self.parse_errors,
+            'duplicates_skipped': self.duplicates_skipped,
+            'written_rows': self.writer.rows,
+            'batches': self.writer.batches,
+            'queued_chunks': self._chunks.qsize(),
+        }
+
+    def _report(self, previous, elapsed):
+        current = self.stats()
+        rates = {
+            f'{name}_per_sec': round((current[name] - previous[name]) / elapsed, 1)
+            for name in ('read_lines', 'parsed_lines', 'written_rows')
+        }
+        print(json.dumps({**current, **rates}), file=sys.stderr)
+        return current
+
+    def run(self, stream, source):
+        pool = None
+        if self.workers:
+            pool = ProcessPoolExecutor(self.workers)
+            # Start the workers before the reader thread exists, so they are not forked mid-read.
+            pool.submit(self.parse, [], source, self.timestamps).result()
+        reader = threading.Thread(target=self._read, args=(stream,), daemon=True)
+        reader.start()
+        pending = deque()
+        reading = True
+        last_report = time.monotonic()
+        previous = self.stats()
+        try:
+            while reading or pending:
+                if pending and pending[0][0].done():
+                    future, end = pending.popleft()
+                    self._consume(future.result(), end)
+                elif reading and len(pending) < self.max_pending:
+                    try:
+                        item = self._chunks.get(timeout=0.01 if pending else self.writer.flush_interval)
+                    except queue.Empty:
+                        item = ()
+                    if item is None:
+                        reading = False
+                    elif item and pool is not None:
+                        chunk, end = item
+                        pending.append((pool.submit(self.parse, chunk, source, self.timestamps), end))
+                    elif item:
+                        chunk, end = item
+                        self._consume(self.parse(chunk, source, self.timestamps), end)
+                else:
+                    wait([pending[0][0]], timeout=self.writer.flush_interval)
+                if self.writer.due():
+                    self.writer.flush()
+                if self.stats_interval and time.monotonic() - last_report >= self.stats_interval:
+                    now = time.monotonic()
+                    previous = self._report(previous, now - last_report)
+                    last_report = now
+            if self._read_error is not None:
+                raise self._read_error
+        finally:
+            self.writer.flush()
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+def merge_stream_checkpoints(checkpoints):
+    # `docker compose logs` interleaves a container's stdout and stderr under one prefix. Where --containers
+    # left a stderr mark (<key>/stderr) older than the stdout one, the service resumes from the stderr mark,
+    # so no stderr line is skipped; stdout lines between the two marks may be stored again.
+    merged = dict(checkpoints)
+    for key, (timestamp, seen) in checkpoints.items():
+        service, _, stream = key.rpartition('/')
+        if stream == 'stderr' and service in merged and timestamp < merged[service][0]:
+            merged[service] = (timestamp, seen)
+    return merged
+
+def resume_since(checkpoints):
+    # Replay from the oldest service mark; the pipeline drops what was already stored. Databases written
+    # before per-service marks existed fall back to the old wall-clock checkpoint.
+    if checkpoints:
+        return min(timestamp for timestamp, _ in checkpoints.values())
+    return get_last_processed_timestamp()
+
+COMPOSE_FILE = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'example_compose', 'docker-compose.yml')
+)
+
+def tail_logs(writer=None, pipeline=None):
+    if writer is None:
+        writer = BatchWriter()
+    checkpoints = merge_stream_checkpoints(get_source_checkpoints())
+    if pipeline is None:
+        pipeline = IngestPipeline(writer, timestamps=True, checkpoints=checkpoints)
+    since = resume_since(checkpoints) if pipeline.timestamps else get_last_processed_timestamp()
+    command = ["docker", "compose", "-f", COMPOSE_FILE, "logs", "-f"]
+    if pipeline.timestamps:
+        command.append("--timestamps")
+    if since:
+        command.extend(["--since", since])
+
+    process = None
+    try:
+        # docker's own messages go straight to our stderr: a pipe nobody reads would fill up and stall it.
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=None)
+        pipeline.run(process.stdout, 'docker-compose')
+    finally:
+        if process:
+            process.terminate()
+
+# Segment records: 4-byte big-endian length, then the rendered JSON event. The logger ends a segment it
+# has closed with an empty record (logger.segments.SEGMENT_END).
+SEGMENT_RECORD_LENGTH = struct.Struct('>I')
+SEGMENT_END = SEGMENT_RECORD_LENGTH.pack(0)
+
+def get_segment_offset(segment):
+    cursor.execute('SELECT offset FROM segment_offsets WHERE segment=?', (segment,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+UPDATE_SEGMENT_OFFSET = 'INSERT OR REPLACE INTO segment_offsets (segment, offset) VALUES (?, ?)'
+
+def update_segment_offset(segment, offset):
+    cursor.execute(UPDATE_SEGMENT_OFFSET, (segment, offset))
     conn.commit()
 
-def process_log(log, source):
+def segment_service(segment):
+    # <service>-<start ms>-<pid>.seg
+    return segment[:-len('.seg')].rsplit('-', 2)[0]
+
+def read_segment(path, offset):
+    """Yield (record, end_offset) for each complete record after offset.
+
+    A trailing record that is still being written is left for the next read.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    pos = 0
+    header = SEGMENT_RECORD_LENGTH.size
+    while pos + header <= len(data):
+        (length,) = SEGMENT_RECORD_LENGTH.unpack_from(data, pos)
+        end = pos + header + length
+        if end > len(data):
+            break
+        yield data[pos + header:end], offset + end
+        pos = end
+
+def ingest_segments(directory, writer=None):
+    if writer is None:
+        writer = BatchWriter()
+    processed = 0
+    for segment in sorted(os.listdir(directory)):
+        if not segment.endswith('.seg'):
+            continue
+        path = os.path.join(directory, segment)
+        offset = get_segment_offset(segment)
+        if os.path.getsize(path) <= offset:
+            continue
+        service = segment_service(segment)
+        for record, end in read_segment(path, offset):
+            if record:
+                try:
+                    process_log(record.decode('utf-8'), segment, service=service, writer=writer)
+                except Exception as e:
+                    print(f"Error processing log: {e}")
+                processed += 1
+            writer.checkpoint(segment, UPDATE_SEGMENT_OFFSET, (segment, end))
+            if writer.due():
+                writer.flush()
+    writer.flush()
+    return processed
+
+def remove_ingested_segments(directory):
+    """Delete each segment the logger has closed whose records are all stored, and its offset.
+
+    Run after ingest_segments() has flushed. The file goes before its offset row, so an
+    interruption in between cannot leave a row-less file to be read again from the start.
+    A segment without the end record (one still being written, or left by a process that
+    died) is kept.
+    """
+    removed = 0
+    for segment in sorted(os.listdir(directory)):
+        if not segment.endswith('.seg'):
+            continue
+        path = os.path.join(directory, segment)
+        size = os.path.getsize(path)
+        if size < len(SEGMENT_END) or get_segment_offset(segment) < size:
+            continue
+        with open(path, 'rb') as f:
+            f.seek(size - len(SEGMENT_END))
+            if f.read() != SEGMENT_END:
+                continue
+        os.remove(path)
+        cursor.execute('DELETE FROM segment_offsets WHERE segment=?', (segment,))
+        conn.commit()
+        removed += 1
+    return removed
+
+def tail_segments(directory, poll_interval=1.0, follow=True, writer=None, keep=False):
+    if writer is None:
+        writer = BatchWriter()
+    while True:
+        processed = ingest_segments(directory, writer)
+        if not keep:
+            remove_ingested_segments(directory)
+        if not follow:
+            return
+        if not processed:
+            time.sleep(poll_interval)
+
+IMPORT_FORMATS = ('auto', 'compose', 'json-file')
+
+def get_import_offset(path):
+    cursor.execute('SELECT offset, size FROM import_offsets WHERE path=?', (path,))
+    row = cursor.fetchone()
+    return row if row else (0, None)
+
+UPDATE_IMPORT_OFFSET = 'INSERT OR REPLACE INTO import_offsets (path, offset, size) VALUES (?, ?, ?)'
+
+def open_import_file(path):
+    # gzip is recognised by its magic number rather than the file name.
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+    return gzip.open(path, 'rb') if compressed else open(path, 'rb')
+
+def import_service(path):
+    # Service name for a json-file log: orders-json.log.gz -> orders
+    name = os.path.basename(path).split('.', 1)[0]
+    return name[:-len('-json')] if name.endswith('-json') else name
+
+class BulkImport(IngestPipeline):
+    """Load one saved log file through the parser pool, resuming where an earlier import stopped.
+
+    `path` is plain or gzip-compressed output of `docker compose logs` (`service | payload`
+    lines, with or without --timestamps), or a log written by docker's json-file driver, whose
+    lines all belong to `service`. `file_format` "auto" tells them apart by the first line. The
+    offset reached (in uncompressed bytes) is checkpointed with the rows, so a rerun continues
+    at the next line; a file read to the end is skipped until its size changes. Archived lines
+    are older than anything tail_logs has stored, so source_checkpoints are neither consulted
+    nor moved.
+    """
+
+    def __init__(self, writer, path, file_format='auto', service=None, read_size=16 << 20, chunk_lines=5000, **kwargs):
+        if file_format not in IMPORT_FORMATS:
+            raise ValueError(f"Unknown import format {file_format!r}, expected one of {IMPORT_FORMATS}")
+        super().__init__(writer, read_size=read_size, chunk_lines=chunk_lines, timestamps=True, **kwargs)
+        self.path = os.path.abspath(path)
+        self.file_format = file_format
+        self.service = service
+        self.start_offset, self.imported_size = get_import_offset(self.path)
+        self.offset = self.start_offset
+
+    def _consume(self, parsed, end):
+        writer = self.writer
+        for table, row, _ in parsed:
+            if table is None:
+                self.parse_errors += 1
+                print(row)
+            else:
+                writer.add_row(table, row)
+        self.parsed_lines += len(parsed)
+        self.offset = self.start_offset + end
+        writer.checkpoint(('import', self.path), UPDATE_IMPORT_OFFSET, (self.path, self.offset, None))
+        if writer.due():
+            writer.flush()
+
+    def run(self):
+        # Returns False when the file was already imported in full.
+        size = os.path.getsize(self.path)
+        if self.imported_size == size:
+            return False
+        with open_import_file(self.path) as stream:
+            if self.start_offset:
+                stream.seek(self.start_offset)
+            file_format = self.file_format
+            if file_format == 'auto':
+                file_format = 'json-file' if stream.peek(8).lstrip().startswith(b'{"log":') else 'compose'
+            if file_format == 'json-file':
+                self.parse = parse_json_file_lines
+                source = self.service or import_service(self.path)
+            else:
+                source = 'docker-compose'
+            super().run(stream, source)
+        self.writer.checkpoint(('import', self.path), UPDATE_IMPORT_OFFSET, (self.path, self.offset, size))
+        self.writer.flush()
+        return True
+
+def import_files(paths, writer, file_format='auto', service=None, workers=None, stats_interval=None):
+    """Bulk-load files one after another, then build the indexes of the partitions they created.
+
+    Prints one JSON line per file to stderr, with lines/sec and MB/sec, and returns the number
+    of lines read. A file that cannot be read to the end (a truncated or corrupt gzip) keeps
+    the rows read before the error, is reported with its error, and the next file is loaded.
+    """
+    total = 0
+    for path in paths:
+        started = time.monotonic()
+        rows = writer.rows
+        job = BulkImport(writer, path, file_format, service, workers=workers, stats_interval=stats_interval)
+        try:
+            imported = job.run()
+        except (OSError, EOFError, zlib.error) as e:
+            total += job.read_lines
+            print(json.dumps({
+                'path': job.path, 'failed': f'{type(e).__name__}: {e}', 'stopped_at': job.offset, 'rows': writer.rows - rows,
+            }), file=sys.stderr)
+            continue
+        if not imported:
+            print(json.dumps({'path': job.path, 'skipped': 'already imported'}), file=sys.stderr)
+            continue
+        elapsed = max(time.monotonic() - started, 1e-9)
+        total += job.read_lines
+        print(json.dumps({
+            'path': job.path,
+            'resumed_at': job.start_offset,
+            'lines': job.read_lines,
+            'rows': writer.rows - rows,
+            'parse_errors': job.parse_errors,
+            'seconds': round(elapsed, 3),
+            'lines_per_sec': round(job.read_lines / elapsed, 1),
+            'mb_per_sec': round(job.read_bytes / elapsed / 1e6, 2),
+        }), file=sys.stderr)
+    started = time.monotonic()
+    index_partitions(writer.conn)
+    print(json.dumps({'indexes_seconds': round(time.monotonic() - started, 3)}), file=sys.stderr)
+    return total
+
+def rewind(timestamp, seconds):
+    # An ISO timestamp `seconds` earlier, to whole seconds, as docker's --since takes it.
+    return (datetime.strptime(timestamp[:19], '%Y-%m-%dT%H:%M:%S') - timedelta(seconds=seconds)).isoformat() + 'Z'
+
+def compose_prefix(name, project):
+    # The prefix `docker compose logs` gives a container's lines: its name without the project, so
+    # example_compose-api-1 logs as api-1. A container_name set in the compose file is kept whole.
+    if project and name.startswith(f'{project}-'):
+        return name[len(project) + 1:]
+    return name
+
+async def list_containers(compose_file=COMPOSE_FILE):
+    # {container name: compose_prefix()} for the running containers of the compose project.
+    process = await asyncio.create_subprocess_exec(
+        'docker', 'compose', '-f', compose_file, 'ps', '--format', '{{.Name}} {{.Project}}',
+        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
     try:
-        # Extract the service name and JSON part of the log
-        if ' | ' in log:
-            service, log = log.split(' | ', 1)
-        else:
-            service = source
-        
-        log_data = json.loads(log)
-        if 'event' in log_data and 'level' in log_data:
-            log_data['timestamp'] = datetime.utcnow().isoformat()
-            log_data['service'] = service.strip()
-            log_data['log_level'] = log_data['level']
-            log_data['message'] = log_data['event']
-            log_data['custom_fields'] = log_data.get('custom_fields', {})
-            if 'function_kwargs' in log_data:
-                log_data['custom_fields']['function_kwargs'] = log_data['function_kwargs']
-
-            # Include all additional keys in custom_fields
-            known_keys = {
-                'timestamp',
-                'service',
-                'log_level',
-                'message',
-                'correlation_id',
-                'filename',
-                'func_name',
-                'lineno',
-                'request_id',
-                'user_id',
-                'custom_fields',
-                'event',
-                'level',
-                'function_kwargs',
-            }
-            for key, value in log_data.items():
-                if key not in known_keys:
-                    log_data['custom_fields'][key] = value
-            
-            store_structured_log(log_data)
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        # Let it exit (it is quick) while the loop can still hear about it.
+        await process.wait()
+        raise
+    if process.returncode:
+        raise RuntimeError(stderr.decode('utf-8', 'replace').strip())
+    containers = {}
+    for line in stdout.decode('utf-8').splitlines():
+        name, _, project = line.strip().partition(' ')
+        if name:
+            containers[name] = compose_prefix(name, project)
+    return containers
+
+class ContainerSource:
+    """One container followed with `docker logs -f --timestamps`, its stdout and stderr as two streams.
+
+    Rows and marks are keyed on `key`, the prefix `docker compose logs` gives the container's
+    lines (see compose_prefix(); the container name when not given), so they are the service
+    names and marks tail_logs uses. Docker orders lines within a stream but not across the two,
+    so each stream has its own mark in source_checkpoints: `key` for stdout, the mark tail_logs
+    reads and writes, and `<key>/stderr` for stderr. A reopened container resumes with --since
+    at the older mark. A stream with no mark yet has stored nothing, and may have had lines
+    queued but not stored, so it is replayed from `replay` seconds before the other stream's mark.
+    """
+
+    def __init__(self, name, key=None, replay=60.0):
+        self.name = name
+        self.key = key or name
+        self.source = self.key
+        self.parse = parse_container_lines
+        self.replay = replay
+        self.process = None
+
+    def mark_key(self, stream):
+        return self.key if stream == 'stdout' else f'{self.key}/{stream}'
+
+    async def open(self, marks):
+        found = [marks[key] for key in (self.mark_key('stdout'), self.mark_key('stderr')) if key in marks]
+        for mark in found:
+            # The stream replays up to the mark, and `seen` of the lines at it were stored already.
+            mark[2] = mark[1]
+        command = ['docker', 'logs', '-f', '--timestamps']
+        if found:
+            since = min(mark[0] for mark in found)
+            command += ['--since', since if len(found) == 2 else rewind(since, self.replay)]
+        command.append(self.name)
+        self.process = await asyncio.create_subprocess_exec(
+            *command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        return {'stdout': self.process.stdout, 'stderr': self.process.stderr}
+
+    def prepare(self, writer, stream, parsed, end):
+        key = self.mark_key(stream)
+        prepared = []
+        for table, row, position in parsed:
+            if position is None:
+                # With --timestamps every line from the container has one; the rest are docker's own messages.
+                print(f"{self.name}: {row[-1] if table == 'unstructured_logs' else row}")
+                continue
+            prepared.append((table, row, (key, position[1])))
+        return prepared
+
+    async def close(self, ended=False):
+        # Once both streams have ended, docker is exiting by itself. Signalling it then can reap it behind
+        # asyncio's back (Popen polls before it signals), so it is only terminated when still following.
+        if self.process is None:
+            return
+        if not ended and self.process.returncode is None:
+            self.process.terminate()
+        await self.process.wait()
+
+class FileSource:
+    """A log file followed like `tail -f`, from the offset stored for it in import_offsets.
+
+    The file holds `docker compose logs` output or a docker json-file log (see BulkImport). At
+    the end of the file it is polled every `poll_interval` seconds; a line still being written
+    waits for its newline. Rotation is not followed: add a source for the new file.
+    """
+
+    def __init__(self, path, file_format='auto', service=None, poll_interval=1.0):
+        if file_format not in IMPORT_FORMATS:
+            raise ValueError(f"Unknown import format {file_format!r}, expected one of {IMPORT_FORMATS}")
+        self.path = os.path.abspath(path)
+        self.name = self.path
+        self.file_format = file_format
+        self.service = service
+        self.poll_interval = poll_interval
+        self.parse = None
+        self.source = None
+        self.start_offset = 0
+        self._file = None
+
+    def _detect(self, head):
+        file_format = self.file_format
+        if file_format == 'auto':
+            file_format = 'json-file' if head.lstrip().startswith(b'{"log":') else 'compose'
+        if file_format == 'json-file':
+            self.parse, self.source = parse_json_file_lines, self.service or import_service(self.path)
         else:
-            store_unstructured_log({'timestamp': datetime.utcnow().isoformat(), 'source': source, 'log': log})
-    except json.JSONDecodeError:
-        store_unstructured_log({'timestamp': datetime.utcnow().isoformat(), 'source': source, 'log': log})
-
-def tail_logs():
-    last_processed_timestamp = get_last_processed_timestamp()
-    repo_root = os.path.dirname(os.path.abspath(__file__))
-    compose_file = os.path.normpath(os.path.join(repo_root, '..', 'example_compose', 'docker-compose.yml'))
-    command = ["docker", "compose", "-f", compose_file, "logs", "-f"]
-    if last_processed_timestamp:
-        command.extend(["--since", last_processed_timestamp])
+            self.parse, self.source = parse_lines, 'docker-compose'
 
-    try:
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        
+    async def open(self, marks):
+        self.start_offset = get_import_offset(self.path)[0]
+        self._file = open(self.path, 'rb')
+        head = self._file.read(64)
+        # An empty file is detected from its first data instead.
+        if head or self.file_format != 'auto':
+            self._detect(head)
+        self._file.seek(self.start_offset)
+        return {'file': self}
+
+    async def read(self, size):
+        # Never returns b'': at the end of the file it waits for more.
+        while True:
+            data = self._file.read(size)
+            if data:
+                if self.parse is None:
+                    self._detect(data)
+                return data
+            await asyncio.sleep(self.poll_interval)
+
+    def prepare(self, writer, stream, parsed, end):
+        # Progress is the offset in the file; timestamps in its lines are not marks.
+        writer.checkpoint(('import', self.path), UPDATE_IMPORT_OFFSET, (self.path, self.start_offset + end, None))
+        return [(table, row, None) for table, row, _ in parsed]
+
+    async def close(self, ended=False):
+        if self._file is not None:
+            self._file.close()
+
+class FollowedSource:
+    # A source being followed by MultiSourceIngester: its chunk queue and how many of its chunks are unwritten.
+
+    def __init__(self, source, max_chunks):
+        self.source = source
+        self.chunks = asyncio.Queue(max_chunks)
+        self.queued = False
+        self.removed = False
+        self.outstanding = 0
+        self.drained = asyncio.Event()
+        self.task = None
+
+class MultiSourceIngester(IngestPipeline):
+    """Follow many sources at once on one asyncio loop, each as its own stream.
+
+    Sources are ContainerSource and FileSource objects. Every stream of a source (a container's
+    stdout and stderr, or a file) has its own reader task, so a chatty stderr is always drained
+    and one source never waits on another. Readers queue chunks of up to `chunk_lines` lines,
+    at most `max_chunks` per source; when its queue is full a source's readers stop reading, and
+    only that source's pipe fills up. Queued chunks go to the parser pool round-robin, one chunk
+    per source per turn, with at most `max_pending` in flight. Rows are written through `writer`
+    on the loop thread in dispatch order, each source's progress in the same transaction.
+
+    add_source() and remove_source() may be called while run() is going, on the loop thread
+    (from another thread, through loop.call_soon_threadsafe). With `discover_interval`, the
+    running containers of the compose project are listed that often: new ones are added and
+    those gone are removed. A source that is removed, or whose streams end, is re-added only
+    once its last chunks are written, so a reopened stream resumes from its latest progress.
+    """
+
+    def __init__(self, writer, workers=None, chunk_lines=1000, read_size=1 << 16, max_pending=None, max_chunks=4,
+                 stats_interval=None, discover_interval=None, checkpoints=None):
+        super().__init__(
+            writer, workers=workers, chunk_lines=chunk_lines, read_size=read_size, max_pending=max_pending,
+            stats_interval=stats_interval, timestamps=True, checkpoints=checkpoints,
+        )
+        self.max_chunks = max_chunks
+        self.discover_interval = discover_interval
+        self.sources = {}
+        self._ready = None
+        self._dispatched = None
+        self._pool = None
+        self._closing = False
+
+    def add_source(self, source):
+        # Returns False if a source of that name is still being followed.
+        if source.name in self.sources:
+            return False
+        followed = FollowedSource(source, self.max_chunks)
+        self.sources[source.name] = followed
+        followed.task = asyncio.get_running_loop().create_task(self._follow_source(followed))
+        return True
+
+    def remove_source(self, name):
+        # Chunks not yet parsed are dropped; the stored progress still points before them.
+        followed = self.sources.get(name)
+        if followed is not None and not followed.removed:
+            followed.removed = True
+            followed.task.cancel()
+
+    async def _follow_source(self, followed):
+        source = followed.source
+        readers = []
+        ended = False
+        try:
+            streams = await source.open(self._marks)
+            readers = [asyncio.create_task(self._read_stream(followed, stream, reader)) for stream, reader in streams.items()]
+            await asyncio.gather(*readers)
+            ended = True
+        except Exception as e:
+            print(f"Error following {source.name}: {e}")
+        finally:
+            for reader in readers:
+                reader.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+            await source.close(ended)
+            if not self._closing:
+                while followed.outstanding:
+                    followed.drained.clear()
+                    await followed.drained.wait()
+                # A reopened source reads its progress back from the database.
+                self.writer.flush()
+            if self.sources.get(source.name) is followed:
+                del self.sources[source.name]
+
+    async def _read_stream(self, followed, stream, reader):
+        partial = b''
+        end = 0
         while True:
-            output = process.stdout.readline()
-            if output == b'' and process.poll() is not None:
+            data = await reader.read(self.read_size)
+            if not data:
                 break
+            chunks, partial, end = self._split(partial, data, end)
+            for chunk, chunk_end in chunks:
+                await self._queue(followed, (stream, chunk, chunk_end))
+        if partial:
+            self.read_lines += 1
+            await self._queue(followed, (stream, [partial], end + len(partial)))
+
+    async def _queue(self, followed, item):
+        await followed.chunks.put(item)
+        # Counted once queued: a reader cancelled while waiting for room has queued nothing.
+        followed.outstanding += 1
+        # A source is in the ready queue once for as long as it has chunks queued.
+        if not followed.queued:
+            followed.queued = True
+            self._ready.put_nowait(followed)
+
+    def _written(self, followed):
+        followed.outstanding -= 1
+        if not followed.outstanding:
+            followed.drained.set()
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            followed = await self._ready.get()
+            stream, chunk, end = followed.chunks.get_nowait()
+            if followed.chunks.empty():
+                followed.queued = False
+            else:
+                self._ready.put_nowait(followed)
+            if followed.removed:
+                self._written(followed)
+                continue
+            source = followed.source
+            if self._pool is None:
+                parsed = loop.create_future()
+                parsed.set_result(source.parse(chunk, source.source, True))
+            else:
+                parsed = loop.run_in_executor(self._pool, source.parse, chunk, source.source, True)
+            await self._dispatched.put((followed, stream, parsed, end))
+
+    async def _write(self):
+        while True:
+            followed, stream, parsed, end = await self._dispatched.get()
+            parsed = await parsed
+            self._consume(followed.source.prepare(self.writer, stream, parsed, end), end)
+            self._written(followed)
+
+    async def _tick(self):
+        last_report = time.monotonic()
+        previous = self.stats()
+        while True:
+            await asyncio.sleep(self.writer.flush_interval)
+            if self.writer.due():
+                self.writer.flush()
+            if self.stats_interval and time.monotonic() - last_report >= self.stats_interval:
+                now = time.monotonic()
+                previous = self._report(previous, now - last_report)
+                last_report = now
+
+    async def _discover(self):
+        while True:
+            try:
+                running = await list_containers()
+            except Exception as e:
+                print(f"Error listing containers: {e}")
+            else:
+                for name, key in running.items():
+                    if name not in self.sources:
+                        self.add_source(ContainerSource(name, key))
+                for name, followed in list(self.sources.items()):
+                    if isinstance(followed.source, ContainerSource) and name not in running:
+                        self.remove_source(name)
+            await asyncio.sleep(self.discover_interval)
+
+    def stats(self):
+        stats = super().stats()
+        stats['sources'] = len(self.sources)
+        stats['queued_chunks'] = sum(followed.chunks.qsize() for followed in self.sources.values())
+        return stats
 
-            if output:
-                new_timestamp = datetime.utcnow().isoformat()
+    async def run(self, sources=()):
+        """Follow `sources` (and discovered containers) until cancelled.
+
+        Without discovery, returns once every source has ended and its rows are written.
+        """
+        self._ready = asyncio.Queue()
+        self._dispatched = asyncio.Queue(self.max_pending)
+        self._closing = False
+        if self.workers:
+            self._pool = ProcessPoolExecutor(self.workers)
+            # Start the workers before any subprocess exists, so they do not inherit its pipes.
+            self._pool.submit(parse_lines, [], '', True).result()
+        tasks = [asyncio.create_task(self._dispatch()), asyncio.create_task(self._write()), asyncio.create_task(self._tick())]
+        if self.discover_interval:
+            tasks.append(asyncio.create_task(self._discover()))
+        try:
+            for source in sources:
+                self.add_source(source)
+            while self.discover_interval or self.sources:
+                done, _ = await asyncio.wait(tasks, timeout=self.writer.flush_interval, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    # The dispatch, write and tick loops only end by raising.
+                    task.result()
+        finally:
+            # Rows already handed to the writer are stored with their progress; the rest is replayed next time.
+            self._closing = True
+            for followed in list(self.sources.values()):
+                followed.task.cancel()
+            await asyncio.gather(*(followed.task for followed in list(self.sources.values())), return_exceptions=True)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.writer.flush()
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+class PartitionMaintenance:
+    """Retention and compaction of log partitions, on a background thread with its own connection.
+
+    Every `interval` seconds, partitions whose newest row is older than `retention_days` are
+    dropped: one short transaction takes a partition out of log_partitions and the view, so no
+    query sees it again, then its rows and full-text index are deleted `step_rows` at a time and
+    the emptied tables dropped. A pass that stops midway is finished by the next one. Partitions
+    with no new rows for `cold_after` seconds have their full-text index merged down, and pages
+    freed by drops are handed back to the filesystem, in transactions of at most `step_pages`
+    pages. No step holds the write lock for long, so ingestion only waits briefly for it.
+
+    Each pass also counts the custom_fields keys of up to `sample_rows` new structured rows. A key
+    found in at least `promote_ratio` of `promote_min_rows` or more sampled rows is promoted to an
+    indexed column, up to `max_promoted` keys in all. Building a promoted column's index holds
+    the write lock for at most `max_lock_seconds`; a partition too large for that keeps the
+    column unindexed (counted in `index_skipped`) and is not tried again by this instance.
+    """
+
+    def __init__(self, db_path=DB_PATH, retention_days=None, interval=60.0, cold_after=3600.0, step_pages=500,
+                 synchronous=SYNCHRONOUS, sample_rows=10000, promote_ratio=0.1, promote_min_rows=1000, max_promoted=16,
+                 max_lock_seconds=2.0, step_rows=10000):
+        self.db_path = db_path
+        self.retention_days = retention_days
+        self.interval = interval
+        self.cold_after = cold_after
+        self.step_pages = step_pages
+        self.step_rows = step_rows
+        self.synchronous = synchronous
+        self.sample_rows = sample_rows
+        self.promote_ratio = promote_ratio
+        self.promote_min_rows = promote_min_rows
+        self.max_promoted = max_promoted
+        self.max_lock_seconds = max_lock_seconds
+        self._sampled_id = None
+        self._unindexed = set()
+        self.promoted = 0
+        self.index_skipped = 0
+        self.dropped = 0
+        self.compacted = 0
+        self.vacuumed_pages = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.execute(f'PRAGMA synchronous={self.synchronous}')
+        return connection
+
+    def drop_expired(self, connection):
+        if self.retention_days is not None:
+            cutoff = (datetime.utcnow() - timedelta(days=self.retention_days)).isoformat()
+            expired = connection.execute('SELECT name, log_table FROM log_partitions WHERE newest < ?', (cutoff,)).fetchall()
+            for name, table in expired:
+                with write_transaction(connection):
+                    # Checked again under the lock, in case rows for this partition arrived since the SELECT.
+                    if not connection.execute('DELETE FROM log_partitions WHERE name=? AND newest < ?', (name, cutoff)).rowcount:
+                        continue
+                    rebuild_log_view(connection, table)
+                self.dropped += 1
+        # A partition table missing from log_partitions was detached above, or by a pass that stopped midway.
+        partitions = {name for (name,) in connection.execute('SELECT name FROM log_partitions')}
+        for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall():
+            if PARTITION_TABLE.match(name) and name not in partitions:
+                if not self._drop_detached(connection, name):
+                    return
+
+    def _delete_rows(self, connection, table, key='rowid'):
+        # DROP TABLE frees every page of the table in one statement; deleting the rows first keeps each
+        # transaction to step_rows of them.
+        while not self._stop.is_set():
+            with write_transaction(connection):
+                deleted = connection.execute(
+                    f'DELETE FROM {table} WHERE {key} IN (SELECT {key} FROM {table} LIMIT ?)', (self.step_rows,)
+                ).rowcount
+            if deleted < self.step_rows:
+                return True
+        return False
+
+    def _drop_detached(self, connection, name):
+        fts = f'{name}_fts'
+        tables = {table for (table,) in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name IN (?, ?, ?)", (name, f'{fts}_data', f'{fts}_docsize')
+        )}
+        with write_transaction(connection):
+            # Deleted rows need not leave the full-text index, which goes with them.
+            connection.execute(f'DROP TRIGGER IF EXISTS {fts}_delete')
+        # The index's large shadow tables are plain rowid tables; the rest of it is small.
+        for table in (name, f'{fts}_data', f'{fts}_docsize'):
+            if table in tables and not self._delete_rows(connection, table):
+                return False
+        with write_transaction(connection):
+            connection.execute(f'DROP TABLE IF EXISTS {fts}')
+            connection.execute(f'DROP TABLE IF EXISTS {name}')
+        return True
+
+    def _merge(self, connection, fts):
+        while not self._stop.is_set():
+            with write_transaction(connection):
+                before = connection.total_changes
+                connection.execute(f"INSERT INTO {fts} ({fts}, rank) VALUES ('merge', ?)", (-self.step_pages,))
+                # Fewer than two changes means there was nothing left to merge.
+                if connection.total_changes - before < 2:
+                    return True
+        return False
+
+    def compact_cold(self, connection):
+        cutoff = (datetime.utcnow() - timedelta(seconds=self.cold_after)).isoformat()
+        cold = connection.execute('SELECT name FROM log_partitions WHERE compacted = 0 AND newest < ?', (cutoff,)).fetchall()
+        for (name,) in cold:
+            if not self._merge(connection, f'{name}_fts'):
+                return
+            with write_transaction(connection):
+                connection.execute('UPDATE log_partitions SET compacted = 1 WHERE name=? AND newest < ?', (name, cutoff))
+            self.compacted += 1
+
+    def vacuum(self, connection):
+        # Only a database with auto_vacuum=INCREMENTAL can shrink without a full VACUUM.
+        if connection.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            return
+        free = connection.execute('PRAGMA freelist_count').fetchone()[0]
+        while free and not self._stop.is_set():
+            with write_transaction(connection):
+                connection.execute(f'PRAGMA incremental_vacuum({self.step_pages})').fetchall()
+            remaining = connection.execute('PRAGMA freelist_count').fetchone()[0]
+            self.vacuumed_pages += free - remaining
+            if remaining >= free:
+                return
+            free = remaining
+
+    def sample_fields(self, connection):
+        if self._sampled_id is None:
+            (last_id,) = connection.execute(
+                "SELECT coalesce(max(seq), 0) FROM log_sequences WHERE log_table='structured_logs'"
+            ).fetchone()
+            self._sampled_id = max(0, last_id - self.sample_rows)
+        # Newest rows first, read from the partitions directly: custom_fields keys stay ids until counted.
+        rows = []
+        partitions = connection.execute(
+            "SELECT name FROM log_partitions WHERE log_table='structured_logs' ORDER BY newest DESC"
+        ).fetchall()
+        for (name,) in partitions:
+            rows += connection.execute(
+                f'SELECT id, custom_fields FROM {name} WHERE id > ? ORDER BY id DESC LIMIT ?',
+                (self._sampled_id, self.sample_rows - len(rows)),
+            ).fetchall()
+            if len(rows) >= self.sample_rows:
+                break
+        if not rows:
+            return
+        self._sampled_id = max(row_id for row_id, _ in rows)
+        key_counts = {}
+        for _, custom_fields in rows:
+            try:
+                fields = json.loads(custom_fields)
+            except (TypeError, ValueError):
+                continue
+            if not isinstance(fields, dict):
+                continue
+            for key_id, value in fields.items():
+                # Nested objects are left in custom_fields.
+                if not isinstance(value, (dict, list)):
+                    key_counts[key_id] = key_counts.get(key_id, 0) + 1
+        seen = {}
+        key_ids = list(key_counts)
+        for start in range(0, len(key_ids), 500):
+            chunk = key_ids[start:start + 500]
+            names = connection.execute(
+                f"SELECT id, name FROM lookup_custom_field_key WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            for key_id, field in names:
+                if PROMOTABLE_FIELD.match(field):
+                    seen[field] = key_counts[str(key_id)]
+        with write_transaction(connection):
+            connection.execute('UPDATE custom_field_columns SET sampled = sampled + ?', (len(rows),))
+            connection.executemany(
+                'INSERT INTO custom_field_columns (field, seen, sampled) VALUES (?, ?, ?) '
+                'ON CONFLICT (field) DO UPDATE SET seen = seen + excluded.seen',
+                [(field, count, len(rows)) for field, count in seen.items()],
+            )
+            # Keys too rare to ever be promoted are forgotten, so per-row keys do not pile up here.
+            connection.execute(
+                'DELETE FROM custom_field_columns WHERE column_name IS NULL AND sampled >= ? AND seen < sampled * ?',
+                (self.promote_min_rows, self.promote_ratio / 10),
+            )
+
+    def promote_fields(self, connection):
+        promoted = promoted_columns(connection)
+        slots = self.max_promoted - len(promoted)
+        if slots <= 0:
+            return
+        # Column names are case-insensitive, so `userId` and `userid` cannot both be promoted.
+        taken = {column.lower() for _, column in promoted}
+        candidates = connection.execute(
+            'SELECT field FROM custom_field_columns WHERE column_name IS NULL AND sampled >= ? AND seen >= sampled * ? '
+            'ORDER BY seen DESC',
+            (self.promote_min_rows, self.promote_ratio),
+        ).fetchall()
+        chosen = []
+        for (field,) in candidates:
+            column = f'cf_{field}'
+            if column.lower() not in taken:
+                taken.add(column.lower())
+                chosen.append((column, field))
+        chosen = chosen[:slots]
+        if not chosen:
+            return
+        now = datetime.utcnow().isoformat()
+        with write_transaction(connection):
+            connection.executemany(
+                'UPDATE custom_field_columns SET column_name = ?, promoted_at = ? WHERE field = ?',
+                [(column, now, field) for column, field in chosen],
+            )
+            # Every partition gets the columns at once, so the view and queries see one shape.
+            for (name,) in connection.execute("SELECT name FROM log_partitions WHERE log_table='structured_logs'").fetchall():
+                ensure_structured_log_columns(connection, name, indexes=False)
+            rebuild_log_view(connection, 'structured_logs')
+        self.promoted += len(chosen)
+
+    def index_promoted_fields(self, connection):
+        # One partition per transaction: building an index over a full partition is the slow part. CREATE INDEX
+        # is a single statement, so the time it may hold the lock is bounded by interrupting it instead.
+        promoted = promoted_columns(connection)
+        existing = {name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        # Partitions still being bulk-loaded (indexed = 0) get theirs from index_partitions().
+        partitions = connection.execute("SELECT name FROM log_partitions WHERE log_table='structured_logs' AND indexed = 1")
+        for (name,) in partitions.fetchall():
+            if self._stop.is_set():
+                return
+            if name in self._unindexed:
+                continue
+            if any(f'idx_{name}_{column}' not in existing for _, column in promoted):
                 try:
-                    process_log(output.decode('utf-8').strip(), 'docker-compose')
-                    update_last_processed_timestamp(new_timestamp)
-                except Exception as e:
-                    print(f"Error processing log: {e}")
+                    with write_transaction(connection), lock_deadline(connection, self.max_lock_seconds):
+                        ensure_structured_log_columns(connection, name)
+                except sqlite3.OperationalError as e:
+                    if not is_interrupted(e):
+                        raise
+                    # Queries still filter on the column there, by reading custom_fields row by row.
+                    self._unindexed.add(name)
+                    self.index_skipped += 1
+
+    def run_once(self):
+        connection = self._connect()
+        try:
+            self.drop_expired(connection)
+            if self.max_promoted > 0:
+                self.sample_fields(connection)
+                self.promote_fields(connection)
+            self.index_promoted_fields(connection)
+            self.compact_cold(connection)
+            self.vacuum(connection)
+        finally:
+            connection.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except sqlite3.Error as e:
+                print(f"Partition maintenance failed: {e}", file=sys.stderr)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+def main():
+    parser = argparse.ArgumentParser(description='Store logs in logs.db from docker compose, segment files or saved log files.')
+    parser.add_argument('--import', dest='import_files', nargs='+', metavar='FILE', help='bulk-load saved `docker compose logs` output or docker json-file logs (plain or gzip) and exit; reruns resume')
+    parser.add_argument('--containers', action='store_true', help='follow each container of the compose project as its own stream instead of one `docker compose logs` stream')
+    parser.add_argument('--discover-interval', type=float, default=10.0, help='with --containers, seconds between checks for started and stopped containers')
+    parser.add_argument('--follow', action='append', metavar='FILE', help='follow a growing log file as its own stream (repeatable; combines with --containers)')
+    parser.add_argument('--format', default='auto', choices=IMPORT_FORMATS, help='with --import or --follow, the file format (default: detected from the first line)')
+    parser.add_argument('--service', help='with --import or --follow, the service name for json-file logs (default: from the file name)')
+    parser.add_argument('--segments', metavar='DIR', help='ingest segment files written with LOGGER_SEGMENT_DIR=DIR instead of tailing docker compose')
+    parser.add_argument('--once', action='store_true', help='with --segments, ingest what is there and exit')
+    parser.add_argument('--poll', type=float, default=1.0, help='with --segments, seconds between directory scans when idle')
+    parser.add_argument('--keep-segments', action='store_true', help='with --segments, keep segment files once every record is stored')
+    parser.add_argument('--batch-size', type=int, default=None, help='rows written per transaction (default: 1000, 20000 with --import)')
+    parser.add_argument('--flush-interval', type=float, default=0.5, help='seconds a partial batch may wait before it is written')
+    parser.add_argument('--workers', type=int, default=None, help='parser processes (default: CPU count - 1; 0 parses on the writer thread)')
+    parser.add_argument('--stats-interval', type=float, default=None, help='print per-stage counters and rates to stderr every N seconds')
+    parser.add_argument('--journal-mode', default=JOURNAL_MODE, help='SQLite journal_mode (default: WAL)')
+    parser.add_argument('--synchronous', default=None, choices=SYNCHRONOUS_MODES, type=str.upper, help='SQLite synchronous setting (default: NORMAL, OFF with --import)')
+    parser.add_argument('--partition', default=PARTITION, choices=tuple(PARTITION_FORMATS), help='store rows in one table per day or hour (default: day)')
+    parser.add_argument('--retention-days', type=float, default=os.getenv('LOG_PROCESSOR_RETENTION_DAYS'), help='drop partitions whose newest row is older than this')
+    parser.add_argument('--maintenance-interval', type=float, default=60.0, help='seconds between retention and compaction passes')
+    parser.add_argument('--max-promoted-fields', type=int, default=16, help='custom_fields keys that may be promoted to indexed columns (0 disables)')
+    args = parser.parse_args()
+    # A bulk import can simply be rerun after a crash, so it trades durability for speed: no fsync, large
+    # batches, and new partitions indexed once loaded.
+    bulk = bool(args.import_files)
+    synchronous = args.synchronous or ('OFF' if bulk else SYNCHRONOUS)
+    configure_connection(args.journal_mode, synchronous)
+    writer = BatchWriter(
+        batch_size=args.batch_size or (20000 if bulk else 1000), flush_interval=args.flush_interval,
+        partition=args.partition, indexes=not bulk,
+    )
+    maintenance = PartitionMaintenance(
+        retention_days=args.retention_days, interval=args.maintenance_interval, synchronous=synchronous,
+        max_promoted=args.max_promoted_fields,
+    )
+    if bulk:
+        import_files(args.import_files, writer, args.format, args.service, args.workers, args.stats_interval)
+        maintenance.run_once()
+        return
+    if args.segments and args.once:
+        tail_segments(args.segments, follow=False, writer=writer, keep=args.keep_segments)
+        maintenance.run_once()
+        return
+    maintenance.start()
+    try:
+        if args.segments:
+            tail_segments(args.segments, poll_interval=args.poll, writer=writer, keep=args.keep_segments)
+        elif args.containers or args.follow:
+            ingester = MultiSourceIngester(
+                writer, workers=args.workers, stats_interval=args.stats_interval,
+                discover_interval=args.discover_interval if args.containers else None, checkpoints=get_source_checkpoints(),
+            )
+            sources = [FileSource(path, args.format, args.service) for path in args.follow or ()]
+            asyncio.run(ingester.run(sources))
+        else:
+            pipeline = IngestPipeline(
+                writer, workers=args.workers, stats_interval=args.stats_interval,
+                timestamps=True, checkpoints=merge_stream_checkpoints(get_source_checkpoints()),
+            )
+            tail_logs(writer, pipeline)
     finally:
-        if process:
-            process.terminate()
+        maintenance.stop()
 
 if __name__ == '__main__':
-    tail_logs()
+    main()
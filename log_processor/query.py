@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+DB_PATH = os.getenv('LOG_PROCESSOR_DB') or os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs.db")
+
+# Equality filters per table; each has a (column, timestamp) index on every partition (log_processor.LOG_INDEXES).
+FILTER_COLUMNS = {
+    'structured_logs': ('correlation_id', 'request_id', 'service', 'log_level', 'user_id'),
+    'unstructured_logs': ('source',),
+}
+
+# Structured columns stored as <column>_id into lookup_<column> (log_processor.DICTIONARY_COLUMNS); the
+# keys of custom_fields are ids into lookup_custom_field_key.
+DICTIONARY_COLUMNS = ('service', 'log_level', 'filename', 'func_name')
+
+# Stored columns of each partition (log_processor.stored_columns). Named rather than `*`, which would
+# also return the cf_<key> columns of promoted custom_fields keys.
+STORED_COLUMNS = {
+    'structured_logs': (
+        'id', 'timestamp', 'service_id', 'log_level_id', 'message', 'correlation_id', 'filename_id',
+        'func_name_id', 'lineno', 'request_id', 'user_id', 'custom_fields',
+    ),
+    'unstructured_logs': ('id', 'timestamp', 'source', 'log'),
+}
+
+def connect(db_path=DB_PATH):
+    # Read-only, so queries never contend with the ingester for the write lock (the DB runs in WAL mode).
+    return sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+
+def encode_cursor(row):
+    return f"{row['id']}:{row['timestamp']}"
+
+def decode_cursor(cursor):
+    row_id, timestamp = cursor.split(':', 1)
+    return timestamp, int(row_id)
+
+def _row(description, values):
+    row = {column[0]: value for column, value in zip(description, values)}
+    if row.get('custom_fields'):
+        row['custom_fields'] = json.loads(row['custom_fields'])
+    return row
+
+def _names(conn, lookup, ids):
+    ids = [row_id for row_id in ids if row_id is not None]
+    names = {}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        names.update(conn.execute(f"SELECT id, name FROM lookup_{lookup} WHERE id IN ({', '.join('?' * len(chunk))})", chunk))
+    return names
+
+def _decode(conn, rows):
+    # Swaps the ids of a page of structured rows for their names, with one lookup per dictionary.
+    if not rows or 'custom_fields' not in rows[0]:
+        return rows
+    names = {column: _names(conn, column, {row[f'{column}_id'] for row in rows}) for column in DICTIONARY_COLUMNS}
+    key_ids = {int(key) for row in rows if isinstance(row['custom_fields'], dict) for key in row['custom_fields'] if key.isdigit()}
+    keys = _names(conn, 'custom_field_key', key_ids)
+    for position, row in enumerate(rows):
+        decoded = {}
+        for column, value in row.items():
+            if column.endswith('_id') and column[:-3] in names:
+                decoded[column[:-3]] = names[column[:-3]].get(value)
+            elif column == 'custom_fields' and isinstance(value, dict):
+                decoded[column] = {keys.get(int(key), key) if key.isdigit() else key: item for key, item in value.items()}
+            else:
+                decoded[column] = value
+        rows[position] = decoded
+    return rows
+
+def promoted_fields(conn):
+    # custom_fields keys with a column and index of their own (log_processor.PartitionMaintenance.promote_fields).
+    return dict(conn.execute('SELECT field, column_name FROM custom_field_columns WHERE column_name IS NOT NULL'))
+
+def _conditions(table, since, until, filters, prefix='', fields=None, promoted=None):
+    if table not in FILTER_COLUMNS:
+        raise ValueError(f"Unknown table {table!r}, expected one of {tuple(FILTER_COLUMNS)}")
+    where = []
+    params = []
+    if fields and table != 'structured_logs':
+        raise ValueError('custom_fields filters only apply to structured_logs')
+    for field, value in (fields or {}).items():
+        column = (promoted or {}).get(field)
+        if column is not None:
+            where.append(f'{prefix}{column} = ?')
+        else:
+            where.append(
+                f"json_extract({prefix}custom_fields, '$.\"' || (SELECT id FROM lookup_custom_field_key WHERE name = ?) || '\"') = ?"
+            )
+            params.append(field)
+        params.append(value)
+    for column, value in filters.items():
+        if value is None:
+            continue
+        if column not in FILTER_COLUMNS[table]:
+            raise ValueError(f"Cannot filter {table} on {column!r}, expected one of {FILTER_COLUMNS[table]}")
+        if column in DICTIONARY_COLUMNS and table == 'structured_logs':
+            where.append(f'{prefix}{column}_id = (SELECT id FROM lookup_{column} WHERE name = ?)')
+        else:
+            where.append(f'{prefix}{column} = ?')
+        params.append(value)
+    if since is not None:
+        where.append(f'{prefix}timestamp >= ?')
+        params.append(since)
+    if until is not None:
+        where.append(f'{prefix}timestamp < ?')
+        params.append(until)
+    return where, params
+
+def partitions(conn, table, since=None, until=None):
+    # (name, oldest, newest) of each partition of table holding rows in [since, until).
+    sql = 'SELECT name, oldest, newest FROM log_partitions WHERE log_table=?'
+    params = [table]
+    if since is not None:
+        sql += ' AND newest >= ?'
+        params.append(since)
+    if until is not None:
+        sql += ' AND oldest < ?'
+        params.append(until)
+    return conn.execute(sql, params).fetchall()
+
+def query_logs(conn, table='structured_logs', since=None, until=None, cursor=None, limit=100, ascending=False, fields=None, **filters):
+    """Return (rows, next_cursor) for one page of matching rows, newest first unless `ascending`.
+
+    Pages are keyed on (timestamp, id): pass the returned cursor back to get the next page.
+    The cursor is None once the last page has been returned. `fields` matches custom_fields
+    keys by value, through an index once the key has been promoted to a column.
+    """
+    where, params = _conditions(table, since, until, filters, fields=fields, promoted=promoted_fields(conn) if fields else None)
+    position = None
+    if cursor is not None:
+        position = decode_cursor(cursor)
+        where.append(f"(timestamp, id) {'>' if ascending else '<'} (?, ?)")
+        params.extend(position)
+    direction = 'ASC' if ascending else 'DESC'
+    candidates = partitions(conn, table, since, until)
+    if position is not None:
+        # Partitions wholly before (or, ascending, after) the cursor have nothing left for this query.
+        timestamp = position[0]
+        candidates = [
+            partition for partition in candidates
+            if (partition[2] >= timestamp if ascending else partition[1] <= timestamp)
+        ]
+    # Partitions nearest the start of the page first. Once the page is full, a partition that starts
+    # past its last row cannot contribute, and neither can any after it.
+    if ascending:
+        candidates.sort(key=lambda partition: partition[1])
+    else:
+        candidates.sort(key=lambda partition: partition[2], reverse=True)
+    rows = []
+    for name, oldest, newest in candidates:
+        if len(rows) == limit:
+            boundary = rows[-1]['timestamp']
+            if (oldest > boundary) if ascending else (newest < boundary):
+                break
+        sql = f"SELECT {', '.join(STORED_COLUMNS[table])} FROM {name}"
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += f' ORDER BY timestamp {direction}, id {direction} LIMIT ?'
+        result = conn.execute(sql, params + [limit])
+        rows.extend(_row(result.description, values) for values in result)
+        rows.sort(key=lambda row: (row['timestamp'], row['id']), reverse=not ascending)
+        del rows[limit:]
+    next_cursor = encode_cursor(rows[-1]) if len(rows) == limit else None
+    return _decode(conn, rows), next_cursor
+
+def iter_logs(conn, page_size=1000, **query):
+    # Streams every matching row, one keyset page at a time.
+    cursor = query.pop('cursor', None)
+    while True:
+        rows, cursor = query_logs(conn, cursor=cursor, limit=page_size, **query)
+        yield from rows
+        if cursor is None:
+            return
+
+def fts_query(text):
+    # Each whitespace-separated term becomes a quoted phrase, so `item-001` or `a.b` need no FTS5 escaping.
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+def search_logs(conn, text, table='structured_logs', since=None, until=None, page=0, limit=50, raw=False, fields=None, **filters):
+    """Return one page of rows matching `text` in the full-text index, best match (bm25) first.
+
+    Structured rows match on message and custom_fields values, unstructured rows on the log text.
+    All terms must match; `raw=True` passes `text` through as an FTS5 query (OR, NEAR, prefix*, ...).
+    """
+    where, params = _conditions(
+        table, since, until, filters, prefix='l.', fields=fields, promoted=promoted_fields(conn) if fields else None
+    )
+    # Each partition has its own index: take the best matches from each, then merge on rank.
+    rows = []
+    for name, _, _ in partitions(conn, table, since, until):
+        fts = f'{name}_fts'
+        sql = (
+            f"SELECT {', '.join('l.' + column for column in STORED_COLUMNS[table])}, bm25({fts}) AS rank "
+            f'FROM {fts} JOIN {name} AS l ON l.id = {fts}.rowid '
+            f'WHERE {fts} MATCH ?'
+        )
+        if where:
+            sql += ' AND ' + ' AND '.join(where)
+        sql += ' ORDER BY rank LIMIT ?'
+        result = conn.execute(sql, [text if raw else fts_query(text)] + params + [(page + 1) * limit])
+        rows.extend(_row(result.description, values) for values in result)
+    rows.sort(key=lambda row: row['rank'])
+    return _decode(conn, rows[page * limit:(page + 1) * limit])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query logs.db; prints matching rows as JSON lines, newest first.')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--unstructured', action='store_true', help='query unstructured_logs instead of structured_logs')
+    parser.add_argument('--correlation-id')
+    parser.add_argument('--request-id')
+    parser.add_argument('--service')
+    parser.add_argument('--level', dest='log_level')
+    parser.add_argument('--user-id')
+    parser.add_argument('--source', help='unstructured_logs source')
+    parser.add_argument('--field', action='append', default=[], metavar='KEY=VALUE', help='match a custom_fields key; VALUE is read as JSON if it parses (repeatable)')
+    parser.add_argument('--since', help='inclusive lower bound on timestamp (ISO 8601)')
+    parser.add_argument('--until', help='exclusive upper bound on timestamp (ISO 8601)')
+    parser.add_argument('--asc', action='store_true', help='oldest first')
+    parser.add_argument('--limit', type=int, default=100, help='rows per page')
+    parser.add_argument('--cursor', help='continue after this cursor (printed to stderr after each page)')
+    parser.add_argument('--all', action='store_true', help='stream every matching row instead of one page')
+    parser.add_argument('--search', metavar='TEXT', help='full-text search, best match first (pages with --page)')
+    parser.add_argument('--raw', action='store_true', help='with --search, TEXT is an FTS5 query')
+    parser.add_argument('--page', type=int, default=0, help='with --search, zero-based page number')
+    args = parser.parse_args(argv)
+
+    table = 'unstructured_logs' if args.unstructured else 'structured_logs'
+    filters = {column: getattr(args, column) for column in FILTER_COLUMNS[table]}
+    fields = {}
+    for field in args.field:
+        key, _, value = field.partition('=')
+        try:
+            fields[key] = json.loads(value)
+        except ValueError:
+            fields[key] = value
+    if fields:
+        filters['fields'] = fields
+    conn = connect(args.db)
+    if args.search:
+        rows = search_logs(
+            conn, args.search, table=table, since=args.since, until=args.until,
+            page=args.page, limit=args.limit, raw=args.raw, **filters,
+        )
+        for row in rows:
+            print(json.dumps(row))
+        return
+    query = dict(table=table, since=args.since, until=args.until, ascending=args.asc, cursor=args.cursor, **filters)
+    if args.all:
+        for row in iter_logs(conn, page_size=args.limit, **query):
+            print(json.dumps(row))
+        return
+    rows, next_cursor = query_logs(conn, limit=args.limit, **query)
+    for row in rows:
+        print(json.dumps(row))
+    if next_cursor is not None:
+        print(f'next cursor: {next_cursor}', file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,451 @@
+import asyncio
+import faulthandler
+import gzip
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+# log_processor opens (and migrates) its database at import.
+os.environ['LOG_PROCESSOR_DB'] = os.path.join(tempfile.mkdtemp(prefix='log_processor_test_'), 'logs.db')
+
+import log_processor  # noqa: E402
+import query  # noqa: E402
+
+
+# Schema of databases written before partitioning and dictionary encoding.
+BASELINE_SCHEMA = '''
+CREATE TABLE structured_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, service TEXT, log_level TEXT, message TEXT, correlation_id TEXT,
+    filename TEXT, func_name TEXT, lineno INTEGER, request_id TEXT, user_id TEXT, custom_fields TEXT
+);
+CREATE TABLE unstructured_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, source TEXT, log TEXT);
+CREATE TABLE timestamp (id INTEGER PRIMARY KEY, last_processed TIMESTAMP);
+'''
+
+
+def compose_line(service, timestamp, event, **fields):
+    payload = json.dumps({'event': event, 'level': 'info', **fields})
+    return f'{service} | {timestamp} {payload}'.encode('utf-8')
+
+
+def stored(service):
+    rows, _ = query.query_logs(log_processor.conn, service=service, ascending=True, limit=1000)
+    return rows
+
+
+def ingest(lines, checkpoints=None):
+    writer = log_processor.BatchWriter()
+    pipeline = log_processor.IngestPipeline(writer, workers=0, timestamps=True, checkpoints=checkpoints)
+    pipeline.run(io.BufferedReader(io.BytesIO(b'\n'.join(lines) + b'\n')), 'docker-compose')
+    return pipeline
+
+
+def test_rows_go_to_the_partition_of_their_day():
+    writer = log_processor.BatchWriter()
+    for day in ('2026-02-01', '2026-02-02'):
+        writer.add_structured({'timestamp': f'{day}T10:00:00Z', 'service': 'partitioned', 'level': 'info',
+                               'log_level': 'info', 'message': 'hello'})
+    writer.flush()
+    names = {name for name, in log_processor.conn.execute(
+        "SELECT name FROM log_partitions WHERE name IN ('structured_logs_20260201', 'structured_logs_20260202')"
+    )}
+    assert names == {'structured_logs_20260201', 'structured_logs_20260202'}
+    assert [row['timestamp'] for row in stored('partitioned')] == ['2026-02-01T10:00:00Z', '2026-02-02T10:00:00Z']
+    assert log_processor.conn.execute(
+        "SELECT count(*) FROM structured_logs WHERE service = 'partitioned'"
+    ).fetchone() == (2,)
+
+
+def test_structured_columns_are_dictionary_encoded():
+    writer = log_processor.BatchWriter()
+    writer.add_structured({'timestamp': '2026-02-03T10:00:00Z', 'service': 'encoded', 'log_level': 'warning',
+                           'message': 'stock low', 'custom_fields': {'sku': 'A-1', 'count': 2}})
+    writer.flush()
+    (service_id, custom_fields), = log_processor.conn.execute(
+        'SELECT service_id, custom_fields FROM structured_logs_20260203'
+    ).fetchall()
+    assert log_processor.conn.execute('SELECT name FROM lookup_service WHERE id=?', (service_id,)).fetchone() == ('encoded',)
+    assert 'sku' not in custom_fields
+    (row,) = stored('encoded')
+    assert row['log_level'] == 'warning'
+    assert row['custom_fields'] == {'sku': 'A-1', 'count': 2}
+    assert [found['message'] for found in query.search_logs(log_processor.conn, 'A-1', service='encoded')] == ['stock low']
+
+
+def test_pipeline_resumes_without_duplicates():
+    lines = [compose_line('resumed', f'2026-02-04T10:00:0{second}.5Z', f'event {second}') for second in range(4)]
+    # Two lines share the last timestamp: a resumed `logs --since` replays both.
+    lines.append(compose_line('resumed', '2026-02-04T10:00:03.5Z', 'event 3b'))
+    ingest(lines[:3])
+    checkpoints = log_processor.get_source_checkpoints()
+    assert checkpoints['resumed'] == ('2026-02-04T10:00:02.500000000Z', 1)
+    pipeline = ingest(lines[2:], checkpoints)
+    assert pipeline.duplicates_skipped == 1
+    assert [row['message'] for row in stored('resumed')] == ['event 0', 'event 1', 'event 2', 'event 3', 'event 3b']
+
+
+def test_out_of_order_lines_are_kept_outside_the_replay():
+    def line(second, event):
+        return compose_line('interleaved', f'2026-02-04T11:00:{second}Z', event)
+
+    # stderr's line from second 01 reaches the pipe after stdout's from second 02.
+    ingest([line('00.0', 'stdout 0'), line('02.0', 'stdout 2'), line('01.0', 'stderr 1')])
+    assert [row['message'] for row in stored('interleaved')] == ['stdout 0', 'stderr 1', 'stdout 2']
+    # After a restart the stored lines come round again, then new ones, again out of order.
+    pipeline = ingest(
+        [line('02.0', 'stdout 2'), line('01.0', 'stderr 1'), line('03.0', 'stdout 3'), line('02.5', 'stderr 2.5')],
+        log_processor.get_source_checkpoints(),
+    )
+    assert pipeline.duplicates_skipped == 2
+    assert [row['message'] for row in stored('interleaved')] == [
+        'stdout 0', 'stderr 1', 'stdout 2', 'stderr 2.5', 'stdout 3',
+    ]
+    assert log_processor.get_source_checkpoints()['interleaved'] == ('2026-02-04T11:00:03.000000000Z', 1)
+
+
+def test_container_marks_share_the_keys_tail_logs_uses():
+    line = compose_line('switch-1', '2026-02-04T12:00:01.5Z', 'tailed')
+    ingest([line])
+    key = log_processor.compose_prefix('example_compose-switch-1', 'example_compose')
+    assert key == 'switch-1'
+    assert log_processor.compose_prefix('custom-name', 'example_compose') == 'custom-name'
+    source = log_processor.ContainerSource('example_compose-switch-1', key)
+    assert source.source == 'switch-1'
+    assert source.mark_key('stdout') in log_processor.get_source_checkpoints()
+    # Back in tail mode, a service resumes from the older of the marks --containers left.
+    marks = {
+        'switch-1': ('2026-02-04T12:00:05.000000000Z', 2),
+        'switch-1/stderr': ('2026-02-04T12:00:03.000000000Z', 1),
+        'other-1': ('2026-02-04T12:00:01.000000000Z', 1),
+        'other-1/stderr': ('2026-02-04T12:00:04.000000000Z', 1),
+    }
+    merged = log_processor.merge_stream_checkpoints(marks)
+    assert merged['switch-1'] == ('2026-02-04T12:00:03.000000000Z', 1)
+    assert merged['other-1'] == ('2026-02-04T12:00:01.000000000Z', 1)
+
+
+class BrokenStream:
+    # Yields its lines, then fails like a truncated gzip member.
+    def __init__(self, data):
+        self.data = data
+
+    def read1(self, size):
+        data, self.data = self.data, b''
+        if not data:
+            raise EOFError('Compressed file ended before the end-of-stream marker was reached')
+        return data
+
+
+def test_read_error_ends_the_pipeline_after_storing_what_was_read():
+    lines = [compose_line('broken', f'2026-02-04T12:00:0{second}Z', f'event {second}') for second in range(3)]
+    pipeline = log_processor.IngestPipeline(log_processor.BatchWriter(), workers=0, timestamps=True)
+    # A pipeline waiting on a dead reader would hang the suite; end the run with a traceback instead.
+    faulthandler.dump_traceback_later(20, exit=True)
+    try:
+        with pytest.raises(EOFError):
+            pipeline.run(BrokenStream(b'\n'.join(lines) + b'\n'), 'docker-compose')
+    finally:
+        faulthandler.cancel_dump_traceback_later()
+    assert [row['message'] for row in stored('broken')] == ['event 0', 'event 1', 'event 2']
+
+
+def test_bulk_import_resumes_and_skips_finished_files(tmp_path):
+    path = tmp_path / 'imported.log'
+    path.write_bytes(b'\n'.join(
+        compose_line('imported', f'2026-02-05T10:00:{second:02d}Z', f'event {second}') for second in range(10)
+    ) + b'\n')
+    writer = log_processor.BatchWriter(indexes=False)
+    assert log_processor.import_files([str(path)], writer, workers=0) == 10
+    assert log_processor.import_files([str(path)], writer, workers=0) == 0
+    assert len(stored('imported')) == 10
+    assert log_processor.conn.execute(
+        "SELECT indexed FROM log_partitions WHERE name='structured_logs_20260205'"
+    ).fetchone() == (1,)
+
+
+def test_truncated_archive_is_reported_and_the_next_file_loaded(tmp_path):
+    truncated = tmp_path / 'truncated.log.gz'
+    data = gzip.compress(b'\n'.join(
+        compose_line('truncated', f'2026-02-10T10:{second // 60:02d}:{second % 60:02d}Z', f'event {second}', pad='x' * 200)
+        for second in range(2000)
+    ) + b'\n')
+    truncated.write_bytes(data[:len(data) // 2])
+    complete = tmp_path / 'complete.log'
+    complete.write_bytes(b'\n'.join(
+        compose_line('complete', f'2026-02-10T11:00:0{second}Z', f'searchable event {second}') for second in range(3)
+    ) + b'\n')
+    writer = log_processor.BatchWriter(indexes=False)
+    job = log_processor.BulkImport(writer, str(complete), workers=0)
+    assert job.run()
+    # Full-text rows of a partition the import created wait for index_partitions(), as its indexes do.
+    assert log_processor.conn.execute('SELECT count(*) FROM structured_logs_20260210_fts').fetchone() == (0,)
+    faulthandler.dump_traceback_later(60, exit=True)
+    try:
+        log_processor.import_files([str(truncated), str(complete)], writer, workers=0)
+    finally:
+        faulthandler.cancel_dump_traceback_later()
+    # The lines before the damage are kept, each once in the full-text index.
+    (kept,) = log_processor.conn.execute("SELECT count(*) FROM structured_logs WHERE service = 'truncated'").fetchone()
+    assert 0 < kept < 2000
+    assert len(query.search_logs(log_processor.conn, 'event', service='truncated', limit=5000)) == kept
+    assert sorted(row['message'] for row in query.search_logs(log_processor.conn, 'searchable', service='complete')) == [
+        f'searchable event {second}' for second in range(3)
+    ]
+
+
+def segment_event(event):
+    return json.dumps({'event': event, 'level': 'info', 'timestamp': '2026-02-10T09:00:00Z'}).encode('utf-8')
+
+
+def segment_records(*events):
+    records = [segment_event(event) for event in events]
+    return b''.join(log_processor.SEGMENT_RECORD_LENGTH.pack(len(record)) + record for record in records)
+
+
+def test_segments_resume_from_their_offset_and_wait_for_a_torn_record(tmp_path):
+    path = tmp_path / 'segmented-0001792300000000-42.seg'
+    torn = segment_records('third')
+    path.write_bytes(segment_records('first', 'second') + torn[:7])
+    assert log_processor.ingest_segments(str(tmp_path)) == 2
+    assert log_processor.get_segment_offset(path.name) == len(segment_records('first', 'second'))
+    # Nothing is stored twice, and the torn record waits for the rest of its bytes.
+    assert log_processor.ingest_segments(str(tmp_path)) == 0
+    with open(path, 'ab') as f:
+        f.write(torn[7:])
+    assert log_processor.ingest_segments(str(tmp_path)) == 1
+    assert [row['message'] for row in stored('segmented')] == ['first', 'second', 'third']
+    # Still open: kept even though every record is stored.
+    assert log_processor.remove_ingested_segments(str(tmp_path)) == 0
+    with open(path, 'ab') as f:
+        f.write(log_processor.SEGMENT_END)
+    assert log_processor.ingest_segments(str(tmp_path)) == 0
+    assert log_processor.remove_ingested_segments(str(tmp_path)) == 1
+    assert not path.exists()
+    assert log_processor.get_segment_offset(path.name) == 0
+
+
+def test_segments_written_by_the_logger_are_stored_then_removed(tmp_path):
+    # The sink of the logger package, run from the repository root.
+    segments = pytest.importorskip('logger.segments')
+    sink = segments.SegmentWriter(str(tmp_path), prefix='rotated', max_bytes=1, fsync='never')
+    sink([segment_event('before rotation')])
+    sink([segment_event('after rotation')])
+    assert log_processor.remove_ingested_segments(str(tmp_path)) == 0
+    log_processor.tail_segments(str(tmp_path), follow=False)
+    # The first segment is closed and read to the end; the second is still being written.
+    assert len(os.listdir(tmp_path)) == 1
+    sink.close()
+    log_processor.tail_segments(str(tmp_path), follow=False)
+    assert os.listdir(tmp_path) == []
+    assert [row['message'] for row in stored('rotated')] == ['before rotation', 'after rotation']
+
+
+class EndlessReader:
+    # Always has another line ready, so its reader only waits when the source's chunk queue is full.
+    def __init__(self):
+        self.lines = 0
+
+    async def read(self, size):
+        self.lines += 1
+        return b'2026-02-06T10:00:00.000000000Z {"event": "flood", "level": "info"}\n'
+
+
+class EndlessSource:
+    def __init__(self, name):
+        self.name = name
+        self.source = name
+        self.parse = log_processor.parse_container_lines
+        self.reader = EndlessReader()
+        self.closed = False
+
+    async def open(self, marks):
+        return {'stdout': self.reader}
+
+    def prepare(self, writer, stream, parsed, end):
+        return [(table, row, None) for table, row, _ in parsed]
+
+    async def close(self, ended=False):
+        self.closed = True
+
+
+def test_source_removed_while_its_queue_is_full():
+    source = EndlessSource('flooding')
+    ingester = log_processor.MultiSourceIngester(log_processor.BatchWriter(), workers=0, max_chunks=1)
+
+    async def follow():
+        asyncio.get_running_loop().call_later(0.2, ingester.remove_source, source.name)
+        await asyncio.wait_for(ingester.run([source]), 10)
+
+    asyncio.run(follow())
+    assert source.closed
+    assert ingester.sources == {}
+    assert source.reader.lines > 1
+    assert 0 < len(stored('flooding')) <= source.reader.lines
+
+
+def test_baseline_database_is_migrated(tmp_path):
+    db_path = tmp_path / 'baseline.db'
+    baseline = sqlite3.connect(db_path)
+    baseline.executescript(BASELINE_SCHEMA)
+    baseline.execute(
+        "INSERT INTO structured_logs (timestamp, service, log_level, message, custom_fields) "
+        "VALUES ('2026-01-10T10:00:00Z', 'api', 'info', 'hello', '{\"order_id\": 7}')"
+    )
+    baseline.execute("INSERT INTO unstructured_logs (timestamp, source, log) VALUES ('2026-01-10T10:00:01Z', 'web', 'plain line')")
+    baseline.commit()
+    baseline.close()
+    # The migration runs at import, so it gets a process of its own; the second run finds nothing to migrate.
+    for _ in range(2):
+        subprocess.run(
+            [sys.executable, '-c', 'import log_processor'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            env={**os.environ, 'LOG_PROCESSOR_DB': str(db_path)}, check=True,
+        )
+    migrated = sqlite3.connect(db_path)
+    assert migrated.execute('SELECT name, encoded, indexed FROM log_partitions ORDER BY name').fetchall() == [
+        ('structured_logs_legacy', 1, 1),
+        ('unstructured_logs_legacy', 1, 1),
+    ]
+    assert migrated.execute('SELECT service, message, custom_fields FROM structured_logs').fetchall() == [
+        ('api', 'hello', '{"order_id":7}'),
+    ]
+    assert migrated.execute('SELECT source, log FROM unstructured_logs').fetchall() == [('web', 'plain line')]
+    indexes = {name for name, in migrated.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    assert {'idx_structured_logs_legacy_service', 'idx_structured_logs_legacy_log_level'} <= indexes
+    (row,), _ = query.query_logs(migrated, service='api')
+    assert row['custom_fields'] == {'order_id': 7}
+
+
+def test_user_id_filter_is_indexed():
+    writer = log_processor.BatchWriter()
+    writer.add_structured({'timestamp': '2026-02-07T10:00:00Z', 'service': 'users', 'log_level': 'info',
+                           'message': 'signed in', 'user_id': 'user-42'})
+    writer.flush()
+    partition = 'structured_logs_20260207'
+    # A partition created before the index existed gets it at the next start.
+    log_processor.conn.execute(f'DROP INDEX idx_{partition}_user_id')
+    log_processor.ensure_partition_indexes()
+    plan = log_processor.conn.execute(
+        f"EXPLAIN QUERY PLAN SELECT * FROM {partition} WHERE user_id = ? ORDER BY timestamp DESC, id DESC", ('user-42',)
+    ).fetchall()
+    assert any(f'idx_{partition}_user_id' in detail for *_, detail in plan)
+    (row,), _ = query.query_logs(log_processor.conn, user_id='user-42')
+    assert row['message'] == 'signed in'
+
+
+def test_flush_retries_while_another_connection_holds_the_lock():
+    # The processor's connection waits LOG_PROCESSOR_BUSY_TIMEOUT; this one gives up almost at once.
+    connection = sqlite3.connect(log_processor.DB_PATH, timeout=0.05)
+    writer = log_processor.BatchWriter(connection)
+    writer.add_structured({'timestamp': '2026-02-08T10:00:00Z', 'service': 'contended', 'log_level': 'info',
+                           'message': 'after the lock'})
+    locked = threading.Event()
+
+    def hold_lock():
+        holder = sqlite3.connect(log_processor.DB_PATH)
+        holder.execute('BEGIN IMMEDIATE')
+        locked.set()
+        time.sleep(0.3)
+        holder.commit()
+        holder.close()
+
+    thread = threading.Thread(target=hold_lock)
+    thread.start()
+    locked.wait(5)
+    try:
+        writer.flush()
+    finally:
+        thread.join()
+        connection.close()
+    assert writer.busy > 0
+    assert [row['message'] for row in stored('contended')] == ['after the lock']
+
+
+def test_frequent_custom_field_is_promoted_to_an_indexed_column():
+    writer = log_processor.BatchWriter(batch_size=50000)
+    for number in range(30000):
+        writer.add_structured({'timestamp': f'2026-02-09T10:{number // 1000 % 60:02d}:00Z', 'service': 'promoted',
+                               'log_level': 'info', 'message': 'order placed',
+                               'custom_fields': {'order_ref': f'order-{number}'}})
+    writer.flush()
+    partition = 'structured_logs_20260209'
+    # A deadline the index build cannot meet: the column is added, its index left out, and the lock released.
+    maintenance = log_processor.PartitionMaintenance(promote_min_rows=100, max_lock_seconds=0)
+    maintenance.sample_fields(log_processor.conn)
+    maintenance.promote_fields(log_processor.conn)
+    maintenance.index_promoted_fields(log_processor.conn)
+    assert maintenance.index_skipped >= 1
+    index = f'idx_{partition}_cf_order_ref'
+    assert log_processor.conn.execute("SELECT 1 FROM sqlite_master WHERE name=?", (index,)).fetchone() is None
+    assert [row['message'] for row in query.query_logs(log_processor.conn, fields={'order_ref': 'order-7'})[0]] == ['order placed']
+    log_processor.PartitionMaintenance().index_promoted_fields(log_processor.conn)
+    plan = log_processor.conn.execute(
+        f"EXPLAIN QUERY PLAN SELECT * FROM {partition} WHERE cf_order_ref = ? ORDER BY timestamp DESC, id DESC", ('order-7',)
+    ).fetchall()
+    assert any(index in detail for *_, detail in plan)
+    # The column serves filters only: rows keep the stored layout, the key inside custom_fields.
+    found = query.query_logs(log_processor.conn, fields={'order_ref': 'order-7'})[0][0]
+    assert 'cf_order_ref' not in found and found['custom_fields'] == {'order_ref': 'order-7'}
+    found = query.search_logs(log_processor.conn, 'order-7', service='promoted')[0]
+    assert set(found) == {
+        'id', 'timestamp', 'service', 'log_level', 'message', 'correlation_id', 'filename', 'func_name', 'lineno',
+        'request_id', 'user_id', 'custom_fields', 'rank',
+    }
+    (row,), _ = query.query_logs(log_processor.conn, fields={'order_ref': 'order-7'})
+    assert row['custom_fields'] == {'order_ref': 'order-7'}
+
+
+def partition_tables(day):
+    return {name for name, in log_processor.conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name GLOB ?", (f'*_logs_{day}*',)
+    )}
+
+
+def test_retention_drops_expired_partitions_in_steps():
+    writer = log_processor.BatchWriter()
+    for number in range(20):
+        writer.add_structured({'timestamp': f'2020-01-01T10:00:{number:02d}Z', 'service': 'expired', 'log_level': 'info',
+                               'message': f'old {number}'})
+        writer.add_unstructured({'timestamp': f'2020-01-01T10:00:{number:02d}Z', 'source': 'expired', 'log': f'old {number}'})
+    writer.flush()
+    assert len(partition_tables('20200101')) > 2
+    # Stopped right after taking the partitions out of log_partitions: queries no longer see them.
+    interrupted = log_processor.PartitionMaintenance(retention_days=1000, step_rows=7)
+    interrupted.stop()
+    interrupted.drop_expired(log_processor.conn)
+    assert interrupted.dropped == 2
+    assert stored('expired') == []
+    assert 'structured_logs_20200101' in partition_tables('20200101')
+    # The next pass deletes what is left.
+    log_processor.PartitionMaintenance(retention_days=1000, step_rows=7).drop_expired(log_processor.conn)
+    assert partition_tables('20200101') == set()
+    assert log_processor.conn.execute("SELECT count(*) FROM log_partitions WHERE name GLOB '*_20200101'").fetchone() == (0,)
+    assert log_processor.conn.execute("SELECT count(*) FROM unstructured_logs WHERE source = 'expired'").fetchone() == (0,)
+
+
+def test_cold_partitions_are_merged_and_freed_pages_returned():
+    for number in range(5):
+        writer = log_processor.BatchWriter()
+        writer.add_unstructured({'timestamp': f'2021-03-01T10:00:0{number}Z', 'source': 'cold', 'log': f'cold line {number}'})
+        writer.flush()
+    fts = 'unstructured_logs_20210301_fts'
+    (segments_before,) = log_processor.conn.execute(f'SELECT count(*) FROM {fts}_data').fetchone()
+    maintenance = log_processor.PartitionMaintenance(retention_days=1000, cold_after=0)
+    maintenance.compact_cold(log_processor.conn)
+    assert log_processor.conn.execute(
+        "SELECT compacted FROM log_partitions WHERE name='unstructured_logs_20210301'"
+    ).fetchone() == (1,)
+    assert log_processor.conn.execute(f'SELECT count(*) FROM {fts}_data').fetchone()[0] < segments_before
+    assert len(query.search_logs(log_processor.conn, 'cold', table='unstructured_logs')) == 5
+    maintenance.drop_expired(log_processor.conn)
+    assert log_processor.conn.execute('PRAGMA freelist_count').fetchone()[0] > 0
+    maintenance.vacuum(log_processor.conn)
+    assert maintenance.vacuumed_pages > 0
+    assert log_processor.conn.execute('PRAGMA freelist_count').fetchone()[0] == 0
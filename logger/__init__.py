@@ -1,16 +1,30 @@
 from .logger import (
-    LOGGING_LEVEL,
+    bound_logger,
+    configure,
+    flush_logs,
+    get_level,
+    get_stats,
+    install_level_signal_handler,
+    is_configured,
     logger,
     log_critical,
     log_debug,
     log_error,
     log_info,
     log_warning,
+    set_callsite,
+    set_level,
 )
-from .logfire_read import query_logfire
 
 __all__ = [
     "LOGGING_LEVEL",
+    "bound_logger",
+    "configure",
+    "flush_logs",
+    "get_level",
+    "get_stats",
+    "install_level_signal_handler",
+    "is_configured",
     "logger",
     "log_critical",
     "log_debug",
@@ -18,4 +32,18 @@ __all__ = [
     "log_info",
     "log_warning",
     "query_logfire",
+    "set_callsite",
+    "set_level",
 ]
+
+
+def __getattr__(name):
+    # Read on each access: set_level() rebinds the module global, so a name imported here would go stale.
+    if name == "LOGGING_LEVEL":
+        return get_level()
+    # The read-side client pulls in urllib; only import it when it is actually used.
+    if name == "query_logfire":
+        from .logfire_read import query_logfire
+
+        return query_logfire
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,222 @@
+import asyncio
+import atexit
+import contextvars
+import importlib
+import sys
+import threading
+from collections import deque
+from logging import CRITICAL, DEBUG, ERROR, INFO, NOTSET, WARNING
+
+import structlog
+
+from .callsite import add_callsite
+
+# The core module, looked up live because set_level()/configure() rebind its globals.
+_core = importlib.import_module(".logger", __package__)
+
+ASYNC_QUEUE_SIZE = 10000
+ASYNC_BATCH_SIZE = 256
+
+# Events are timestamped when submitted, in the format of the chain's own timestamper.
+_stamp = structlog.processors.TimeStamper(fmt="iso", utc=True)
+# The level was checked when the event was submitted; a set_level() since then does not filter it again.
+_unfiltered_logger = structlog.make_filtering_bound_logger(NOTSET)
+
+
+class _Collector:
+    # Stands in for the output logger while a batch is processed, so the batch is written at once.
+    def __init__(self):
+        self.records = []
+
+    def msg(self, message):
+        self.records.append(message)
+
+    log = debug = info = warn = warning = msg
+    fatal = failure = err = error = critical = exception = msg
+
+
+class AsyncLogSink:
+    """Runs the processor chain and the write for events submitted from event loops on one thread.
+
+    Each event carries a copy of the submitting task's context, so structlog contextvars and
+    the active Logfire span are the ones current at call time. Its timestamp is taken, and its
+    level checked, at call time too. Futures are resolved on their own loop once per batch:
+    True when written, False when dropped because the queue was full.
+    """
+
+    def __init__(self, maxsize=ASYNC_QUEUE_SIZE, batch_size=ASYNC_BATCH_SIZE):
+        self._maxsize = maxsize
+        self._batch_size = batch_size
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._drained = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._closed = False
+        self.dropped = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="logger-async-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, method_name, message, event_kw, future=None):
+        item = (contextvars.copy_context(), method_name, message, event_kw, future)
+        with self._lock:
+            if len(self._queue) >= self._maxsize or self._closed:
+                self.dropped += 1
+                dropped = True
+            else:
+                self._queue.append(item)
+                self._not_empty.notify()
+                dropped = False
+        if dropped and future is not None:
+            future.set_result(False)
+
+    def flush(self, timeout=None):
+        with self._lock:
+            return self._drained.wait_for(lambda: not self._queue and not self._in_flight, timeout)
+
+    def close(self, timeout=5.0):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._not_empty.notify_all()
+        self._thread.join(timeout)
+
+    def _run(self):
+        queue = self._queue
+        while True:
+            with self._lock:
+                while not queue and not self._closed:
+                    self._not_empty.wait()
+                if not queue:
+                    self._drained.notify_all()
+                    return
+                batch = [queue.popleft() for _ in range(min(len(queue), self._batch_size))]
+                self._in_flight = len(batch)
+            self._process(batch)
+            with self._lock:
+                self._in_flight = 0
+                if not queue:
+                    self._drained.notify_all()
+
+    def _process(self, batch):
+        collector = _Collector()
+        log = structlog.wrap_logger(collector, wrapper_class=_unfiltered_logger).bind()
+        for context, method_name, message, event_kw, _ in batch:
+            try:
+                context.run(getattr(log, method_name), message, **event_kw)
+            except Exception:
+                self.errors += 1
+        if collector.records:
+            try:
+                _core._write_rendered(collector.records)
+            except Exception:
+                self.errors += 1
+        self._resolve(batch)
+
+    def _resolve(self, batch):
+        by_loop = {}
+        for *_, future in batch:
+            if future is not None:
+                by_loop.setdefault(future.get_loop(), []).append(future)
+        for loop, futures in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_set_results, futures)
+            except RuntimeError:  # loop already closed
+                pass
+
+
+def _set_results(futures):
+    for future in futures:
+        if not future.done():
+            future.set_result(True)
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_sink():
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = AsyncLogSink()
+    return _sink
+
+
+def _submit(method_name, level, correlation_id, message, params, awaitable):
+    if _core.LOGGING_LEVEL > level:
+        if awaitable:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(False)
+            return future
+        return None
+    if _core._logger is None:
+        _core._configure_lazily()
+    # Taken here in either mode: the chain, and with it the adder, runs on the sink thread.
+    if level in _core._callsite_levels or (_core.CALLSITE_MODE == "adder" and level in _core.CALLSITE_LEVELS):
+        add_callsite(params, depth=3)
+    if params.get("exc_info") is True:
+        # The sink thread has no exception in flight; capture it here.
+        params["exc_info"] = sys.exc_info()
+    params["correlation_id"] = correlation_id
+    params[_core.SUBMITTED_AT] = _stamp(None, method_name, {})["timestamp"]
+    future = asyncio.get_running_loop().create_future() if awaitable else None
+    get_sink().submit(method_name, message, params, future)
+    return future
+
+
+# Awaitable variants: `await alog_info(...)` resumes once the event has been written.
+def alog_info(correlation_id, message, **params):
+    return _submit("info", INFO, correlation_id, message, params, True)
+
+
+def alog_debug(correlation_id, message, **params):
+    return _submit("debug", DEBUG, correlation_id, message, params, True)
+
+
+def alog_warning(correlation_id, message, **params):
+    return _submit("warning", WARNING, correlation_id, message, params, True)
+
+
+def alog_error(correlation_id, message, **params):
+    return _submit("error", ERROR, correlation_id, message, params, True)
+
+
+def alog_critical(correlation_id, message, **params):
+    return _submit("fatal", CRITICAL, correlation_id, message, params, True)
+
+
+# Fire-and-forget variants: return immediately, safe to call from coroutines or plain code.
+def log_info_nowait(correlation_id, message, **params):
+    _submit("info", INFO, correlation_id, message, params, False)
+
+
+def log_debug_nowait(correlation_id, message, **params):
+    _submit("debug", DEBUG, correlation_id, message, params, False)
+
+
+def log_warning_nowait(correlation_id, message, **params):
+    _submit("warning", WARNING, correlation_id, message, params, False)
+
+
+def log_error_nowait(correlation_id, message, **params):
+    _submit("error", ERROR, correlation_id, message, params, False)
+
+
+def log_critical_nowait(correlation_id, message, **params):
+    _submit("fatal", CRITICAL, correlation_id, message, params, False)
+
+
+async def aflush(timeout=None):
+    # Waits off-loop for the async sink and then the regular output path to drain.
+    await asyncio.get_running_loop().run_in_executor(None, _flush_all, timeout)
+
+
+def _flush_all(timeout):
+    if _sink is not None:
+        _sink.flush(timeout)
+    _core.flush_logs(timeout)
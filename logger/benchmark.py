@@ -0,0 +1,468 @@
+import argparse
+import contextlib
+import datetime
+import functools
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from logging import INFO
+
+import logfire
+import structlog
+
+from .callsite import add_callsite
+from .logger import (
+    CALLSITE_MODE,
+    CALLSITE_MODES,
+    bound_logger,
+    configure,
+    flush_logs,
+    get_level,
+    is_configured,
+    log_critical,
+    log_debug,
+    log_error,
+    log_info,
+    log_warning,
+    logger,
+    set_callsite,
+    set_level,
+)
+from .multiprocess import LogAggregator, init_worker
+from .rendering import JSON_BACKENDS, json_renderer, resolve_json_backend
+from .writer import stream_sink
+
+# The module rather than the `logger` proxy the package exports under the same name.
+_core = importlib.import_module(".logger", __package__)
+
+CORRELATION_ID = "123e4567-e89b-12d3-a456-426614174000"
+ROUNDS = 5
+
+
+# Both add the callsite exactly as log_info does, so every variant pays for the same fields and
+# only the way the event reaches the bound logger differs.
+def _legacy_log_info(correlation_id, message, **params):
+    if INFO in _core._callsite_levels:
+        add_callsite(params)
+    logger.bind(correlation_id=correlation_id, **params).info(message)
+
+
+def _cached_log_info(correlation_id, message, **params):
+    if INFO in _core._callsite_levels:
+        add_callsite(params)
+    bound_logger(correlation_id).info(message, **params)
+
+
+WRAPPER_VARIANTS = {
+    "bind_per_call": _legacy_log_info,
+    "direct": log_info,
+    "bound_cache": _cached_log_info,
+}
+
+
+def _measure(fn, iterations):
+    for _ in range(min(iterations, 1000)):
+        fn(CORRELATION_ID, "benchmark event", item_id="item-001", attempt=1)
+
+    elapsed = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn(CORRELATION_ID, "benchmark event", item_id="item-001", attempt=1)
+        round_time = time.perf_counter() - start
+        elapsed = round_time if elapsed is None else min(elapsed, round_time)
+
+    samples = min(iterations, 1000)
+    tracemalloc.start()
+    peak_total = 0
+    for _ in range(samples):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn(CORRELATION_ID, "benchmark event", item_id="item-001", attempt=1)
+        peak_total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "ns_per_call": round(elapsed / iterations * 1e9, 1),
+        "events_per_sec": round(iterations / elapsed, 1),
+        "peak_alloc_bytes_per_call": round(peak_total / samples, 1),
+    }
+
+
+@contextlib.contextmanager
+def _processor_chain(processors):
+    # Bound loggers share the configured list object, so swap its contents in place.
+    chain = structlog.get_config()["processors"]
+    saved = list(chain)
+    if processors is not None:
+        chain[:] = processors
+    try:
+        yield
+    finally:
+        chain[:] = saved
+
+
+def _drop_event(logger, method_name, event_dict):
+    raise structlog.DropEvent
+
+
+# "dropped" isolates the wrapper itself: event dict assembly and nothing else.
+def _chains():
+    renderer = structlog.get_config()["processors"][-1]
+    return {
+        "configured": None,
+        "render_only": [renderer],
+        "dropped": [_drop_event],
+    }
+
+
+def bench_wrappers(iterations):
+    results = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for chain_name, processors in _chains().items():
+            with _processor_chain(processors):
+                results[chain_name] = {name: _measure(fn, iterations) for name, fn in WRAPPER_VARIANTS.items()}
+    return results
+
+
+def _without_logfire():
+    return [p for p in structlog.get_config()["processors"] if not isinstance(p, logfire.StructlogProcessor)]
+
+
+def bench_callsite(iterations):
+    # The Logfire processor is excluded: it costs an order of magnitude more than any callsite mode.
+    results = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            for mode in CALLSITE_MODES:
+                set_callsite(mode)
+                with _processor_chain(_without_logfire()):
+                    results[mode] = _measure(log_info, iterations)
+        finally:
+            set_callsite(CALLSITE_MODE)
+    return results
+
+
+SAMPLE_EVENT = {
+    "correlation_id": CORRELATION_ID,
+    "item_id": "item-001",
+    "amount": 19.99,
+    "filename": "demo.py",
+    "func_name": "_simulate_workload",
+    "lineno": 23,
+    "event": "Processing item",
+    "request_id": "req-9f7c2a",
+    "user_id": "user-42",
+    "level": "info",
+    "timestamp": "2026-01-01T00:00:00.000000Z",
+}
+
+
+def bench_render(iterations):
+    # Render plus write to a binary sink, i.e. the per-event output cost of each backend.
+    results = {}
+    with open(os.devnull, "wb") as devnull:
+        for backend in JSON_BACKENDS[1:]:
+            try:
+                renderer = json_renderer(resolve_json_backend(backend))
+            except RuntimeError:
+                continue
+
+            def render_and_write(correlation_id, message, **params):
+                rendered = renderer(None, "info", dict(SAMPLE_EVENT))
+                if isinstance(rendered, str):
+                    rendered = rendered.encode("utf-8")
+                devnull.write(rendered + b"\n")
+
+            results[backend] = _measure(render_and_write, iterations)
+    return results
+
+
+STARTUP_RUNS = 5
+
+
+def _importtime_us(statement):
+    # Cumulative microseconds reported by `python -X importtime` for the top-level `logger` import.
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for line in proc.stderr.splitlines():
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[2] == "logger":
+            return int(parts[1])
+    return None
+
+
+def _wall_ms(statement):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], capture_output=True, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def bench_startup(iterations):
+    statements = {
+        "import": "import logger",
+        "import_and_configure": "import logger; logger.configure()",
+    }
+    results = {"importtime_us": statistics.median(_importtime_us("import logger") for _ in range(STARTUP_RUNS))}
+    for name, statement in statements.items():
+        results[f"{name}_wall_ms"] = round(statistics.median(_wall_ms(statement) for _ in range(STARTUP_RUNS)), 1)
+    return results
+
+
+LEVEL_WRAPPERS = {
+    "debug": log_debug,
+    "info": log_info,
+    "warning": log_warning,
+    "error": log_error,
+    "critical": log_critical,
+}
+SUITE_THREADS = 4
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def _measure_latency(call, iterations, threads=1, setup=None):
+    # Each thread times every call; events/sec is aggregate across threads over wall time.
+    # `setup` runs once in every worker thread, e.g. to bind (thread-local) contextvars.
+    per_thread = max(1, iterations // threads)
+    latencies = []
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        if setup is not None:
+            setup()
+        for _ in range(min(per_thread, 200)):
+            call()
+        perf = time.perf_counter_ns
+        local = []
+        barrier.wait()
+        for _ in range(per_thread):
+            start = perf()
+            call()
+            local.append(perf() - start)
+        latencies.extend(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "threads": threads,
+        "events": len(latencies),
+        "events_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ns": _percentile(latencies, 0.50),
+        "p99_ns": _percentile(latencies, 0.99),
+        "mean_ns": round(statistics.fmean(latencies), 1),
+    }
+
+
+def _call_info():
+    log_info(CORRELATION_ID, "benchmark event", item_id="item-001", attempt=1)
+
+
+def _call_error_with_exc_info():
+    try:
+        raise ValueError("benchmark failure")
+    except ValueError as exc:
+        log_error(CORRELATION_ID, "benchmark failure", error=str(exc), exc_info=True)
+
+
+def _bind_request_context():
+    structlog.contextvars.bind_contextvars(request_id="req-9f7c2a", user_id="user-42")
+
+
+@contextlib.contextmanager
+def _callsite_mode(mode):
+    set_callsite(mode)
+    try:
+        yield
+    finally:
+        set_callsite(CALLSITE_MODE)
+
+
+def _suite_variants():
+    # name -> (context manager factory, call, per-thread setup); the baseline is the configured chain.
+    return {
+        "baseline": (contextlib.nullcontext, _call_info, None),
+        "callsite_adder": (lambda: _callsite_mode("adder"), _call_info, None),
+        "callsite_off": (lambda: _callsite_mode("off"), _call_info, None),
+        "no_logfire": (lambda: _processor_chain(_without_logfire()), _call_info, None),
+        "contextvars": (contextlib.nullcontext, _call_info, _bind_request_context),
+        "exc_info": (contextlib.nullcontext, _call_error_with_exc_info, None),
+    }
+
+
+def bench_suite(iterations, threads=SUITE_THREADS):
+    results = {"levels": {}, "variants": {}}
+    previous_level = get_level()
+    set_level("debug")
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for level, wrapper in LEVEL_WRAPPERS.items():
+                call = functools.partial(wrapper, CORRELATION_ID, "benchmark event", item_id="item-001", attempt=1)
+                results["levels"][level] = _measure_latency(call, iterations)
+            for name, (context, call, setup) in _suite_variants().items():
+                with context():
+                    results["variants"][name] = {
+                        "single_thread": _measure_latency(call, iterations, setup=setup),
+                        f"{threads}_threads": _measure_latency(call, iterations, threads=threads, setup=setup),
+                    }
+    finally:
+        set_level(previous_level)
+    return results
+
+
+MULTIPROCESS_WORKERS = (1, 2, 4)
+
+
+def _log_events(count):
+    for attempt in range(count):
+        log_info(CORRELATION_ID, "benchmark event", item_id="item-001", attempt=attempt)
+    flush_logs()
+    return count
+
+
+def bench_multiprocess(iterations, workers=MULTIPROCESS_WORKERS):
+    # Aggregate events/sec from N worker processes into one parent-side writer.
+    results = {}
+    with open(os.devnull, "w") as devnull:
+        for count in workers:
+            with LogAggregator(write_batch=stream_sink(devnull)) as aggregator:
+                with ProcessPoolExecutor(count, initializer=init_worker, initargs=aggregator.initargs()) as pool:
+                    list(pool.map(_log_events, [1] * count))
+                    chunks = count * 4
+                    measured = (iterations // chunks) * chunks
+                    expected = aggregator.events + measured
+                    start = time.perf_counter()
+                    list(pool.map(_log_events, [iterations // chunks] * chunks))
+                    deadline = time.monotonic() + 60
+                    while aggregator.events < expected and time.monotonic() < deadline:
+                        time.sleep(0.001)
+                    elapsed = time.perf_counter() - start
+            results[f"{count}_workers"] = {
+                "workers": count,
+                "events": measured,
+                "events_per_sec": round(measured / elapsed, 1),
+                "batches": aggregator.batches,
+            }
+    return results
+
+
+EXPORT_COLLECTORS = {"healthy": 0.0, "slow": 0.2, "stalled": 5.0}
+EXPORT_SETTINGS = {"max_queue_size": 2048, "batch_size": 512, "schedule_delay": 0.05}
+EXPORT_TIMEOUT = 1.0
+
+
+def bench_export(iterations, collectors=EXPORT_COLLECTORS):
+    # Span end() latency and export outcomes for the bounded OTLP exporter against collectors of varying health.
+    # A private tracer provider keeps the configured Logfire pipeline out of the measurement.
+    from opentelemetry.sdk.trace import TracerProvider
+
+    from .export import otlp_span_processor
+    # The stand-in collector is the one the export tests run against.
+    from .test_logger import OtlpReceiver
+
+    results = {}
+    for name, stall in collectors.items():
+        receiver = OtlpReceiver(stall)
+        processor = otlp_span_processor(receiver.endpoint, timeout=EXPORT_TIMEOUT, **EXPORT_SETTINGS)
+        provider = TracerProvider()
+        provider.add_span_processor(processor)
+        tracer = provider.get_tracer("logger.benchmark")
+        try:
+            latency = _measure_latency(lambda: tracer.start_span("benchmark event").end(), iterations)
+            processor.force_flush(int((EXPORT_TIMEOUT + stall) * 2000))
+            results[name] = {
+                "collector_stall_s": stall,
+                **latency,
+                **processor.snapshot(),
+                "requests": receiver.requests,
+            }
+        finally:
+            provider.shutdown()
+            receiver.close()
+    return results
+
+
+BENCHMARKS = {
+    "callsite": bench_callsite,
+    "export": bench_export,
+    "multiprocess": bench_multiprocess,
+    "render": bench_render,
+    "startup": bench_startup,
+    "suite": bench_suite,
+    "wrappers": bench_wrappers,
+}
+
+
+def _git_commit():
+    try:
+        proc = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return proc.stdout.strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the logger package; results are printed as JSON.")
+    parser.add_argument("benchmarks", nargs="*", metavar="BENCHMARK", help=f"one of {sorted(BENCHMARKS)} (default: all)")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=SUITE_THREADS, help="worker threads for the contention runs in `suite`")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    if not is_configured():
+        configure()
+    results = {}
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        kwargs = {"threads": args.threads} if name == "suite" else {}
+        results[name] = BENCHMARKS[name](args.iterations, **kwargs)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+            "cpu_count": os.cpu_count(),
+            "iterations": args.iterations,
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        },
+        "results": results,
+    }
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import os
+import sys
+
+CALLSITE_CACHE_SIZE = 4096
+
+# code object -> (filename, func_name); the code object is stable for a callsite, only the line varies.
+_code_cache = {}
+
+
+# The log_* wrappers call this directly, so their caller sits at a fixed frame offset
+# and no stack walk is needed.
+def add_callsite(event_kw, depth=2):
+    frame = sys._getframe(depth)
+    code = frame.f_code
+    names = _code_cache.get(code)
+    if names is None:
+        if len(_code_cache) >= CALLSITE_CACHE_SIZE:
+            _code_cache.clear()
+        names = _code_cache[code] = (os.path.basename(code.co_filename), code.co_name)
+    event_kw["filename"], event_kw["func_name"] = names
+    event_kw["lineno"] = frame.f_lineno
+    return event_kw
+
+
+def unless_present(adder):
+    # Events from aio carry the callsite captured on the calling thread; the sink thread's stack
+    # has nothing of the caller left to walk.
+    def add_missing_callsite(logger, method_name, event_dict):
+        if "filename" in event_dict and "func_name" in event_dict and "lineno" in event_dict:
+            return event_dict
+        return adder(logger, method_name, event_dict)
+
+    return add_missing_callsite
+
+
+def for_levels(processor, levels, level_for_method):
+    def run_for_enabled_levels(logger, method_name, event_dict):
+        if level_for_method(method_name) in levels:
+            return processor(logger, method_name, event_dict)
+        return event_dict
+
+    return run_for_enabled_levels
@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import OrderedDict
+
+import structlog
+
+# Per-occurrence bookkeeping that should not be copied into the aggregate.
+_NOT_AGGREGATED = frozenset(("timestamp", "sampled_out", "rate_limited"))
+# Counts attached by SamplingProcessor; those carried by suppressed repeats are summed into the aggregate.
+_SAMPLER_COUNTS = ("sampled_out", "rate_limited")
+
+
+class _Window:
+    __slots__ = ("started", "template", "first_seen", "last_seen", "count", "sample", "sampler_counts")
+
+    def __init__(self, started, event_dict):
+        self.started = started
+        self.template = event_dict
+        self.first_seen = event_dict.get("timestamp")
+        self.last_seen = self.first_seen
+        self.count = 0
+        self.sample = None
+        self.sampler_counts = {}
+
+
+class Deduplicator:
+    """Suppress repeats of an event within `window` seconds and report them as one aggregate.
+
+    Events are fingerprinted by message, level, callsite and the configured `fields`. The
+    first occurrence passes through; repeats are dropped and counted. Once the window has
+    expired an aggregate event is emitted with `repeat_count`, `first_seen`, `last_seen` and
+    `repeat_sample`, the fields of the last repeat that differed from the first occurrence,
+    plus any `sampled_out`/`rate_limited` counts the repeats carried. Expired windows are
+    reported on the next event of any kind, when evicted, on flush(), and with `timer` from
+    a background timer while no events arrive.
+    """
+
+    def __init__(self, emit, window=1.0, fields=(), max_keys=1024, clock=time.monotonic, timer=True):
+        self._emit = emit
+        self._window = window
+        self._fields = tuple(fields)
+        self._max_keys = max_keys
+        self._clock = clock
+        self._use_timer = timer
+        self._timer = None
+        # In the order the windows started, so expired ones are at the front and evictions take the oldest.
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def _fingerprint(self, method_name, event_dict):
+        get = event_dict.get
+        return (
+            get("event"),
+            method_name,
+            get("filename"),
+            get("func_name"),
+            get("lineno"),
+        ) + tuple(repr(get(field)) for field in self._fields)
+
+    def _pop_expired(self, now):
+        # Called with the lock held.
+        expired = []
+        windows = self._windows
+        while windows:
+            key = next(iter(windows))
+            if now - windows[key].started < self._window:
+                break
+            expired.append((key, windows.pop(key)))
+        return expired
+
+    def _schedule(self):
+        # Called with the lock held, while some window has repeats to report.
+        if self._use_timer and self._timer is None:
+            self._timer = threading.Timer(self._window, self._expire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _expire(self):
+        with self._lock:
+            self._timer = None
+            expired = self._pop_expired(self._clock())
+            if any(window.count for window in self._windows.values()):
+                self._schedule()
+        self._emit_aggregates(expired)
+
+    def __call__(self, logger, method_name, event_dict):
+        if "repeat_count" in event_dict:
+            return event_dict
+        key = self._fingerprint(method_name, event_dict)
+        now = self._clock()
+        with self._lock:
+            expired = self._pop_expired(now)
+            window = self._windows.get(key)
+            if window is not None:
+                window.count += 1
+                window.last_seen = event_dict.get("timestamp")
+                window.sample = event_dict
+                for field in _SAMPLER_COUNTS:
+                    if field in event_dict:
+                        window.sampler_counts[field] = window.sampler_counts.get(field, 0) + event_dict[field]
+                self.suppressed += 1
+                self._schedule()
+            else:
+                self._windows[key] = _Window(now, dict(event_dict))
+                while len(self._windows) > self._max_keys:
+                    expired.append(self._windows.popitem(last=False))
+        self._emit_aggregates(expired)
+        if window is not None:
+            raise structlog.DropEvent
+        return event_dict
+
+    def flush(self):
+        with self._lock:
+            expired = list(self._windows.items())
+            self._windows.clear()
+        self._emit_aggregates(expired)
+
+    def _emit_aggregates(self, expired):
+        for key, window in expired:
+            if not window.count:
+                continue
+            template = window.template
+            aggregate = {k: v for k, v in template.items() if k not in _NOT_AGGREGATED}
+            aggregate["repeat_count"] = window.count
+            aggregate["first_seen"] = window.first_seen
+            aggregate["last_seen"] = window.last_seen
+            aggregate["repeat_sample"] = {
+                k: v
+                for k, v in window.sample.items()
+                if k not in _NOT_AGGREGATED and (k not in template or template[k] != v)
+            }
+            aggregate.update(window.sampler_counts)
+            self._emit(key[1], aggregate)
@@ -3,7 +3,7 @@ import time
 import logfire
 import structlog
 
-from .logger import log_critical, log_debug, log_error, log_info, log_warning
+from .logger import configure, log_critical, log_debug, log_error, log_info, log_warning
 
 
 def _simulate_workload(correlation_id):
@@ -32,6 +32,8 @@ def _simulate_workload(correlation_id):
 
 
 def main():
+    # Spans are opened before the first log call, so configure Logfire up front.
+    configure()
     correlation_id = "123e4567-e89b-12d3-a456-426614174000"
     structlog.contextvars.bind_contextvars(
         request_id="req-9f7c2a",
@@ -0,0 +1,132 @@
+import sys
+import threading
+import traceback
+import zlib
+from collections import OrderedDict
+
+from .stats import processor_name
+
+
+def _resolve_exc_info(exc_info):
+    if isinstance(exc_info, BaseException):
+        return (type(exc_info), exc_info, exc_info.__traceback__)
+    if isinstance(exc_info, tuple):
+        return exc_info
+    return sys.exc_info()
+
+
+def _exception_key(exc_type, tb):
+    # Type plus code locations only: no source lookup, no message, no locals.
+    frames = []
+    while tb is not None:
+        frames.append((tb.tb_frame.f_code.co_filename, tb.tb_lineno))
+        tb = tb.tb_next
+    return (exc_type.__module__, exc_type.__qualname__, tuple(frames))
+
+
+class PendingTraceback:
+    # Frames and (optionally) locals captured at call time; source lines are looked up in format().
+    __slots__ = ("_exception",)
+
+    def __init__(self, exception):
+        self._exception = exception
+
+    def format(self):
+        return "".join(self._exception.format()).rstrip("\n")
+
+
+class ExceptionFormatter:
+    """Fingerprint `exc_info` on the calling thread and render each distinct traceback once.
+
+    The fingerprint covers the exception type and the code location of every frame. Every
+    occurrence keeps the resolved `exc_info`, so Logfire records each exception, and gets
+    `exception_fingerprint`; repeats also get a one-line `exception_ref`. Only plain values are
+    added here, ahead of Logfire. `exception_renderer`, after it, swaps the first occurrence's
+    `exc_info` for an `exception` field holding a PendingTraceback (formatted on the writer
+    thread when output is queued) and drops it from repeats.
+    """
+
+    def __init__(self, max_frames=50, capture_locals=False, max_keys=1024):
+        self._max_frames = max_frames
+        self._capture_locals = capture_locals
+        self._max_keys = max_keys
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.formatted = 0
+        self.referenced = 0
+
+    def _fingerprint(self, key):
+        with self._lock:
+            fingerprint = self._seen.get(key)
+            if fingerprint is not None:
+                self._seen.move_to_end(key)
+                self.referenced += 1
+                return fingerprint, False
+            fingerprint = format(zlib.crc32(repr(key).encode("utf-8")), "08x")
+            self._seen[key] = fingerprint
+            if len(self._seen) > self._max_keys:
+                self._seen.popitem(last=False)
+            self.formatted += 1
+            return fingerprint, True
+
+    def __call__(self, logger, method_name, event_dict):
+        exc_info = event_dict.get("exc_info")
+        if not exc_info:
+            return event_dict
+        exc_type, exc_value, tb = _resolve_exc_info(exc_info)
+        if exc_type is None:
+            del event_dict["exc_info"]
+            return event_dict
+        fingerprint, first = self._fingerprint(_exception_key(exc_type, tb))
+        event_dict["exc_info"] = (exc_type, exc_value, tb)
+        event_dict["exception_fingerprint"] = fingerprint
+        if not first:
+            event_dict["exception_ref"] = "".join(traceback.format_exception_only(exc_type, exc_value)).strip()
+        return event_dict
+
+    def pending(self, exc_info):
+        exc_type, exc_value, tb = exc_info
+        return PendingTraceback(
+            traceback.TracebackException(
+                exc_type,
+                exc_value,
+                tb,
+                # Negative limit keeps the innermost frames, nearest the raise.
+                limit=-self._max_frames if self._max_frames else None,
+                lookup_lines=False,
+                capture_locals=self._capture_locals,
+            )
+        )
+
+
+class DeferredRecord:
+    # Queued in place of the rendered event; QueueWriter calls it on the writer thread.
+    __slots__ = ("_renderer", "_logger", "_method_name", "_event_dict")
+
+    def __init__(self, renderer, logger, method_name, event_dict):
+        self._renderer = renderer
+        self._logger = logger
+        self._method_name = method_name
+        self._event_dict = event_dict
+
+    def __call__(self):
+        event_dict = self._event_dict
+        event_dict["exception"] = event_dict["exception"].format()
+        return self._renderer(self._logger, self._method_name, event_dict)
+
+
+def exception_renderer(renderer, formatter, defer=False):
+    def render(logger, method_name, event_dict):
+        # exc_info has served Logfire by now; the JSON output gets the `exception` field instead,
+        # and only for the first occurrence: repeats are the ones with an `exception_ref`.
+        exc_info = event_dict.pop("exc_info", None)
+        if exc_info and "exception_ref" not in event_dict:
+            pending = formatter.pending(exc_info)
+            if defer:
+                event_dict["exception"] = pending
+                return (DeferredRecord(renderer, logger, method_name, event_dict),), {}
+            event_dict["exception"] = pending.format()
+        return renderer(logger, method_name, event_dict)
+
+    render.__name__ = processor_name(renderer)
+    return render
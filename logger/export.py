@@ -0,0 +1,62 @@
+from opentelemetry.sdk.trace import SpanProcessor
+from opentelemetry.sdk.trace.export import SpanExportResult
+
+from .writer import QueueWriter
+
+
+class QueuedSpanProcessor(SpanProcessor):
+    """Export finished spans (Logfire logs included) through a bounded queue on one thread.
+
+    Stands in for OpenTelemetry's BatchSpanProcessor where we need a choice of what to do
+    when the exporter falls behind: `overflow` is "drop_newest", "drop_oldest" or "block"
+    (which stalls the logging thread along with the collector). Batches of up to
+    `batch_size` spans are sent once full or after `schedule_delay` seconds.
+    """
+
+    def __init__(self, exporter, max_queue_size=2048, batch_size=512, schedule_delay=5.0, overflow="drop_newest"):
+        self._exporter = exporter
+        self.exported = 0
+        self.failed = 0
+        self._writer = QueueWriter(
+            self._export, maxsize=max_queue_size, overflow=overflow, batch_size=batch_size, linger=schedule_delay
+        )
+
+    def _export(self, batch):
+        # Runs on the writer thread only, so the counters need no lock.
+        try:
+            result = self._exporter.export(batch)
+        except Exception:
+            self.failed += len(batch)
+            raise
+        if result is SpanExportResult.SUCCESS:
+            self.exported += len(batch)
+        else:
+            self.failed += len(batch)
+
+    def on_start(self, span, parent_context=None):
+        pass
+
+    def on_end(self, span):
+        if span.context.trace_flags.sampled:
+            self._writer.put(span)
+
+    def force_flush(self, timeout_millis=30000):
+        return self._writer.flush(timeout_millis / 1000)
+
+    def shutdown(self):
+        self._writer.close()
+        self._exporter.shutdown()
+
+    def snapshot(self):
+        return {
+            "exported": self.exported,
+            "dropped": self._writer.dropped,
+            "failed": self.failed,
+            "queue_depth": self._writer.qsize(),
+        }
+
+
+def otlp_span_processor(endpoint, timeout=None, **kwargs):
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+    return QueuedSpanProcessor(OTLPSpanExporter(endpoint=endpoint, timeout=timeout), **kwargs)
@@ -1,8 +1,15 @@
-import logging
+import atexit
+import functools
 import os
+import signal
+import threading
+from logging import CRITICAL, DEBUG, ERROR, INFO, WARNING
 
-import logfire
-import structlog
+from .callsite import add_callsite, for_levels, unless_present
+from .writer import QueueLoggerFactory, QueueWriter, stream_sink
+
+# logfire and structlog are imported by configure(), which runs explicitly or on first use,
+# so importing this package stays cheap for short-lived processes.
 
 
 # Logging levels:
@@ -11,8 +18,32 @@ import structlog
 # WARNING: An indication that something unexpected happened, or indicative of some problem in the near future.
 # ERROR: Due to a more serious problem, the software has not been able to perform some function.
 # CRITICAL: A very serious error, indicating that the program itself may be unable to continue running.
-LOGGING_LEVEL = logging.DEBUG
-SERVICE_NAME = os.getenv("LOGFIRE_SERVICE_NAME", "logger")
+_LEVEL_NAMES = {
+    "debug": DEBUG,
+    "info": INFO,
+    "warn": WARNING,
+    "warning": WARNING,
+    "error": ERROR,
+    "critical": CRITICAL,
+    "fatal": CRITICAL,
+    "exception": ERROR,
+}
+
+def _parse_level(value):
+    if isinstance(value, int):
+        return value
+    text = str(value).strip().lower()
+    if text.isdigit():
+        return int(text)
+    if text not in _LEVEL_NAMES:
+        raise ValueError(f"Unknown logging level {value!r}")
+    return _LEVEL_NAMES[text]
+
+def _parse_levels(value):
+    return frozenset(_parse_level(part) for part in value.split(",") if part.strip())
+
+def _level_for_method(method_name):
+    return _LEVEL_NAMES.get(method_name, CRITICAL)
 
 def _env_flag(name, default=False):
     value = os.getenv(name)
@@ -20,51 +51,573 @@ def _env_flag(name, default=False):
         return default
     return value.strip().lower() in {"1", "true", "yes", "on"}
 
+def _env_float(name):
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else None
+
+def _env_int(name):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else None
+
+# Override with LOGGER_LEVEL (name or number); change at runtime with set_level().
+DEFAULT_LOGGING_LEVEL = _parse_level(os.getenv("LOGGER_LEVEL", "debug"))
+LOGGING_LEVEL = DEFAULT_LOGGING_LEVEL
+SERVICE_NAME = os.getenv("LOGFIRE_SERVICE_NAME", "logger")
+# Set LOGGER_LOGFIRE=false to skip logfire.configure and the Logfire processor entirely.
+USE_LOGFIRE = _env_flag("LOGGER_LOGFIRE", default=True)
+
+# Callsite modes:
+# cached: the log_* wrappers resolve their caller at a fixed frame offset, caching names per code object.
+# adder: structlog's CallsiteParameterAdder walks the stack on every event (also covers direct `logger` calls).
+# off: no callsite fields.
+CALLSITE_MODES = ("cached", "adder", "off")
+CALLSITE_MODE = os.getenv("LOGGER_CALLSITE", "cached").strip().lower()
+CALLSITE_LEVELS = _parse_levels(os.getenv("LOGGER_CALLSITE_LEVELS", "debug,info,warning,error,critical"))
+_callsite_levels = CALLSITE_LEVELS if CALLSITE_MODE == "cached" else frozenset()
+
+# auto: orjson (bytes straight to stdout.buffer) when installed, stdlib json otherwise.
+JSON_BACKEND = os.getenv("LOGGER_JSON", "auto")
+
+# Sampling keeps or drops whole requests by correlation_id; rate limiting is per (event, level).
+# Both only apply below WARNING.
+SAMPLE_RATE = _env_float("LOGGER_SAMPLE_RATE")
+RATE_LIMIT = _env_float("LOGGER_RATE_LIMIT")
+RATE_BURST = _env_float("LOGGER_RATE_BURST")
+
+# Repeats of the same message/level/callsite (plus DEDUP_FIELDS) within DEDUP_WINDOW seconds are
+# coalesced into one aggregate event.
+DEDUP_WINDOW = _env_float("LOGGER_DEDUP_WINDOW")
+DEDUP_FIELDS = tuple(field.strip() for field in os.getenv("LOGGER_DEDUP_FIELDS", "").split(",") if field.strip())
+DEDUP_MAX_KEYS = int(os.getenv("LOGGER_DEDUP_MAX_KEYS", "1024"))
+
+# Self-instrumentation, all off by default: counters, per-processor timing, Logfire metrics export.
+STATS_ENABLED = _env_flag("LOGGER_STATS", default=False)
+STATS_TIMING = _env_flag("LOGGER_STATS_TIMING", default=False)
+STATS_METRICS = _env_flag("LOGGER_STATS_METRICS", default=False)
+
+# Export of Logfire spans and logs. LOGGER_OTLP_ENDPOINT (an OTLP/HTTP traces URL) adds an exporter
+# behind a bounded queue with the overflow policy below and exported/dropped/failed counters. The sizes
+# are None unless set with LOGGER_EXPORT_* or configure(). Unset ones follow the standard OTEL_BSP_*
+# variables; set ones are written to them, so Logfire's own exporter (send_to_logfire) batches the same way.
+OTLP_ENDPOINT = os.getenv("LOGGER_OTLP_ENDPOINT") or None
+EXPORT_QUEUE_SIZE = _env_int("LOGGER_EXPORT_QUEUE_SIZE")
+EXPORT_BATCH_SIZE = _env_int("LOGGER_EXPORT_BATCH_SIZE")
+EXPORT_DELAY_MS = _env_int("LOGGER_EXPORT_DELAY_MS")
+EXPORT_TIMEOUT_MS = _env_int("LOGGER_EXPORT_TIMEOUT_MS")
+EXPORT_OVERFLOW = os.getenv("LOGGER_EXPORT_OVERFLOW", "drop_newest").strip().lower()
+
+# Set LOGGER_SEGMENT_DIR to write length-prefixed segment files there (through the background writer)
+# instead of stdout; log_processor ingests them with --segments.
+SEGMENT_DIR = os.getenv("LOGGER_SEGMENT_DIR") or None
+SEGMENT_MAX_BYTES = int(os.getenv("LOGGER_SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))
+SEGMENT_MAX_AGE = _env_float("LOGGER_SEGMENT_MAX_AGE")
+SEGMENT_FSYNC = os.getenv("LOGGER_SEGMENT_FSYNC", "rotate").strip().lower()
+
+# exc_info is fingerprinted by exception type and frame locations; each distinct traceback is rendered
+# once (up to EXC_MAX_FRAMES innermost frames, 0 for all) and repeats carry only the fingerprint.
+EXC_MAX_FRAMES = int(os.getenv("LOGGER_EXC_MAX_FRAMES", "50"))
+EXC_LOCALS = _env_flag("LOGGER_EXC_LOCALS", default=False)
+EXC_CACHE_SIZE = int(os.getenv("LOGGER_EXC_CACHE_SIZE", "1024"))
+
 def _normalize_logfire_level(logger, method_name, event_dict):
     if event_dict.get("level") == "critical":
         event_dict["level"] = "fatal"
     return event_dict
 
-logfire.configure(
-    service_name=SERVICE_NAME,
-    send_to_logfire=_env_flag("LOGFIRE_SEND_TO_LOGFIRE", default=False),
-)
+def _close_queue_writer():
+    global queue_writer, _queue_sink
+    # Events already queued go to the old sink first. A writer inherited through fork has no thread, and its
+    # lock may have been held by the parent's, so it is dropped without closing.
+    if queue_writer is not None and queue_writer.is_alive():
+        queue_writer.close()
+    queue_writer = None
+    _queue_sink = None
+
+def _logger_factory(use_queue_writer, write_batch=None):
+    global queue_writer, _queue_sink, _queued_output
+    _queued_output = write_batch is not None or bool(use_queue_writer)
+    if _queued_output:
+        # Sinks compare by value: init_worker passes queue.put, a new bound method on every access. A different
+        # sink, or a writer whose thread did not survive a fork, replaces the current writer.
+        if queue_writer is None or write_batch != _queue_sink or not queue_writer.is_alive():
+            _close_queue_writer()
+            _queue_sink = write_batch
+            queue_writer = QueueWriter(
+                write_batch or stream_sink(),
+                maxsize=int(os.getenv("LOGGER_QUEUE_SIZE", "10000")),
+                overflow=os.getenv("LOGGER_QUEUE_OVERFLOW", "block").strip().lower(),
+                batch_size=int(os.getenv("LOGGER_QUEUE_BATCH_SIZE", "512")),
+            )
+        return QueueLoggerFactory(queue_writer)
+    _close_queue_writer()
+    if JSON_BACKEND == "orjson":
+        from .rendering import StdoutBytesLoggerFactory
+
+        return StdoutBytesLoggerFactory()
+    import structlog
+
+    return structlog.PrintLoggerFactory()
+
+def _segment_sink():
+    global segment_writer
+    from .segments import SegmentWriter
+
+    if segment_writer is not None and (segment_writer.directory, segment_writer.prefix) == (SEGMENT_DIR, SERVICE_NAME):
+        return segment_writer
+    if segment_writer is not None:
+        segment_writer.close()
+    segment_writer = SegmentWriter(
+        SEGMENT_DIR,
+        prefix=SERVICE_NAME,
+        max_bytes=SEGMENT_MAX_BYTES,
+        max_age=SEGMENT_MAX_AGE,
+        fsync=SEGMENT_FSYNC,
+    )
+    return segment_writer
+
+def _export_setting(value, variable, default):
+    # A size that was set is written to its OTEL_BSP_* variable; one that was not is read from it.
+    if value is None:
+        return int(os.getenv(variable) or default)
+    os.environ[variable] = str(value)
+    return value
+
+def _export_span_processors():
+    global export_processor
+    queue_size = _export_setting(EXPORT_QUEUE_SIZE, "OTEL_BSP_MAX_QUEUE_SIZE", 2048)
+    batch_size = _export_setting(EXPORT_BATCH_SIZE, "OTEL_BSP_MAX_EXPORT_BATCH_SIZE", 512)
+    delay_ms = _export_setting(EXPORT_DELAY_MS, "OTEL_BSP_SCHEDULE_DELAY", 5000)
+    timeout_ms = _export_setting(EXPORT_TIMEOUT_MS, "OTEL_BSP_EXPORT_TIMEOUT", 30000)
+    if not OTLP_ENDPOINT:
+        export_processor = None
+        return None
+    from .export import otlp_span_processor
+    from .writer import OVERFLOW_POLICIES
+
+    if EXPORT_OVERFLOW not in OVERFLOW_POLICIES:
+        raise ValueError(f"Unknown export overflow policy {EXPORT_OVERFLOW!r}, expected one of {OVERFLOW_POLICIES}")
+    # logfire.configure shuts down the previous tracer provider and its processors, so build a new one.
+    export_processor = otlp_span_processor(
+        OTLP_ENDPOINT,
+        timeout=timeout_ms / 1000,
+        max_queue_size=queue_size,
+        batch_size=batch_size,
+        schedule_delay=delay_ms / 1000,
+        overflow=EXPORT_OVERFLOW,
+    )
+    return [export_processor]
+
+def _write_rendered(records):
+    # Output path for events rendered off the wrappers' thread (see aio.py).
+    if queue_writer is not None:
+        for record in records:
+            queue_writer.put(record)
+    else:
+        stream_sink()(records)
+
+def flush_logs(timeout=None):
+    if deduplicator is not None:
+        deduplicator.flush()
+    if queue_writer is not None:
+        return queue_writer.flush(timeout)
+    return True
+
+queue_writer = None
+export_processor = None
+# The write_batch queue_writer was built for (None for stdout).
+_queue_sink = None
+segment_writer = None
+# True when output goes through a QueueWriter, which lets tracebacks be formatted on its thread.
+_queued_output = False
+sampler = None
+deduplicator = None
+exception_formatter = None
+pipeline_stats = None
+_metrics_registered = False
+
+# Set by aio.py on the events it submits: the time of the call, used in place of the time the sink thread
+# gets to them.
+SUBMITTED_AT = "_submitted_at"
+
+def _timestamper():
+    import structlog
+
+    stamp = structlog.processors.TimeStamper(fmt="iso", utc=True)
+
+    def add_timestamp(logger, method_name, event_dict):
+        submitted_at = event_dict.pop(SUBMITTED_AT, None)
+        if submitted_at is None:
+            return stamp(logger, method_name, event_dict)
+        event_dict["timestamp"] = submitted_at
+        return event_dict
+
+    return add_timestamp
+
+def _emit_aggregate(method_name, event_dict):
+    event = event_dict.pop("event", None)
+    getattr(_logger or _configure_lazily(), method_name)(event, **event_dict)
+
+def _flush_deduplicator():
+    if deduplicator is not None:
+        deduplicator.flush()
 
-structlog.configure(
-    processors=[
-        structlog.contextvars.merge_contextvars,
+atexit.register(_flush_deduplicator)
+
+def _build_processors():
+    global sampler, deduplicator, exception_formatter
+    import structlog
+
+    from .exceptions import ExceptionFormatter, exception_renderer
+    from .rendering import json_renderer
+
+    processors = [structlog.contextvars.merge_contextvars]
+    sampler = None
+    if (SAMPLE_RATE is not None and SAMPLE_RATE < 1.0) or RATE_LIMIT is not None:
+        from .sampling import SamplingProcessor
+
+        sampler = SamplingProcessor(
+            _level_for_method,
+            rate=1.0 if SAMPLE_RATE is None else SAMPLE_RATE,
+            rate_limit=RATE_LIMIT,
+            burst=RATE_BURST,
+        )
+        processors.append(sampler)
+    processors += [
         structlog.processors.add_log_level,
-        structlog.processors.TimeStamper(fmt="iso", utc=True),
-        structlog.processors.CallsiteParameterAdder(
+        _timestamper(),
+    ]
+    if CALLSITE_MODE == "adder":
+        adder = structlog.processors.CallsiteParameterAdder(
             [
                 structlog.processors.CallsiteParameter.FILENAME,
                 structlog.processors.CallsiteParameter.FUNC_NAME,
                 structlog.processors.CallsiteParameter.LINENO,
-            ]
-        ),
-        _normalize_logfire_level,
-        logfire.StructlogProcessor(),
-        structlog.processors.JSONRenderer()
-    ],
-    context_class=dict,
-    logger_factory=structlog.PrintLoggerFactory(),
-    wrapper_class=structlog.make_filtering_bound_logger(LOGGING_LEVEL),
-    cache_logger_on_first_use=True,
-)
-
-logger = structlog.get_logger()
+            ],
+            additional_ignores=[__name__, for_levels.__module__],
+        )
+        processors.append(for_levels(unless_present(adder), CALLSITE_LEVELS, _level_for_method))
+    _flush_deduplicator()
+    deduplicator = None
+    if DEDUP_WINDOW:
+        from .dedup import Deduplicator
+
+        deduplicator = Deduplicator(_emit_aggregate, window=DEDUP_WINDOW, fields=DEDUP_FIELDS, max_keys=DEDUP_MAX_KEYS)
+        processors.append(deduplicator)
+    exception_formatter = ExceptionFormatter(
+        max_frames=EXC_MAX_FRAMES, capture_locals=EXC_LOCALS, max_keys=EXC_CACHE_SIZE
+    )
+    processors += [exception_formatter, _normalize_logfire_level]
+    if USE_LOGFIRE:
+        import logfire
+
+        processors.append(logfire.StructlogProcessor())
+    processors.append(json_renderer(JSON_BACKEND))
+    if pipeline_stats is not None:
+        processors[-1] = pipeline_stats.counting_renderer(processors[-1])
+    processors[-1] = exception_renderer(processors[-1], exception_formatter, defer=_queued_output)
+    if pipeline_stats is not None and STATS_TIMING:
+        processors = [pipeline_stats.timed(processor) for processor in processors]
+    return processors
+
+def get_stats():
+    stats = pipeline_stats.snapshot() if pipeline_stats is not None else {
+        "events": {},
+        "bytes_rendered": 0,
+        "processor_time_ns": {},
+    }
+    stats["enabled"] = pipeline_stats is not None
+    stats["dropped"] = {
+        "queue_overflow": queue_writer.dropped if queue_writer is not None else 0,
+        "sampled_out": sampler.sampled_out if sampler is not None else 0,
+        "rate_limited": sampler.rate_limited if sampler is not None else 0,
+        "deduplicated": deduplicator.suppressed if deduplicator is not None else 0,
+    }
+    stats["queue_depth"] = queue_writer.qsize() if queue_writer is not None else None
+    stats["writer_errors"] = queue_writer.errors if queue_writer is not None else 0
+    stats["export"] = export_processor.snapshot() if export_processor is not None else None
+    stats["exceptions"] = {
+        "formatted": exception_formatter.formatted if exception_formatter is not None else 0,
+        "referenced": exception_formatter.referenced if exception_formatter is not None else 0,
+    }
+    return stats
+
+def _check_callsite_mode(mode):
+    mode = mode.strip().lower()
+    if mode not in CALLSITE_MODES:
+        raise ValueError(f"Unknown callsite mode {mode!r}, expected one of {CALLSITE_MODES}")
+    return mode
+
+_configure_lock = threading.RLock()
+
+def configure(
+    *,
+    level=None,
+    callsite=None,
+    callsite_levels=None,
+    json_backend=None,
+    use_queue_writer=None,
+    service_name=None,
+    send_to_logfire=None,
+    sample_rate=None,
+    rate_limit=None,
+    rate_burst=None,
+    dedup_window=None,
+    dedup_fields=None,
+    stats=None,
+    stats_timing=None,
+    stats_metrics=None,
+    exc_max_frames=None,
+    exc_locals=None,
+    segment_dir=None,
+    otlp_endpoint=None,
+    export_queue_size=None,
+    export_batch_size=None,
+    export_delay_ms=None,
+    export_timeout_ms=None,
+    export_overflow=None,
+    use_logfire=None,
+    write_batch=None,
+):
+    # Arguments left as None fall back to the environment variables documented in the readme.
+    global LOGGING_LEVEL, CALLSITE_MODE, CALLSITE_LEVELS, _callsite_levels, JSON_BACKEND, SERVICE_NAME
+    global SAMPLE_RATE, RATE_LIMIT, RATE_BURST, DEDUP_WINDOW, DEDUP_FIELDS
+    global STATS_ENABLED, STATS_TIMING, STATS_METRICS, pipeline_stats, _metrics_registered, USE_LOGFIRE
+    global EXC_MAX_FRAMES, EXC_LOCALS, SEGMENT_DIR
+    global OTLP_ENDPOINT, EXPORT_QUEUE_SIZE, EXPORT_BATCH_SIZE, EXPORT_DELAY_MS, EXPORT_TIMEOUT_MS, EXPORT_OVERFLOW
+    import structlog
+
+    from .rendering import resolve_json_backend
+
+    with _configure_lock:
+        if level is not None:
+            LOGGING_LEVEL = _parse_level(level)
+        if callsite is not None:
+            CALLSITE_MODE = callsite
+        CALLSITE_MODE = _check_callsite_mode(CALLSITE_MODE)
+        if callsite_levels is not None:
+            CALLSITE_LEVELS = frozenset(_parse_level(value) for value in callsite_levels)
+        _callsite_levels = CALLSITE_LEVELS if CALLSITE_MODE == "cached" else frozenset()
+        JSON_BACKEND = resolve_json_backend(json_backend or JSON_BACKEND)
+        if service_name is not None:
+            SERVICE_NAME = service_name
+        if sample_rate is not None:
+            SAMPLE_RATE = float(sample_rate)
+        if rate_limit is not None:
+            RATE_LIMIT = float(rate_limit)
+        if rate_burst is not None:
+            RATE_BURST = float(rate_burst)
+        if dedup_window is not None:
+            DEDUP_WINDOW = float(dedup_window)
+        if dedup_fields is not None:
+            DEDUP_FIELDS = tuple(dedup_fields)
+        if stats is not None:
+            STATS_ENABLED = stats
+        if stats_timing is not None:
+            STATS_TIMING = stats_timing
+        if stats_metrics is not None:
+            STATS_METRICS = stats_metrics
+        if exc_max_frames is not None:
+            EXC_MAX_FRAMES = int(exc_max_frames)
+        if exc_locals is not None:
+            EXC_LOCALS = exc_locals
+        if segment_dir is not None:
+            SEGMENT_DIR = segment_dir or None
+        if otlp_endpoint is not None:
+            OTLP_ENDPOINT = otlp_endpoint or None
+        if export_queue_size is not None:
+            EXPORT_QUEUE_SIZE = int(export_queue_size)
+        if export_batch_size is not None:
+            EXPORT_BATCH_SIZE = int(export_batch_size)
+        if export_delay_ms is not None:
+            EXPORT_DELAY_MS = int(export_delay_ms)
+        if export_timeout_ms is not None:
+            EXPORT_TIMEOUT_MS = int(export_timeout_ms)
+        if export_overflow is not None:
+            EXPORT_OVERFLOW = export_overflow.strip().lower()
+        if STATS_ENABLED or STATS_TIMING or STATS_METRICS:
+            if pipeline_stats is None:
+                from .stats import PipelineStats
+
+                pipeline_stats = PipelineStats()
+        else:
+            pipeline_stats = None
+        if use_queue_writer is None:
+            use_queue_writer = _env_flag("LOGGER_QUEUE_WRITER", default=False)
+        if send_to_logfire is None:
+            send_to_logfire = _env_flag("LOGFIRE_SEND_TO_LOGFIRE", default=False)
+        if use_logfire is not None:
+            USE_LOGFIRE = use_logfire
+
+        if USE_LOGFIRE:
+            import logfire
+
+            logfire.configure(
+                service_name=SERVICE_NAME,
+                send_to_logfire=send_to_logfire,
+                additional_span_processors=_export_span_processors(),
+            )
+
+        # The factory goes first: it decides whether the processors can defer traceback formatting.
+        if write_batch is None and SEGMENT_DIR:
+            write_batch = _segment_sink()
+        logger_factory = _logger_factory(use_queue_writer, write_batch)
+        structlog.configure(
+            processors=_build_processors(),
+            context_class=dict,
+            logger_factory=logger_factory,
+            wrapper_class=structlog.make_filtering_bound_logger(LOGGING_LEVEL),
+            cache_logger_on_first_use=True,
+        )
+        _rebuild_logger()
+        if STATS_METRICS and not _metrics_registered:
+            from .stats import register_logfire_metrics
+
+            register_logfire_metrics(get_stats)
+            _metrics_registered = True
+
+def is_configured():
+    return _logger is not None
+
+def _configure_lazily():
+    with _configure_lock:
+        if _logger is None:
+            configure()
+    return _logger
+
+class _LoggerProxy:
+    # Always resolves to the current bound logger, so set_level() reaches code holding `logger`.
+    def __getattr__(self, name):
+        if _signals_applied != _signals_received:
+            _apply_signalled_level()
+        return getattr(_logger or _configure_lazily(), name)
+
+    def __repr__(self):
+        return f"<LoggerProxy {_logger!r}>"
+
+logger = _LoggerProxy()
+# Concrete bound logger used by the log_* wrappers; built by configure() and rebuilt when the level changes.
+_logger = None
+# structlog.DropEvent, bound with _logger.
+_DropEvent = None
+
+BOUND_LOGGER_CACHE_SIZE = int(os.getenv("LOGGER_BOUND_CACHE_SIZE", "128"))
+
+@functools.lru_cache(maxsize=BOUND_LOGGER_CACHE_SIZE)
+def bound_logger(correlation_id):
+    return (_logger or _configure_lazily()).bind(correlation_id=correlation_id)
+
+def get_level():
+    return LOGGING_LEVEL
+
+def _rebuild_logger():
+    global _logger, _DropEvent
+    import structlog
+
+    _logger = structlog.get_logger().bind()
+    _DropEvent = structlog.DropEvent
+    bound_logger.cache_clear()
+
+def set_level(level):
+    global LOGGING_LEVEL
+    level = _parse_level(level)
+    with _configure_lock:
+        if _logger is not None:
+            import structlog
+
+            structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(level))
+            _rebuild_logger()
+        LOGGING_LEVEL = level
+    return level
+
+def set_callsite(mode, levels=None):
+    global CALLSITE_MODE, CALLSITE_LEVELS, _callsite_levels
+    mode = _check_callsite_mode(mode)
+    with _configure_lock:
+        if levels is not None:
+            CALLSITE_LEVELS = frozenset(_parse_level(level) for level in levels)
+        CALLSITE_MODE = mode
+        _callsite_levels = CALLSITE_LEVELS if mode == "cached" else frozenset()
+        if _logger is not None:
+            import structlog
+
+            structlog.configure(processors=_build_processors())
+            _rebuild_logger()
+
+# Level changes from the signal handler, applied with set_level() by the next event. The handler may run
+# while the main thread holds _configure_lock, so it only assigns globals.
+_signalled_level = None
+_signals_received = 0
+_signals_applied = 0
+
+def _apply_signalled_level():
+    global _signals_applied
+    received = _signals_received
+    set_level(_signalled_level)
+    # A signal during set_level() leaves the counts apart, and the next event applies its level.
+    _signals_applied = received
+
+def install_level_signal_handler(signum=getattr(signal, "SIGUSR1", None)):
+    # Each signal toggles between DEBUG and DEFAULT_LOGGING_LEVEL. Must be called from the main thread.
+    if signum is None:
+        raise RuntimeError("No signal available for toggling the logging level on this platform")
+
+    def _toggle(signum, frame):
+        global LOGGING_LEVEL, _signalled_level, _signals_received
+        # The wrappers' own level checks see the new level at once; structlog's filter follows on the next event.
+        _signalled_level = LOGGING_LEVEL = DEFAULT_LOGGING_LEVEL if LOGGING_LEVEL == DEBUG else DEBUG
+        _signals_received += 1
+
+    signal.signal(signum, _toggle)
+
+def _emit(method_name, message, event_kw):
+    # What log.<method>(message, **event_kw) does, but the chain gets a copy of the wrapper's own kwargs
+    # dict: no bound logger per call, and no further kwargs dicts held while the processors run.
+    if _signals_applied != _signals_received:
+        _apply_signalled_level()
+    log = _logger or _configure_lazily()
+    try:
+        args, kw = log._process_event(method_name, message, event_kw)
+    except _DropEvent:
+        return
+    getattr(log._logger, method_name)(*args, **kw)
 
+# Disabled levels return before touching kwargs, contextvars or the processor chain.
 def log_info(correlation_id, message, **params):
-    logger.bind(correlation_id=correlation_id, **params).info(message)
+    if LOGGING_LEVEL > INFO:
+        return
+    if INFO in _callsite_levels:
+        add_callsite(params)
+    params["correlation_id"] = correlation_id
+    _emit("info", message, params)
 
 def log_debug(correlation_id, message, **params):
-    logger.bind(correlation_id=correlation_id, **params).debug(message)
+    if LOGGING_LEVEL > DEBUG:
+        return
+    if DEBUG in _callsite_levels:
+        add_callsite(params)
+    params["correlation_id"] = correlation_id
+    _emit("debug", message, params)
 
 def log_warning(correlation_id, message, **params):
-    logger.bind(correlation_id=correlation_id, **params).warning(message)
+    if LOGGING_LEVEL > WARNING:
+        return
+    if WARNING in _callsite_levels:
+        add_callsite(params)
+    params["correlation_id"] = correlation_id
+    _emit("warning", message, params)
 
 def log_error(correlation_id, message, **params):
-    logger.bind(correlation_id=correlation_id, **params).error(message)
+    if LOGGING_LEVEL > ERROR:
+        return
+    if ERROR in _callsite_levels:
+        add_callsite(params)
+    params["correlation_id"] = correlation_id
+    _emit("error", message, params)
 
 def log_critical(correlation_id, message, **params):
-    logger.bind(correlation_id=correlation_id, **params).fatal(message)
+    if LOGGING_LEVEL > CRITICAL:
+        return
+    if CRITICAL in _callsite_levels:
+        add_callsite(params)
+    params["correlation_id"] = correlation_id
+    _emit("critical", message, params)
@@ -0,0 +1,80 @@
+import multiprocessing
+import multiprocessing.util
+import threading
+
+import structlog
+
+from .writer import stream_sink
+
+
+class LogAggregator:
+    """Single writer in the parent for events rendered by worker processes.
+
+    Workers configured by `init_worker` render events locally and ship them in batches
+    over a multiprocessing queue; one thread here writes each batch with a single write,
+    so lines from different workers never interleave or tear.
+
+        with LogAggregator() as aggregator:
+            with ProcessPoolExecutor(initializer=init_worker, initargs=aggregator.initargs()) as pool:
+                pool.submit(with_log_context(task), item)
+    """
+
+    def __init__(self, mp_context=None, maxsize=1024, write_batch=None):
+        mp_context = mp_context or multiprocessing.get_context()
+        self.queue = mp_context.Queue(maxsize)
+        self._write_batch = write_batch or stream_sink()
+        self.batches = 0
+        self.events = 0
+        self._thread = threading.Thread(target=self._run, name="logger-aggregator", daemon=True)
+        self._thread.start()
+
+    def initargs(self, **configure_kwargs):
+        # Contextvars bound in the parent now (request_id, user_id, ...) are bound in every worker.
+        return (self.queue, structlog.contextvars.get_contextvars(), configure_kwargs)
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                return
+            self._write_batch(batch)
+            self.batches += 1
+            self.events += len(batch)
+
+    def close(self, timeout=None):
+        self.queue.put(None)
+        self._thread.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def init_worker(queue, context=None, configure_kwargs=None):
+    from .logger import configure, flush_logs
+
+    # The parent owns Logfire export unless the caller opts back in.
+    kwargs = {"use_logfire": False}
+    kwargs.update(configure_kwargs or {})
+    configure(write_batch=queue.put, **kwargs)
+    if context:
+        structlog.contextvars.bind_contextvars(**context)
+    # Worker processes skip atexit; a multiprocessing finalizer drains the local writer on exit.
+    multiprocessing.util.Finalize(None, flush_logs, exitpriority=100)
+
+
+class ContextCall:
+    # Picklable wrapper that re-binds the submitter's contextvars around the call in the worker.
+    def __init__(self, fn, context):
+        self.fn = fn
+        self.context = context
+
+    def __call__(self, *args, **kwargs):
+        with structlog.contextvars.bound_contextvars(**self.context):
+            return self.fn(*args, **kwargs)
+
+
+def with_log_context(fn):
+    return ContextCall(fn, structlog.contextvars.get_contextvars())
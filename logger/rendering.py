@@ -0,0 +1,58 @@
+import json
+import sys
+
+import structlog
+
+try:
+    import orjson
+except ImportError:  # optional, installed with the `fast` extra
+    orjson = None
+
+JSON_BACKENDS = ("auto", "orjson", "stdlib")
+
+
+def resolve_json_backend(backend="auto"):
+    backend = backend.strip().lower()
+    if backend not in JSON_BACKENDS:
+        raise ValueError(f"Unknown JSON backend {backend!r}, expected one of {JSON_BACKENDS}")
+    if backend == "auto":
+        return "orjson" if orjson is not None else "stdlib"
+    if backend == "orjson" and orjson is None:
+        raise RuntimeError("JSON backend 'orjson' requested but orjson is not installed")
+    return backend
+
+
+def _orjson_dumps(obj, default=None):
+    try:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        # e.g. integers wider than 64 bits; stdlib json handles them.
+        return json.dumps(obj, default=default).encode("utf-8")
+
+
+# orjson renders compact UTF-8 bytes; stdlib renders str. Both parse identically with json.loads.
+def json_renderer(backend):
+    if backend == "orjson":
+        return structlog.processors.JSONRenderer(serializer=_orjson_dumps)
+    return structlog.processors.JSONRenderer()
+
+
+class StdoutBytesLogger:
+    # Writes rendered bytes straight to the binary stdout buffer, skipping the text layer's encode.
+    def msg(self, message):
+        stdout = sys.stdout
+        out = getattr(stdout, "buffer", None)
+        if out is None:
+            stdout.write(message.decode("utf-8") + "\n")
+            stdout.flush()
+            return
+        out.write(message + b"\n")
+        out.flush()
+
+    log = debug = info = warn = warning = msg
+    fatal = failure = err = error = critical = exception = msg
+
+
+class StdoutBytesLoggerFactory:
+    def __call__(self, *args):
+        return StdoutBytesLogger()
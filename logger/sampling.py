@@ -0,0 +1,89 @@
+import random
+import threading
+import time
+import zlib
+from logging import WARNING
+
+import structlog
+
+MAX_RATE_LIMIT_KEYS = 10000
+
+
+def keep_correlation_id(correlation_id, rate):
+    # crc32 is stable across processes, so every service keeps or drops the same requests.
+    return zlib.crc32(str(correlation_id).encode("utf-8")) < rate * 0x100000000
+
+
+class SamplingProcessor:
+    """Drop a deterministic share of requests and rate-limit each (event, level) pair.
+
+    Events at WARNING and above always pass, and so do Deduplicator aggregates (events with
+    ``repeat_count``): their first occurrence already passed, and the summary is the only
+    record of the repeats. The number of events dropped since the last emitted event is
+    attached to that event as ``sampled_out``/``rate_limited``.
+    """
+
+    def __init__(self, level_for_method, rate=1.0, rate_limit=None, burst=None, clock=time.monotonic):
+        self._level_for_method = level_for_method
+        self._rate = rate
+        self._rate_limit = rate_limit
+        self._burst = burst or rate_limit
+        self._clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._pending_sampled_out = 0
+        self._pending_rate_limited = 0
+        self.sampled_out = 0
+        self.rate_limited = 0
+
+    def _sampled(self, event_dict):
+        if self._rate >= 1.0:
+            return True
+        correlation_id = event_dict.get("correlation_id")
+        if correlation_id is None:
+            return random.random() < self._rate
+        return keep_correlation_id(correlation_id, self._rate)
+
+    def _take_token(self, key):
+        now = self._clock()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_RATE_LIMIT_KEYS:
+                self._buckets.clear()
+            bucket = self._buckets[key] = [self._burst, now]
+        else:
+            bucket[0] = min(self._burst, bucket[0] + (now - bucket[1]) * self._rate_limit)
+            bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def __call__(self, logger, method_name, event_dict):
+        if self._level_for_method(method_name) >= WARNING or "repeat_count" in event_dict:
+            return self._attach_counts(event_dict)
+        if not self._sampled(event_dict):
+            with self._lock:
+                self._pending_sampled_out += 1
+                self.sampled_out += 1
+            raise structlog.DropEvent
+        if self._rate_limit is not None:
+            with self._lock:
+                allowed = self._take_token((event_dict.get("event"), method_name))
+                if not allowed:
+                    self._pending_rate_limited += 1
+                    self.rate_limited += 1
+            if not allowed:
+                raise structlog.DropEvent
+        return self._attach_counts(event_dict)
+
+    def _attach_counts(self, event_dict):
+        if self._pending_sampled_out or self._pending_rate_limited:
+            with self._lock:
+                if self._pending_sampled_out:
+                    event_dict["sampled_out"] = self._pending_sampled_out
+                    self._pending_sampled_out = 0
+                if self._pending_rate_limited:
+                    event_dict["rate_limited"] = self._pending_rate_limited
+                    self._pending_rate_limited = 0
+        return event_dict
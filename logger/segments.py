@@ -0,0 +1,95 @@
+import atexit
+import os
+import struct
+import threading
+import time
+
+FSYNC_POLICIES = ("never", "rotate", "batch")
+SEGMENT_SUFFIX = ".seg"
+# Each record is a 4-byte big-endian length followed by the rendered UTF-8 JSON event.
+_LENGTH = struct.Struct(">I")
+# An empty record ends a segment that was closed: nothing more will be appended to it.
+SEGMENT_END = _LENGTH.pack(0)
+
+
+def segment_name(prefix, started_ms=None, pid=None):
+    # Millisecond start time first so segments from one writer sort in write order.
+    started_ms = int(time.time() * 1000) if started_ms is None else started_ms
+    return f"{prefix}-{started_ms:013d}-{pid or os.getpid()}{SEGMENT_SUFFIX}"
+
+
+class SegmentWriter:
+    """Batch sink that appends length-prefixed records to local segment files.
+
+    A new segment is started once the current one reaches `max_bytes` or is older than
+    `max_age` seconds. Every batch is flushed to the OS before returning; `fsync` adds an
+    fsync after each batch ("batch"), when a segment is closed ("rotate"), or never.
+    Segment names start with `prefix` (the service name), so a reader can tell services apart.
+    A closed segment ends with SEGMENT_END, so a reader can delete it once it has stored every
+    record; the last segment of a process that dies without closing it has no end record.
+    """
+
+    def __init__(self, directory, prefix="logger", max_bytes=64 * 1024 * 1024, max_age=None, fsync="rotate"):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync!r}, expected one of {FSYNC_POLICIES}")
+        self.directory = directory
+        self.prefix = prefix
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._fsync = fsync
+        self._lock = threading.Lock()
+        self._file = None
+        self._opened = 0.0
+        self._last_started_ms = 0
+        self.segments = 0
+        os.makedirs(directory, exist_ok=True)
+        # Registered before the QueueWriter that feeds it, so atexit closes it after the queue drains.
+        atexit.register(self.close)
+
+    def _open(self):
+        now = time.time()
+        # Names have millisecond resolution: a segment rotated within the same millisecond takes the
+        # next one, so a closed segment is never reopened.
+        started_ms = max(int(now * 1000), self._last_started_ms + 1)
+        self._last_started_ms = started_ms
+        path = os.path.join(self.directory, segment_name(self.prefix, started_ms))
+        self._file = open(path, "ab")
+        self._opened = now
+        self.segments += 1
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        self._file.write(SEGMENT_END)
+        self._file.flush()
+        if self._fsync != "never":
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+
+    def _due_for_rotation(self):
+        if self._file.tell() >= self._max_bytes:
+            return True
+        return self._max_age is not None and time.time() - self._opened >= self._max_age
+
+    def __call__(self, batch):
+        pack = _LENGTH.pack
+        chunks = []
+        for record in batch:
+            if isinstance(record, str):
+                record = record.encode("utf-8")
+            chunks.append(pack(len(record)))
+            chunks.append(record)
+        with self._lock:
+            if self._file is not None and self._due_for_rotation():
+                self._close_segment()
+            if self._file is None:
+                self._open()
+            self._file.write(b"".join(chunks))
+            self._file.flush()
+            if self._fsync == "batch":
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._close_segment()
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import Counter
+
+
+def processor_name(processor):
+    return getattr(processor, "__name__", type(processor).__name__)
+
+
+class PipelineStats:
+    """Counters kept by the processor chain when LOGGER_STATS is enabled."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.events = Counter()
+        self.bytes_rendered = 0
+        self.processor_time_ns = Counter()
+
+    def counting_renderer(self, renderer):
+        def render(logger, method_name, event_dict):
+            level = event_dict.get("level", method_name)
+            rendered = renderer(logger, method_name, event_dict)
+            with self._lock:
+                self.events[level] += 1
+                self.bytes_rendered += len(rendered)
+            return rendered
+
+        render.__name__ = processor_name(renderer)
+        return render
+
+    def timed(self, processor):
+        name = processor_name(processor)
+        perf = time.perf_counter_ns
+
+        def run(logger, method_name, event_dict):
+            start = perf()
+            try:
+                return processor(logger, method_name, event_dict)
+            finally:
+                elapsed = perf() - start
+                with self._lock:
+                    self.processor_time_ns[name] += elapsed
+
+        run.__name__ = name
+        return run
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "events": dict(self.events),
+                "bytes_rendered": self.bytes_rendered,
+                "processor_time_ns": dict(self.processor_time_ns),
+            }
+
+
+def register_logfire_metrics(get_stats):
+    # Observable instruments: values are read from get_stats() only when the metric reader collects.
+    import logfire
+    from opentelemetry.metrics import Observation
+
+    def events(options):
+        return [Observation(count, {"level": level}) for level, count in get_stats()["events"].items()]
+
+    def bytes_rendered(options):
+        return [Observation(get_stats()["bytes_rendered"])]
+
+    def dropped(options):
+        return [Observation(count, {"reason": reason}) for reason, count in get_stats()["dropped"].items()]
+
+    def processor_time(options):
+        return [
+            Observation(elapsed, {"processor": name})
+            for name, elapsed in get_stats()["processor_time_ns"].items()
+        ]
+
+    def exported(options):
+        export = get_stats()["export"]
+        if export is None:
+            return []
+        return [Observation(export[outcome], {"outcome": outcome}) for outcome in ("exported", "dropped", "failed")]
+
+    def queue_depth(options):
+        depth = get_stats()["queue_depth"]
+        return [] if depth is None else [Observation(depth)]
+
+    logfire.metric_counter_callback(
+        "logger.events", callbacks=[events], description="Events rendered by the logging pipeline"
+    )
+    logfire.metric_counter_callback(
+        "logger.bytes_rendered", callbacks=[bytes_rendered], unit="By", description="Bytes of rendered log output"
+    )
+    logfire.metric_counter_callback(
+        "logger.dropped", callbacks=[dropped], description="Events dropped by reason"
+    )
+    logfire.metric_counter_callback(
+        "logger.processor_time", callbacks=[processor_time], unit="ns", description="Time spent in each processor"
+    )
+    logfire.metric_counter_callback(
+        "logger.export", callbacks=[exported], description="Spans and logs sent to the OTLP endpoint, by outcome"
+    )
+    logfire.metric_gauge_callback(
+        "logger.queue_depth", [queue_depth], description="Events waiting in the background writer queue"
+    )
@@ -1,11 +1,653 @@
-from logger.logger import log_info, log_debug, log_warning, log_error, log_critical
+import asyncio
+import atexit
+import datetime
+import http.server
+import importlib
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from logging import DEBUG, WARNING
+
+import logfire
+import pytest
+import structlog
+from opentelemetry.sdk.trace import TracerProvider
+
+from logger.dedup import Deduplicator
+from logger.export import QueuedSpanProcessor
+from logger.logger import (
+    configure,
+    flush_logs,
+    get_level,
+    log_critical,
+    log_debug,
+    log_error,
+    log_info,
+    log_warning,
+    set_level,
+)
+from logger.multiprocess import LogAggregator, init_worker, with_log_context
+from logger.sampling import SamplingProcessor, keep_correlation_id
+from logger.segments import SEGMENT_END, SegmentWriter
+from logger.writer import QueueWriter
+
+# The module rather than the `logger` proxy the package exports under the same name.
+core = importlib.import_module("logger.logger")
+
+CORRELATION_ID = "123e4567-e89b-12d3-a456-426614174000"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def level_for_method(method_name):
+    return {"debug": 10, "info": 20, "warning": 30, "error": 40}.get(method_name, 50)
+
+
+@pytest.fixture
+def output():
+    records = []
+    configure(level="debug", use_logfire=False, json_backend="stdlib", write_batch=records.extend)
+    yield records
+    flush_logs()
+
 
 def example_function(param1, param2, optional_param=None):
-    correlation_id = "123e4567-e89b-12d3-a456-426614174000"
-    log_info(correlation_id, "Info log from example_function", custom_key="custom_value")
-    log_debug(correlation_id, "Debug log from example_function", custom_key="custom_value")
-    log_warning(correlation_id, "Warning log from example_function", custom_key="custom_value")
-    log_error(correlation_id, "Error log from example_function", custom_key="custom_value")
-    log_critical(correlation_id, "Critical log from example_function", custom_key="custom_value")
-
-example_function("value1", "value2", optional_param="optional_value")
\ No newline at end of file
+    log_info(CORRELATION_ID, "Info log from example_function", custom_key="custom_value")
+    log_debug(CORRELATION_ID, "Debug log from example_function", custom_key="custom_value")
+    log_warning(CORRELATION_ID, "Warning log from example_function", custom_key="custom_value")
+    log_error(CORRELATION_ID, "Error log from example_function", custom_key="custom_value")
+    log_critical(CORRELATION_ID, "Critical log from example_function", custom_key="custom_value")
+
+
+def test_wrappers_write_every_level(output):
+    example_function("value1", "value2", optional_param="optional_value")
+    flush_logs()
+    events = [json.loads(record) for record in output]
+    assert [event["level"] for event in events] == ["info", "debug", "warning", "error", "fatal"]
+    for event in events:
+        assert event["correlation_id"] == CORRELATION_ID
+        assert event["custom_key"] == "custom_value"
+        assert event["func_name"] == "example_function"
+
+
+def test_sampling_keeps_or_drops_whole_requests():
+    sampler = SamplingProcessor(level_for_method, rate=0.5)
+    kept = []
+    reported = 0
+    for number in range(200):
+        correlation_id = f"request-{number}"
+        outcomes = set()
+        for _ in range(3):
+            try:
+                event_dict = sampler(None, "info", {"event": "step", "correlation_id": correlation_id})
+                reported += event_dict.get("sampled_out", 0)
+                outcomes.add(True)
+            except structlog.DropEvent:
+                outcomes.add(False)
+        assert outcomes == {keep_correlation_id(correlation_id, 0.5)}
+        kept.append(outcomes == {True})
+    assert 50 < sum(kept) < 150
+    # Warnings always pass. Each event carries the count of those dropped since the one before it.
+    warning = sampler(None, "warning", {"event": "slow", "correlation_id": "request-0"})
+    reported += warning.get("sampled_out", 0)
+    assert reported == sampler.sampled_out == 3 * (200 - sum(kept))
+
+
+def test_rate_limit_reports_dropped_events():
+    clock = Clock()
+    sampler = SamplingProcessor(level_for_method, rate_limit=1.0, burst=2, clock=clock)
+    sampler(None, "info", {"event": "tick"})
+    sampler(None, "info", {"event": "tick"})
+    with pytest.raises(structlog.DropEvent):
+        sampler(None, "info", {"event": "tick"})
+    # Other events have buckets of their own; the next one through reports the drop.
+    assert sampler(None, "info", {"event": "tock"})["rate_limited"] == 1
+    clock.now += 1.0
+    assert "rate_limited" not in sampler(None, "info", {"event": "tick"})
+    assert sampler.rate_limited == 1
+
+
+def test_dedup_coalesces_repeats_into_one_aggregate():
+    clock = Clock()
+    aggregates = []
+    dedup = Deduplicator(
+        lambda method_name, event_dict: aggregates.append((method_name, event_dict)), window=1.0, clock=clock, timer=False
+    )
+    first = dedup(None, "error", {"event": "db down", "timestamp": "t0", "attempt": 1})
+    assert first["attempt"] == 1
+    for attempt, timestamp in ((2, "t1"), (3, "t2")):
+        with pytest.raises(structlog.DropEvent):
+            dedup(None, "error", {"event": "db down", "timestamp": timestamp, "attempt": attempt})
+    assert dedup.suppressed == 2
+    assert aggregates == []
+    dedup.flush()
+    ((method_name, aggregate),) = aggregates
+    assert method_name == "error"
+    assert aggregate["repeat_count"] == 2
+    assert (aggregate["first_seen"], aggregate["last_seen"]) == ("t0", "t2")
+    assert aggregate["repeat_sample"] == {"attempt": 3}
+
+
+def test_dedup_reports_expired_windows_on_any_event_with_sampler_counts():
+    clock = Clock()
+    aggregates = []
+    dedup = Deduplicator(lambda method_name, event_dict: aggregates.append(event_dict), window=1.0, clock=clock, timer=False)
+    dedup(None, "info", {"event": "cache miss"})
+    # Counts the sampler attached to a suppressed repeat belong to the aggregate.
+    for counts in ({"sampled_out": 3}, {"sampled_out": 1, "rate_limited": 2}):
+        with pytest.raises(structlog.DropEvent):
+            dedup(None, "info", {"event": "cache miss", **counts})
+    clock.now += 1.5
+    assert dedup(None, "info", {"event": "unrelated"}) == {"event": "unrelated"}
+    (aggregate,) = aggregates
+    assert aggregate["repeat_count"] == 2
+    assert (aggregate["sampled_out"], aggregate["rate_limited"]) == (4, 2)
+    assert "sampled_out" not in aggregate["repeat_sample"]
+
+
+def test_dedup_aggregate_passes_the_rate_limiter(monkeypatch):
+    records = []
+    for name, value in (("RATE_LIMIT", 1.0), ("RATE_BURST", 2.0), ("DEDUP_WINDOW", 60.0)):
+        monkeypatch.setattr(core, name, value)
+    configure(level="debug", use_logfire=False, json_backend="stdlib", write_batch=records.extend)
+    try:
+        # The first tick is written, the second is a repeat for dedup, the rest exceed the burst.
+        for _ in range(5):
+            log_info(CORRELATION_ID, "tick")
+        flush_logs()
+    finally:
+        monkeypatch.undo()
+        configure(write_batch=records.extend)
+    first, aggregate = (json.loads(record) for record in records)
+    assert "repeat_count" not in first
+    # The bucket is empty by now; the summary still gets through and reports what was limited.
+    assert (aggregate["event"], aggregate["repeat_count"], aggregate["rate_limited"]) == ("tick", 1, 3)
+
+
+def test_dedup_timer_reports_windows_that_expire_in_silence():
+    reported = threading.Event()
+    dedup = Deduplicator(lambda method_name, event_dict: reported.set(), window=0.05)
+    dedup(None, "error", {"event": "db down"})
+    with pytest.raises(structlog.DropEvent):
+        dedup(None, "error", {"event": "db down"})
+    assert reported.wait(2.0)
+
+
+@pytest.fixture
+def stats_output(monkeypatch):
+    records = []
+    for name, value in (("SAMPLE_RATE", 0.5), ("RATE_LIMIT", 1.0), ("RATE_BURST", 2.0), ("DEDUP_WINDOW", 60.0),
+                        ("STATS_ENABLED", True), ("STATS_TIMING", True)):
+        monkeypatch.setattr(core, name, value)
+    configure(level="debug", use_logfire=False, json_backend="stdlib", write_batch=records.extend)
+    yield records
+    monkeypatch.undo()
+    configure(write_batch=records.extend)
+    flush_logs()
+
+
+def test_stats_count_rendered_and_dropped_events(stats_output):
+    requests = [f"request-{number}" for number in range(40)]
+    kept = [request for request in requests if keep_correlation_id(request, 0.5)]
+    for number, request in enumerate(requests):
+        log_info(request, f"step {number}")
+    # Two ticks fit the burst and three are rate limited; the second of the two is a repeat for dedup.
+    for _ in range(5):
+        log_info(kept[0], "tick")
+    # Warnings bypass sampling and rate limiting, so only dedup drops them.
+    for _ in range(3):
+        log_warning(kept[0], "disk full")
+    # Also writes the two dedup aggregates.
+    flush_logs()
+    stats = core.get_stats()
+    assert stats["enabled"] is True
+    assert stats["dropped"] == {
+        "queue_overflow": 0,
+        "sampled_out": len(requests) - len(kept),
+        "rate_limited": 3,
+        "deduplicated": 3,
+    }
+    assert stats["events"] == {"info": len(kept) + 2, "warning": 2}
+    assert len(stats_output) == len(kept) + 4
+    assert stats["bytes_rendered"] == sum(len(record) for record in stats_output)
+    assert stats["queue_depth"] == 0 and stats["writer_errors"] == 0
+    timings = stats["processor_time_ns"]
+    assert {"merge_contextvars", "SamplingProcessor", "add_log_level", "add_timestamp", "Deduplicator"} <= set(timings)
+    assert all(elapsed > 0 for elapsed in timings.values())
+
+
+def test_stats_disabled_report_only_drop_counters(output):
+    log_info(CORRELATION_ID, "uncounted")
+    flush_logs()
+    stats = core.get_stats()
+    assert stats["enabled"] is False
+    assert stats["events"] == {} and stats["bytes_rendered"] == 0 and stats["processor_time_ns"] == {}
+    assert stats["dropped"] == {"queue_overflow": 0, "sampled_out": 0, "rate_limited": 0, "deduplicated": 0}
+
+
+def test_queue_writer_writes_batches_in_order():
+    batches = []
+    writer = QueueWriter(batches.append, batch_size=16)
+    for number in range(100):
+        writer.put(number)
+    assert writer.flush(5.0)
+    writer.close()
+    assert [record for batch in batches for record in batch] == list(range(100))
+    assert max(len(batch) for batch in batches) <= 16
+
+
+def test_queue_writer_drops_newest_when_full():
+    writing = threading.Event()
+    release = threading.Event()
+    written = []
+
+    def write_batch(batch):
+        writing.set()
+        release.wait(5.0)
+        written.extend(batch)
+
+    writer = QueueWriter(write_batch, maxsize=2, overflow="drop_newest", batch_size=1)
+    writer.put("first")
+    assert writing.wait(5.0)
+    for record in ("second", "third", "fourth"):
+        writer.put(record)
+    assert writer.dropped == 1
+    release.set()
+    assert writer.flush(5.0)
+    writer.close()
+    assert written == ["first", "second", "third"]
+
+
+def read_segment_file(path):
+    with open(path, "rb") as handle:
+        data = handle.read()
+    records = []
+    while data:
+        length = int.from_bytes(data[:4], "big")
+        records.append(data[4:4 + length])
+        data = data[4 + length:]
+    return records
+
+
+def test_segment_writer_rotates_and_ends_closed_segments(tmp_path):
+    writer = SegmentWriter(str(tmp_path), prefix="orders", max_bytes=64, fsync="never")
+    try:
+        for number in range(6):
+            writer([f'{{"event": "event {number}"}}', f'{{"event": "event {number}b"}}'.encode("utf-8")])
+    finally:
+        writer.close()
+    atexit.unregister(writer.close)
+    segments = sorted(os.listdir(tmp_path))
+    assert len(segments) == writer.segments > 1
+    assert all(name.startswith("orders-") and name.endswith(".seg") for name in segments)
+    records = [read_segment_file(os.path.join(tmp_path, name)) for name in segments]
+    # Every segment is closed, so each ends with the empty end record.
+    assert all(segment[-1] == b"" for segment in records)
+    assert [json.loads(record)["event"] for segment in records for record in segment[:-1]] == [
+        f"event {number}{suffix}" for number in range(6) for suffix in ("", "b")
+    ]
+    with open(os.path.join(tmp_path, segments[-1]), "rb") as handle:
+        assert handle.read().endswith(SEGMENT_END)
+
+
+def test_benchmarked_wrappers_log_the_same_fields(output):
+    from logger.benchmark import WRAPPER_VARIANTS
+
+    for fn in WRAPPER_VARIANTS.values():
+        fn(CORRELATION_ID, "benchmark event", item_id="item-001")
+    flush_logs()
+    events = [json.loads(record) for record in output]
+    assert len(events) == len(WRAPPER_VARIANTS)
+    # Every variant pays for the same callsite fields, so the benchmark compares only the call path.
+    assert all(event.keys() == events[0].keys() for event in events)
+    assert {event["func_name"] for event in events} == {"test_benchmarked_wrappers_log_the_same_fields"}
+
+
+def test_orjson_and_stdlib_backends_write_the_same_events():
+    pytest.importorskip("orjson")
+    events = {}
+    for backend in ("orjson", "stdlib"):
+        records = []
+        configure(level="debug", use_logfire=False, json_backend=backend, write_batch=records.extend)
+        log_info(CORRELATION_ID, "plain", amount=19.99, count=3, flag=True, missing=None)
+        log_warning(CORRELATION_ID, "nested", item={"id": "item-001", "tags": ["a", "b"]}, name="café ✓")
+        log_error(CORRELATION_ID, "wide int", value=2**70, when=datetime.date(2026, 1, 1))
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            log_error(CORRELATION_ID, "failed", exc_info=True)
+        flush_logs()
+        assert all(isinstance(record, bytes if backend == "orjson" else str) for record in records)
+        events[backend] = [json.loads(record) for record in records]
+        for event in events[backend]:
+            del event["timestamp"]
+    configure(json_backend="stdlib", write_batch=records.extend)
+    assert events["orjson"] == events["stdlib"]
+    assert events["stdlib"][1]["name"] == "café ✓" and events["stdlib"][2]["value"] == 2**70
+
+
+def test_import_leaves_structlog_and_logfire_until_first_use():
+    script = (
+        "import sys, logger\n"
+        "assert not {'structlog', 'logfire'} & set(sys.modules)\n"
+        "logger.set_level('info')\n"
+        "assert not {'structlog', 'logfire'} & set(sys.modules)\n"
+        "logger.log_info('id', 'first use')\n"
+        "assert {'structlog', 'logfire'} <= set(sys.modules)\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "LOGGER_LOGFIRE": "true", "LOGFIRE_SEND_TO_LOGFIRE": "false"}
+    result = subprocess.run([sys.executable, "-c", script], cwd=root, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout.splitlines()[-1])["event"] == "first use"
+
+
+def test_package_level_follows_set_level(output):
+    import logger
+
+    set_level("warning")
+    try:
+        assert logger.LOGGING_LEVEL == get_level() == WARNING
+        log_info(CORRELATION_ID, "filtered out")
+        log_warning(CORRELATION_ID, "kept")
+        flush_logs()
+        assert [json.loads(record)["event"] for record in output] == ["kept"]
+    finally:
+        set_level("debug")
+    assert logger.LOGGING_LEVEL == DEBUG
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGUSR1"), reason="needs SIGUSR1")
+def test_level_signal_is_applied_by_the_next_event(output, monkeypatch):
+    monkeypatch.setattr(core, "DEFAULT_LOGGING_LEVEL", WARNING)
+    previous, level = signal.getsignal(signal.SIGUSR1), get_level()
+    core.install_level_signal_handler()
+    try:
+        set_level("warning")
+        wrapper_class = structlog.get_config()["wrapper_class"]
+        # Even mid-configure, the handler leaves structlog alone.
+        with core._configure_lock:
+            os.kill(os.getpid(), signal.SIGUSR1)
+            assert get_level() == DEBUG
+            assert structlog.get_config()["wrapper_class"] is wrapper_class
+        log_debug(CORRELATION_ID, "after the signal")
+        assert structlog.get_config()["wrapper_class"] is not wrapper_class
+        core.logger.debug("through the proxy")
+        os.kill(os.getpid(), signal.SIGUSR1)
+        assert get_level() == WARNING
+        log_debug(CORRELATION_ID, "toggled back")
+        core.logger.debug("filtered again")
+        flush_logs()
+    finally:
+        signal.signal(signal.SIGUSR1, previous)
+        set_level(level)
+    assert [json.loads(record)["event"] for record in output] == ["after the signal", "through the proxy"]
+
+
+def test_reconfigure_keeps_one_writer_per_sink(monkeypatch):
+    hooks = []
+    monkeypatch.setattr(atexit, "register", hooks.append)
+    # Writers from earlier tests registered before this one started.
+    monkeypatch.setattr(atexit, "unregister", lambda hook: hook in hooks and hooks.remove(hook))
+    # init_worker passes queue.put, which is a new bound method every time.
+    sink = queue.Queue()
+    configure(use_logfire=False, write_batch=sink.put)
+    writer = core.queue_writer
+    configure(use_logfire=False, write_batch=sink.put)
+    assert core.queue_writer is writer
+    log_info(CORRELATION_ID, "before")
+    replaced = []
+    for _ in range(5):
+        records = []
+        configure(use_logfire=False, write_batch=records.extend)
+        replaced.append(records)
+    # Replaced writers are closed, after writing what was queued, and leave no thread or atexit hook behind.
+    assert not writer.is_alive()
+    assert "before" in sink.get_nowait()[0]
+    assert hooks == [core.queue_writer.close]
+    assert sum(thread.name == "logger-writer" for thread in threading.enumerate()) == 1
+    log_info(CORRELATION_ID, "after")
+    flush_logs()
+    assert [len(records) for records in replaced] == [0, 0, 0, 0, 1]
+    configure(use_queue_writer=False, write_batch=None)
+    assert core.queue_writer is None
+
+
+def log_from_worker(item):
+    log_info(CORRELATION_ID, "worker event", item=item, pid=os.getpid())
+    return os.getpid()
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_worker_events_reach_the_aggregator_with_the_submitter_context(start_method):
+    if start_method not in multiprocessing.get_all_start_methods():
+        pytest.skip(f"{start_method} is not available on this platform")
+    context = multiprocessing.get_context(start_method)
+    records = []
+    with LogAggregator(mp_context=context, write_batch=records.extend) as aggregator:
+        with structlog.contextvars.bound_contextvars(request_id="req-pool", user_id="user-pool"):
+            initargs = aggregator.initargs(json_backend="stdlib")
+        with ProcessPoolExecutor(2, mp_context=context, initializer=init_worker, initargs=initargs) as pool:
+            pids = set(pool.map(log_from_worker, range(4)))
+            with structlog.contextvars.bound_contextvars(request_id="req-task", user_id="user-task"):
+                task = with_log_context(log_from_worker)
+            pids.add(pool.submit(task, 4).result())
+    # Leaving the pool runs each worker's exit flush; leaving the aggregator writes what it received.
+    events = sorted((json.loads(record) for record in records), key=lambda event: event["item"])
+    assert [event["item"] for event in events] == [0, 1, 2, 3, 4]
+    assert {event["pid"] for event in events} <= pids and os.getpid() not in pids
+    assert [(event["request_id"], event["user_id"]) for event in events] == [("req-pool", "user-pool")] * 4 + [
+        ("req-task", "user-task")
+    ]
+    assert all(event["correlation_id"] == CORRELATION_ID for event in events)
+    assert aggregator.events == 5
+
+
+def test_async_events_keep_their_call_time_and_level(output):
+    from logger import aio
+
+    sink = aio.get_sink()
+    release = threading.Event()
+    process = sink._process
+
+    def behind(batch):
+        release.wait(5.0)
+        process(batch)
+
+    async def submit():
+        aio.log_info_nowait(CORRELATION_ID, "queued")
+
+    sink._process = behind
+    try:
+        asyncio.run(submit())
+        submitted = datetime.datetime.now(datetime.timezone.utc)
+        time.sleep(0.1)
+        # Raising the level after the call does not filter an event that passed when it was made.
+        set_level("warning")
+        release.set()
+        assert sink.flush(5.0)
+    finally:
+        sink._process = process
+        set_level("debug")
+    flush_logs()
+    (event,) = [json.loads(record) for record in output]
+    assert event["event"] == "queued"
+    assert datetime.datetime.fromisoformat(event["timestamp"].replace("Z", "+00:00")) <= submitted
+    assert "_submitted_at" not in event
+
+
+@pytest.mark.parametrize("mode", ["cached", "adder"])
+def test_async_events_name_the_calling_coroutine(output, mode):
+    from logger import aio
+
+    async def handle_request():
+        await aio.alog_info(CORRELATION_ID, "awaited")
+        aio.log_info_nowait(CORRELATION_ID, "fire and forget")
+        await aio.aflush(5.0)
+
+    previous = core.CALLSITE_MODE
+    core.set_callsite(mode)
+    try:
+        asyncio.run(handle_request())
+    finally:
+        core.set_callsite(previous)
+    events = [json.loads(record) for record in output]
+    assert [event["event"] for event in events] == ["awaited", "fire and forget"]
+    assert {(event["filename"], event["func_name"]) for event in events} == {("test_logger.py", "handle_request")}
+
+
+class LogfireCapture:
+    # Stands in for the Logfire instance behind logfire.StructlogProcessor and keeps what it was sent.
+    def __init__(self):
+        self.logged = []
+
+    def with_settings(self, **settings):
+        return self
+
+    def log(self, **record):
+        self.logged.append(record)
+
+
+def test_every_exception_reaches_logfire(monkeypatch):
+    capture = LogfireCapture()
+    processor = logfire.StructlogProcessor
+    monkeypatch.setattr(logfire, "configure", lambda **settings: None)
+    monkeypatch.setattr(logfire, "StructlogProcessor", lambda: processor(logfire_instance=capture))
+    records = []
+    configure(level="debug", use_logfire=True, json_backend="stdlib", write_batch=records.extend, use_queue_writer=True)
+    try:
+        for _ in range(2):
+            try:
+                raise ValueError("bad input")
+            except ValueError:
+                log_error(CORRELATION_ID, "failed", exc_info=True)
+        flush_logs()
+    finally:
+        configure(use_logfire=False)
+    # Logfire gets the exception itself both times, and no attribute it cannot serialize.
+    assert [record["exc_info"][0] for record in capture.logged] == [ValueError, ValueError]
+    for record in capture.logged:
+        assert "exception" not in record["attributes"]
+        assert all(isinstance(value, (str, int)) for value in record["attributes"].values())
+    first, repeat = [json.loads(record) for record in records]
+    assert first["exception"].startswith("Traceback") and "exception_ref" not in first
+    assert repeat["exception_ref"] == "ValueError: bad input" and "exception" not in repeat
+    assert first["exception_fingerprint"] == repeat["exception_fingerprint"]
+
+
+OTEL_BSP_VARIABLES = (
+    "OTEL_BSP_MAX_QUEUE_SIZE",
+    "OTEL_BSP_MAX_EXPORT_BATCH_SIZE",
+    "OTEL_BSP_SCHEDULE_DELAY",
+    "OTEL_BSP_EXPORT_TIMEOUT",
+)
+
+
+def test_only_configured_export_settings_reach_the_environment(monkeypatch):
+    for variable in OTEL_BSP_VARIABLES:
+        # Set first, so monkeypatch removes whatever the code under test writes.
+        monkeypatch.setenv(variable, "0")
+        monkeypatch.delenv(variable)
+    for name in ("EXPORT_QUEUE_SIZE", "EXPORT_BATCH_SIZE", "EXPORT_DELAY_MS", "EXPORT_TIMEOUT_MS"):
+        monkeypatch.setattr(core, name, None)
+    monkeypatch.setattr(core, "OTLP_ENDPOINT", None)
+    core._export_span_processors()
+    assert [variable for variable in OTEL_BSP_VARIABLES if variable in os.environ] == []
+    monkeypatch.setattr(core, "EXPORT_DELAY_MS", 250)
+    core._export_span_processors()
+    assert [(variable, os.environ[variable]) for variable in OTEL_BSP_VARIABLES if variable in os.environ] == [
+        ("OTEL_BSP_SCHEDULE_DELAY", "250"),
+    ]
+
+
+class OtlpReceiver(http.server.ThreadingHTTPServer):
+    # Local stand-in for an OTLP/HTTP collector: each request waits `stall` seconds, or until release(),
+    # before it is answered.
+    daemon_threads = True
+
+    def __init__(self, stall):
+        super().__init__(("127.0.0.1", 0), OtlpHandler)
+        self.stall = stall
+        self.released = threading.Event()
+        self.requests = 0
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.server_port}/v1/traces"
+
+    def release(self):
+        self.released.set()
+
+    def close(self):
+        self.release()
+        self.shutdown()
+        self.server_close()
+
+
+class OtlpHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.requests += 1
+        self.server.released.wait(self.server.stall)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-protobuf")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_export_to_a_stalled_collector_drops_without_blocking(monkeypatch):
+    receiver = OtlpReceiver(stall=30.0)
+    # Built the way configure() builds it, from the OTEL_BSP_* variables.
+    for variable, value in zip(OTEL_BSP_VARIABLES, ("8", "4", "10", "500")):
+        monkeypatch.setenv(variable, value)
+    for name in ("EXPORT_QUEUE_SIZE", "EXPORT_BATCH_SIZE", "EXPORT_DELAY_MS", "EXPORT_TIMEOUT_MS"):
+        monkeypatch.setattr(core, name, None)
+    monkeypatch.setattr(core, "OTLP_ENDPOINT", receiver.endpoint)
+    monkeypatch.setattr(core, "export_processor", None)
+    (processor,) = core._export_span_processors()
+    provider = TracerProvider()
+    provider.add_span_processor(processor)
+    tracer = provider.get_tracer(__name__)
+    try:
+        slowest = 0.0
+        for _ in range(200):
+            span = tracer.start_span("event")
+            started = time.perf_counter()
+            span.end()
+            slowest = max(slowest, time.perf_counter() - started)
+        assert slowest < 0.25
+        stats = processor.snapshot()
+        # At most one batch in flight plus a full queue are held; the rest is dropped at end().
+        assert stats["dropped"] >= 200 - 4 - 8
+        assert stats["exported"] == 0
+        # The export timeout gives up on the collector while it is still stalled.
+        deadline = time.monotonic() + 10
+        while processor.snapshot()["failed"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert processor.snapshot()["failed"] > 0
+        assert receiver.requests > 0
+        receiver.release()
+        assert processor.force_flush(10000)
+        stats = processor.snapshot()
+        assert stats["exported"] + stats["failed"] + stats["dropped"] == 200
+        assert stats["queue_depth"] == 0
+    finally:
+        receiver.close()
+        provider.shutdown()
@@ -0,0 +1,150 @@
+import atexit
+import sys
+import threading
+import time
+from collections import deque
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+
+def stream_sink(stream=None):
+    def write_batch(batch):
+        target = stream or sys.stdout
+        if isinstance(batch[0], bytes):
+            target = getattr(target, "buffer", target)
+            target.write(b"\n".join(batch) + b"\n")
+        else:
+            target.write("\n".join(batch) + "\n")
+        target.flush()
+
+    return write_batch
+
+
+class QueueWriter:
+    """Drain rendered events on a dedicated thread, one buffered write per batch.
+
+    With `linger` (seconds), a partial batch waits up to that long to fill before it is written.
+    """
+
+    def __init__(self, write_batch, maxsize=10000, overflow="block", batch_size=512, linger=0.0):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}")
+        self._write_batch = write_batch
+        self._maxsize = max(1, int(maxsize))
+        self._overflow = overflow
+        self._batch_size = max(1, int(batch_size))
+        self._linger = linger
+        self._flushing = False
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._drained = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._closed = False
+        self.dropped = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="logger-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def qsize(self):
+        return len(self._queue)
+
+    def is_alive(self):
+        # False once closed, and in a forked child, which inherits the writer but not its thread.
+        return not self._closed and self._thread.is_alive()
+
+    def put(self, record):
+        with self._lock:
+            if len(self._queue) >= self._maxsize and not self._closed:
+                if self._overflow == "drop_newest":
+                    self.dropped += 1
+                    return
+                if self._overflow == "drop_oldest":
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    while len(self._queue) >= self._maxsize and not self._closed:
+                        self._not_full.wait()
+            if self._closed:
+                # Late events (e.g. from other atexit hooks) are written inline.
+                self._write([record])
+                return
+            self._queue.append(record)
+            self._not_empty.notify()
+
+    def flush(self, timeout=None):
+        with self._lock:
+            # Skips any linger so the flush is not delayed by a partial batch.
+            self._flushing = True
+            self._not_empty.notify()
+            try:
+                return self._drained.wait_for(lambda: not self._queue and not self._in_flight, timeout)
+            finally:
+                self._flushing = False
+
+    def close(self, timeout=5.0):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        atexit.unregister(self.close)
+        self._thread.join(timeout)
+
+    def _write(self, batch):
+        try:
+            # Deferred records (see exceptions.py) finish rendering here, off the logging thread.
+            self._write_batch([record() if callable(record) else record for record in batch])
+        except Exception:
+            self.errors += 1
+
+    def _run(self):
+        queue = self._queue
+        while True:
+            with self._lock:
+                while not queue and not self._closed:
+                    self._not_empty.wait()
+                if not queue:
+                    self._drained.notify_all()
+                    return
+                if self._linger and len(queue) < self._batch_size:
+                    self._wait_for_batch()
+                batch = [queue.popleft() for _ in range(min(len(queue), self._batch_size))]
+                self._in_flight = len(batch)
+                self._not_full.notify_all()
+            self._write(batch)
+            with self._lock:
+                self._in_flight = 0
+                if not queue:
+                    self._drained.notify_all()
+
+    def _wait_for_batch(self):
+        # Called with the lock held.
+        deadline = time.monotonic() + self._linger
+        while len(self._queue) < self._batch_size and not self._closed and not self._flushing:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            self._not_empty.wait(remaining)
+
+
+class QueueLogger:
+    def __init__(self, writer):
+        self._writer = writer
+
+    def msg(self, message):
+        self._writer.put(message)
+
+    log = debug = info = warn = warning = msg
+    fatal = failure = err = error = critical = exception = msg
+
+
+class QueueLoggerFactory:
+    def __init__(self, writer):
+        self._writer = writer
+
+    def __call__(self, *args):
+        return QueueLogger(self._writer)